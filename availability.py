@@ -0,0 +1,336 @@
+"""
+Structured professional availability for CareNet Liberia
+Parses the free-text availability professionals enter ("Mon-Fri 8am-5pm;
+Sat 09:00-12:00; closed 2026-12-25") into a weekly schedule with dated
+exceptions, and keeps per-day slot bitmaps so free-slot searches across a
+whole county are a handful of integer operations per professional
+"""
+
+import json
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+
+from booking import RELEASED_STATUSES
+
+DAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+DAY_ALIASES = {
+    'daily': range(7), 'everyday': range(7), 'every day': range(7),
+    'weekdays': range(5), 'weekday': range(5), 'weekends': (5, 6), 'weekend': (5, 6),
+}
+ALL_DAY = [(0, 24 * 60)]
+ALL_DAY_RE = re.compile(r'(\b24\s*/\s*7\b|\b24\s*(?:hours?|hrs?|h)\b|\bround the clock\b|\ball day\b)')
+CLOSED_RE = re.compile(r'\b(except|closed|off|unavailable|not available|holiday)\b')
+
+DAY_RE = r'(mon|tue|wed|thu|fri|sat|sun)[a-z]*\.?'
+DAY_RANGE_RE = re.compile(rf'\b{DAY_RE}\s*(?:-|–|to)\s*{DAY_RE}')
+DAY_NAME_RE = re.compile(rf'\b{DAY_RE}')
+ALIAS_RE = re.compile(r'\b(' + '|'.join(sorted(DAY_ALIASES, key=len, reverse=True)) + r')\b')
+DATE_RANGE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})\s*(?:-|–|to)\s*(\d{4}-\d{2}-\d{2})')
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}')
+TIME_RANGE_RE = re.compile(
+    r'(?<![\d-])(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?\s*(?:-|–|to)\s*(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?(?![\d-])'
+)
+
+
+def _minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem == 'pm' and hour < 12:
+        hour += 12
+    elif meridiem == 'am' and hour == 12:
+        hour = 0
+    return hour * 60 + minute
+
+
+def _time_ranges(text):
+    """(start, end) minutes of each time range; one running overnight ends past 24:00"""
+    ranges = []
+    for h1, m1, p1, h2, m2, p2 in TIME_RANGE_RE.findall(text):
+        start = _minutes(h1, m1, p1 or ('' if p2 != 'pm' or int(h1) > int(h2) else 'pm'))
+        end = min(24 * 60, _minutes(h2, m2, p2))
+        if end <= start and not p2 and end + 12 * 60 > start:
+            end += 12 * 60  # "8-5" means 8am to 5pm
+        if end <= start:
+            end += 24 * 60  # "20:00-08:00" and "10pm-6am" end the next morning
+        if start < 24 * 60:
+            ranges.append((start, end))
+    return ranges
+
+
+def _dates(text):
+    found = []
+    for first, last in DATE_RANGE_RE.findall(text):
+        try:
+            day, end = date.fromisoformat(first), date.fromisoformat(last)
+        except ValueError:
+            continue
+        while day <= end and len(found) < 366:
+            found.append(day)
+            day += timedelta(days=1)
+    for value in DATE_RE.findall(DATE_RANGE_RE.sub(' ', text)):
+        try:
+            found.append(date.fromisoformat(value))
+        except ValueError:
+            continue
+    return found
+
+
+def _weekdays(text):
+    days = set()
+    for first, last in DAY_RANGE_RE.findall(text):
+        start, end = DAYS.index(first), DAYS.index(last)
+        days.update((start + i) % 7 for i in range((end - start) % 7 + 1))
+    for name in DAY_NAME_RE.findall(DAY_RANGE_RE.sub(' ', text)):
+        days.add(DAYS.index(name))
+    for alias in ALIAS_RE.findall(text):
+        days.update(DAY_ALIASES[alias])
+    return days
+
+
+class Availability:
+    """Weekly opening hours plus per-date overrides, all as (start, end) minutes after midnight"""
+
+    def __init__(self, weekly=None, exceptions=None):
+        self.weekly = weekly or [[] for _ in DAYS]
+        self.exceptions = exceptions or {}  # date -> ranges; [] means unavailable all day
+
+    def __bool__(self):
+        return any(self.weekly) or bool(self.exceptions)
+
+    def ranges_on(self, day):
+        if day in self.exceptions:
+            return self.exceptions[day]
+        return self.weekly[day.weekday()]
+
+    def to_json(self):
+        def fmt(ranges):
+            return [[f'{s // 60:02d}:{s % 60:02d}', f'{e // 60:02d}:{e % 60:02d}'] for s, e in ranges]
+        return json.dumps({
+            'weekly': {DAYS[i]: fmt(ranges) for i, ranges in enumerate(self.weekly) if ranges},
+            'exceptions': {day.isoformat(): fmt(ranges) for day, ranges in sorted(self.exceptions.items())},
+        })
+
+    @classmethod
+    def from_json(cls, value):
+        data = json.loads(value)
+
+        def parse(ranges):
+            return [(_minutes(*s.split(':'), None), _minutes(*e.split(':'), None)) for s, e in ranges]
+        weekly = [parse(data.get('weekly', {}).get(name, [])) for name in DAYS]
+        exceptions = {date.fromisoformat(day): parse(ranges) for day, ranges in data.get('exceptions', {}).items()}
+        return cls(weekly, exceptions)
+
+
+def parse_availability(text):
+    """Parse free-text availability; text that does not state hours gives an empty Availability.
+
+    Entries are separated by ';' or new lines. An entry naming days sets
+    their weekly hours, one naming dates overrides those dates, and one with
+    "closed"/"except"/"off" marks the dates or days as unavailable. Hours
+    without days apply to every day, "24/7" and "24 hours" mean all day, and
+    a range ending before it starts runs into the next day. Days named
+    without readable hours make the whole schedule unknown rather than
+    guessed, so nothing is enforced or offered for it.
+    """
+    availability = Availability()
+    for entry in re.split(r'[;\n]+', (text or '').lower()):
+        entry = entry.strip()
+        if not entry:
+            continue
+        closed = bool(CLOSED_RE.search(entry))
+        dates = _dates(entry)
+        ranges = []
+        if not closed:
+            ranges = ALL_DAY if ALL_DAY_RE.search(entry) else _time_ranges(DATE_RE.sub(' ', entry))
+        if dates:
+            for day in dates:
+                availability.exceptions[day] = [(start, min(end, 24 * 60)) for start, end in ranges]
+            continue
+        days = _weekdays(entry)
+        if closed:
+            for day in days:
+                availability.weekly[day] = []
+            continue
+        if not ranges:
+            if days:
+                return Availability()
+            continue
+        for day in days or range(7):
+            for start, end in ranges:
+                _add_hours(availability.weekly, day, start, min(end, 24 * 60))
+                if end > 24 * 60:
+                    _add_hours(availability.weekly, (day + 1) % 7, 0, end - 24 * 60)
+    return availability
+
+
+def _add_hours(weekly, day, start, end):
+    weekly[day] = sorted(set(weekly[day] + [(start, end)]))
+
+
+def ranges_to_mask(ranges, slot_minutes):
+    """Bitmap of the slots of one day that lie wholly inside ranges"""
+    mask = 0
+    for start, end in ranges:
+        first = -(-start // slot_minutes)
+        for slot in range(first, end // slot_minutes):
+            mask |= 1 << slot
+    return mask
+
+
+def _slot_bits(start, length, slot_minutes):
+    """(day, bitmap) pairs for every slot an interval starting at start touches"""
+    minute = start.hour * 60 + start.minute + start.second / 60
+    end = minute + length.total_seconds() / 60
+    slots_per_day = 24 * 60 // slot_minutes
+    first, last = int(minute // slot_minutes), int(-(-end // slot_minutes))
+    bits = {}
+    for slot in range(first, last):
+        day = start.date() + timedelta(days=slot // slots_per_day)
+        bits[day] = bits.get(day, 0) | 1 << (slot % slots_per_day)
+    return bits.items()
+
+
+class ProfessionalSlots:
+    __slots__ = ('name', 'county', 'specialty', 'specialty_key', 'weekly', 'exceptions')
+
+    def __init__(self, name, county, specialty, availability, slot_minutes):
+        self.name = name
+        self.county = county
+        self.specialty = specialty
+        self.specialty_key = (specialty or '').lower()
+        self.weekly = [ranges_to_mask(ranges, slot_minutes) for ranges in availability.weekly]
+        self.exceptions = {day: ranges_to_mask(ranges, slot_minutes)
+                           for day, ranges in availability.exceptions.items()}
+
+    def day_mask(self, day):
+        mask = self.exceptions.get(day)
+        return self.weekly[day.weekday()] if mask is None else mask
+
+
+class SlotIndex:
+    """Per-professional availability and booking bitmaps, one bit per slot of a day.
+
+    Only professionals whose availability states hours are indexed; the
+    others are left out of free-slot searches and never refused a booking.
+    """
+
+    def __init__(self, slot_minutes):
+        self.slot_minutes = slot_minutes
+        self.slot_length = timedelta(minutes=slot_minutes)
+        self.professionals = {}
+        self.by_county = {}
+        self.booked = {}        # (professional_id, day) -> {appointment_id: bitmap}
+        self.appointments = {}  # appointment_id -> [(professional_id, day)]
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def load(self, professionals, appointments):
+        """Replace contents with (id, name, county, specialty, Availability) and
+        (id, professional_id, appointment_date, status) rows"""
+        with self._lock:
+            self.professionals = {}
+            self.by_county = {}
+            self.booked = {}
+            self.appointments = {}
+            for row in professionals:
+                self._upsert_professional(*row)
+            for row in appointments:
+                self._upsert_appointment(*row)
+            self.loaded = True
+
+    def upsert_professional(self, professional_id, name, county, specialty, availability):
+        with self._lock:
+            self._upsert_professional(professional_id, name, county, specialty, availability)
+
+    def remove_professional(self, professional_id):
+        with self._lock:
+            self._remove_professional(professional_id)
+
+    def upsert_appointment(self, appointment_id, professional_id, start, status):
+        with self._lock:
+            self._upsert_appointment(appointment_id, professional_id, start, status)
+
+    def remove_appointment(self, appointment_id):
+        with self._lock:
+            self._remove_appointment(appointment_id)
+
+    def is_available(self, professional_id, start):
+        """False only when a slot starting at start falls outside the hours the professional stated"""
+        with self._lock:
+            professional = self.professionals.get(professional_id)
+            if professional is None:
+                return True
+            return all(professional.day_mask(day) & bits == bits
+                       for day, bits in _slot_bits(start, self.slot_length, self.slot_minutes))
+
+    def free_slots(self, after, count=10, county=None, specialty=None, days=14):
+        """Return up to count (start, professional_id) pairs, earliest first, from after onwards"""
+        specialty = (specialty or '').strip().lower()
+        results = []
+        with self._lock:
+            ids = self.by_county.get(county, ()) if county else self.professionals
+            candidates = [(pid, self.professionals[pid]) for pid in sorted(ids)]
+            if specialty:
+                candidates = [(pid, p) for pid, p in candidates if specialty in p.specialty_key]
+            for offset in range(days):
+                day = after.date() + timedelta(days=offset)
+                floor = 0
+                if offset == 0:
+                    elapsed = after.hour * 60 + after.minute + (1 if after.second or after.microsecond else 0)
+                    floor = (1 << -(-elapsed // self.slot_minutes)) - 1
+                free = []
+                union = 0
+                for pid, professional in candidates:
+                    mask = professional.day_mask(day) & ~floor
+                    if mask:
+                        for bits in self.booked.get((pid, day), {}).values():
+                            mask &= ~bits
+                        if mask:
+                            free.append((pid, mask))
+                            union |= mask
+                while union and len(results) < count:
+                    low = union & -union
+                    union ^= low
+                    start = datetime.combine(day, time()) + self.slot_length * (low.bit_length() - 1)
+                    for pid, mask in free:
+                        if mask & low:
+                            results.append((start, pid))
+                            if len(results) == count:
+                                break
+                if len(results) >= count:
+                    break
+        return results
+
+    def _upsert_professional(self, professional_id, name, county, specialty, availability):
+        self._remove_professional(professional_id)
+        if not availability:
+            return
+        self.professionals[professional_id] = ProfessionalSlots(
+            name, county, specialty, availability, self.slot_minutes)
+        self.by_county.setdefault(county, set()).add(professional_id)
+
+    def _remove_professional(self, professional_id):
+        professional = self.professionals.pop(professional_id, None)
+        if professional is not None:
+            members = self.by_county.get(professional.county)
+            members.discard(professional_id)
+            if not members:
+                del self.by_county[professional.county]
+
+    def _upsert_appointment(self, appointment_id, professional_id, start, status):
+        self._remove_appointment(appointment_id)
+        if start is None or status in RELEASED_STATUSES:
+            return
+        keys = []
+        for day, bits in _slot_bits(start, self.slot_length, self.slot_minutes):
+            self.booked.setdefault((professional_id, day), {})[appointment_id] = bits
+            keys.append((professional_id, day))
+        self.appointments[appointment_id] = keys
+
+    def _remove_appointment(self, appointment_id):
+        for key in self.appointments.pop(appointment_id, ()):
+            day_bookings = self.booked.get(key)
+            if day_bookings is not None:
+                day_bookings.pop(appointment_id, None)
+                if not day_bookings:
+                    del self.booked[key]
@@ -0,0 +1,50 @@
+"""
+Load the CareNet Liberia Flask app for benchmarks against a scratch database
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The app module ships as main.py in deployments and may carry a suffix in exports
+APP_MODULE_CANDIDATES = ['main.py', 'main (3).py']
+
+
+def load_app(database_path=None, **environ):
+    """Import the app module with DATABASE_URL pointing at a scratch SQLite file.
+
+    Returns (module, database_path). Extra keyword arguments are set as
+    environment variables before import, e.g. PASSWORD_HASH_WORKERS='0'.
+    """
+    if database_path is None:
+        handle, database_path = tempfile.mkstemp(prefix='carenet-bench-', suffix='.db')
+        os.close(handle)
+        os.remove(database_path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{database_path}'
+    # Keep benchmarks offline: the NPHIL feed points at a closed local port
+    os.environ.setdefault('NPHIL_URL', 'http://127.0.0.1:9/')
+    for key, value in environ.items():
+        os.environ[key] = str(value)
+
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    for name in APP_MODULE_CANDIDATES:
+        path = os.path.join(ROOT, name)
+        if os.path.exists(path):
+            spec = importlib.util.spec_from_file_location('main', path)
+            module = importlib.util.module_from_spec(spec)
+            sys.modules['main'] = module
+            spec.loader.exec_module(module)
+            with module.app.app_context():
+                module.init_db()
+            return module, database_path
+    raise RuntimeError(f'No app module found in {ROOT}')
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
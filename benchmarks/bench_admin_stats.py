@@ -0,0 +1,88 @@
+"""
+Benchmark the admin statistics: reading the maintained counters against the
+COUNT(*) queries /admin used to run, the per-write cost of keeping them, and
+a full reconciliation pass
+
+    python benchmarks/bench_admin_stats.py [--users 200000] [--appointments 500000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+
+
+def timed(fn, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--appointments', type=int, default=500000)
+    parser.add_argument('--writes', type=int, default=2000, help='ORM updates timed for counter upkeep')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0', STATS_RECONCILE_INTERVAL='0')
+    db, User, Appointment, stats = app_module.db, app_module.User, app_module.Appointment, app_module.stats
+    rng = random.Random(17)
+    start = datetime.utcnow() - timedelta(days=180)
+    with app_module.app.app_context():
+        # Bulk Core inserts are not counted as they happen; the reconciliation below fills the counters
+        db.session.execute(User.__table__.insert(), [{
+            'name': f'User {i}', 'email': f'user{i}@example.lr', 'password_hash': '',
+            'user_type': 'professional' if i % 20 == 0 else 'patient', 'is_approved': i % 40 != 0,
+            'county': rng.choice(app_module.LIBERIAN_COUNTIES),
+        } for i in range(args.users)])
+        db.session.execute(Appointment.__table__.insert(), [{
+            'patient_id': rng.randint(1, args.users), 'professional_id': rng.randint(1, args.users),
+            'appointment_date': start + timedelta(minutes=30 * rng.randint(0, 48 * 365)),
+            'status': rng.choice(['scheduled', 'completed', 'cancelled']),
+        } for _ in range(args.appointments)])
+        db.session.commit()
+
+        seconds, drift = timed(app_module.reconcile_stats, 1)
+        print(f'reconcile from scratch: {seconds * 1000:.0f}ms, {len(drift)} counters written')
+        seconds, drift = timed(app_module.reconcile_stats, 3)
+        print(f'reconcile with no drift: {seconds * 1000:.0f}ms')
+
+        def old_admin():
+            return (User.query.filter_by(user_type='professional', is_approved=False).all(),
+                    User.query.count(), Appointment.query.count())
+
+        def new_admin():
+            return (stats.read_stats(db.session.connection()),
+                    User.query.filter_by(user_type='professional', is_approved=False)
+                    .order_by(User.name).limit(app_module.ADMIN_PENDING_LIMIT).all())
+
+        seconds, (pending, users, appointments) = timed(old_admin, 5)
+        print(f'COUNT(*) admin queries: {seconds * 1000:8.1f}ms  ({users} users, {appointments} appointments, '
+              f'{len(pending)} pending fetched)')
+        seconds, (summary, pending) = timed(new_admin, 50)
+        print(f'counter admin queries:  {seconds * 1000:8.1f}ms  ({summary["users"]["total"]} users, '
+              f'{summary["appointments"]["total"]} appointments, {summary["pending_approvals"]["total"]} pending)')
+        db.session.rollback()
+
+        ids = rng.sample(range(1, args.users + 1), args.writes)
+        started = time.perf_counter()
+        for user_id in ids:
+            db.session.get(User, user_id).county = rng.choice(app_module.LIBERIAN_COUNTIES)
+            db.session.commit()
+        elapsed = time.perf_counter() - started
+        print(f'{args.writes} counted user updates: {elapsed / args.writes * 1e6:.0f}us per commit')
+        drift = app_module.reconcile_stats()
+        print(f'drift after counted writes: {len(drift)} counters')
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Stress /book_appointment with many threads racing for the same slots and check
+that every slot ended up booked at most once
+
+    python benchmarks/bench_booking_race.py [--threads 16] [--professionals 5] [--slots 20]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16, help='concurrent patients')
+    parser.add_argument('--professionals', type=int, default=5)
+    parser.add_argument('--slots', type=int, default=20, help='slots per professional everyone tries to book')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    db, User, Appointment = app_module.db, app_module.User, app_module.Appointment
+    slot_length = timedelta(minutes=app_module.app.config['APPOINTMENT_SLOT_MINUTES'])
+
+    with app_module.app.app_context():
+        professionals = [User(name=f'Dr Race {i}', email=f'race{i}@example.lr', password_hash='',
+                              user_type='professional', is_approved=True, availability='Daily 00:00-24:00') for i in range(args.professionals)]
+        patients = [User(name=f'Patient {i}', email=f'patient{i}@example.lr', password_hash='',
+                         user_type='patient') for i in range(args.threads)]
+        db.session.add_all(professionals + patients)
+        db.session.commit()
+        professional_ids = [p.id for p in professionals]
+        patient_ids = [p.id for p in patients]
+
+    first_slot = (datetime.utcnow() + timedelta(days=1)).replace(hour=8, minute=0, second=0, microsecond=0)
+    # Every patient asks for every slot, plus a request offset by half a slot
+    # that overlaps two neighbouring bookings
+    requests_to_make = [(pid, first_slot + slot_length * n + offset)
+                        for pid in professional_ids for n in range(args.slots)
+                        for offset in (timedelta(0), slot_length / 2)]
+
+    barrier = threading.Barrier(args.threads)
+    outcomes = Counter()
+    latencies = []
+    lock = threading.Lock()
+
+    def patient(index):
+        client = app_module.app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = patient_ids[index]
+        barrier.wait()
+        for professional_id, when in requests_to_make:
+            start = time.perf_counter()
+            response = client.post('/book_appointment', json={
+                'professional_id': professional_id, 'appointment_date': when.isoformat(),
+                'appointment_type': 'in-person'})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                outcomes[response.status_code] += 1
+
+    workers = [threading.Thread(target=patient, args=(i,)) for i in range(args.threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    duration = time.perf_counter() - started
+
+    with app_module.app.app_context():
+        overlaps = 0
+        for professional_id in professional_ids:
+            starts = [row[0] for row in db.session.query(Appointment.appointment_date).filter_by(
+                professional_id=professional_id).order_by(Appointment.appointment_date)]
+            overlaps += sum(1 for a, b in zip(starts, starts[1:]) if b - a < slot_length)
+        booked = db.session.query(Appointment).count()
+
+    total = sum(outcomes.values())
+    print(f'{total} requests from {args.threads} threads in {duration:.2f}s ({total / duration:.0f} req/s)')
+    print(f'booked {booked} of {args.professionals * args.slots} slots, '
+          f'conflicts {outcomes[409]}, other errors {total - outcomes[200] - outcomes[409]}')
+    print(f'latency p50 {percentile(latencies, 50) * 1000:.2f}ms p99 {percentile(latencies, 99) * 1000:.2f}ms')
+    print(f'overlapping bookings: {overlaps}')
+    os.remove(database_path)
+    sys.exit(1 if overlaps else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark a daily delta sync through /api/changes against re-downloading the
+full facility list, on a large directory with a small number of edits
+
+    python benchmarks/bench_changes.py [--facilities 50000] [--edits 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+
+
+def download(client, url, cursor_arg, cursor_key):
+    """Follow a paged JSON listing to the end; returns (requests, bytes, seconds, last cursor)"""
+    requests_made, size, cursor = 0, 0, None
+    started = time.perf_counter()
+    while True:
+        response = client.get(f"{url}{'&' if '?' in url else '?'}{cursor_arg}={cursor}" if cursor else url)
+        requests_made += 1
+        size += len(response.data)
+        data = response.get_json()
+        cursor = data.get(cursor_key)
+        if not (data.get('has_more') if 'has_more' in data else cursor):
+            return requests_made, size, time.perf_counter() - started, cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--facilities', type=int, default=50000)
+    parser.add_argument('--edits', type=int, default=200, help='facilities changed or deleted between syncs')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    db, HealthFacility = app_module.db, app_module.HealthFacility
+    rng = random.Random(9)
+    with app_module.app.app_context():
+        db.session.execute(HealthFacility.__table__.insert(), [{
+            'name': f'Facility {i}', 'county': rng.choice(app_module.LIBERIAN_COUNTIES), 'facility_type': 'clinic',
+            'services': 'General Medicine, Maternity', 'latitude': 6.3, 'longitude': -10.8,
+        } for i in range(args.facilities)])
+        db.session.commit()
+
+    client = app_module.app.test_client()
+    requests_made, size, seconds, cursor = download(client, '/api/changes?limit=5000', 'since', 'cursor')
+    print(f'initial feed download: {requests_made} requests, {size / 1024:.0f} KiB, {seconds * 1000:.0f}ms')
+
+    with app_module.app.app_context():
+        ids = rng.sample(range(1, args.facilities + 1), args.edits)
+        for facility_id in ids[:args.edits // 2]:
+            db.session.get(HealthFacility, facility_id).contact = '0770-000-000'
+        for facility_id in ids[args.edits // 2:]:
+            db.session.delete(db.session.get(HealthFacility, facility_id))
+        db.session.commit()
+
+    requests_made, size, seconds, _ = download(client, f'/api/changes?since={cursor}', 'since', 'cursor')
+    print(f'delta after {args.edits} edits: {requests_made} requests, {size / 1024:.1f} KiB, {seconds * 1000:.1f}ms')
+    requests_made, size, seconds, _ = download(client, '/api/facilities?page_size=100', 'cursor', 'next_cursor')
+    print(f'full /api/facilities re-download: {requests_made} requests, {size / 1024:.0f} KiB, {seconds * 1000:.0f}ms')
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
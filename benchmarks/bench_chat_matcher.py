@@ -0,0 +1,77 @@
+"""
+Benchmark chat intent matching as the intent catalog grows: the compiled keyword
+automaton versus checking every keyword against the message in turn
+
+    python benchmarks/bench_chat_matcher.py [--sizes 10,100,1000,5000] [--messages 2000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent_matcher import IntentMatcher, normalize
+
+WORDS = ['fever', 'malaria', 'cough', 'pain', 'body', 'head', 'stomach', 'chills', 'clinic', 'baby',
+         'water', 'hot', 'cold', 'sick', 'rash', 'eye', 'blood', 'pressure', 'sugar', 'ebola']
+
+
+def synthetic_catalog(base, keyword_count, seed=7):
+    """Base catalog padded with generated intents of ten keywords each"""
+    rng = random.Random(seed)
+    catalog = {'default_response': base['default_response'], 'intents': list(base['intents'])}
+    for i in range(max(0, keyword_count // 10)):
+        keywords = [f'{rng.choice(WORDS)} {rng.choice(WORDS)}{i}x{j}' for j in range(10)]
+        catalog['intents'].append({'name': f'synthetic{i}', 'weight': 1.0,
+                                   'keywords': {'english': keywords}, 'responses': {'english': f'reply {i}'}})
+    return catalog
+
+
+def naive_match(catalog, message):
+    """Per-keyword substring test over the whole catalog, the way /chat used to work"""
+    text = normalize(message)
+    return [intent['name'] for intent in catalog['intents']
+            if any(normalize(keyword) in text
+                   for keywords in intent['keywords'].values() for keyword in keywords)]
+
+
+def messages(count, seed=11):
+    rng = random.Random(seed)
+    return [' '.join(rng.choice(WORDS) for _ in range(rng.randint(4, 20))) for _ in range(count)]
+
+
+def timed(fn, corpus):
+    start = time.perf_counter()
+    for message in corpus:
+        fn(message)
+    return (time.perf_counter() - start) / len(corpus) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='10,100,1000,5000', help='keyword counts to pad the catalog to')
+    parser.add_argument('--messages', type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'chat_intents.json'), encoding='utf-8') as f:
+        base = json.load(f)
+    corpus = messages(args.messages)
+
+    for size in [int(s) for s in args.sizes.split(',')]:
+        catalog = synthetic_catalog(base, size)
+        start = time.perf_counter()
+        matcher = IntentMatcher(catalog)
+        build_ms = (time.perf_counter() - start) * 1000
+        automaton_us = timed(matcher.match, corpus)
+        naive_us = timed(lambda message: naive_match(catalog, message), corpus)
+        print(f'{matcher.keyword_count:6d} keywords  build {build_ms:7.1f}ms  '
+              f'automaton {automaton_us:8.1f}us/msg  linear scan {naive_us:9.1f}us/msg')
+
+
+if __name__ == '__main__':
+    main()
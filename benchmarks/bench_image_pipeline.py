@@ -0,0 +1,127 @@
+"""
+Benchmark the disease-scanner pipeline: scans per second and upload latency
+with analysis inline on the request thread against queued jobs analyzed by
+the process pool, and how many uploads are turned away under an overload burst
+
+    python benchmarks/bench_image_pipeline.py [--images 200] [--clients 8] [--workers 4]
+"""
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+
+from _app import load_app, percentile
+
+
+def phone_photo(seed, size=(4032, 3024)):
+    """A JPEG the size of a phone camera photo, with enough detail to compress realistically"""
+    noise = Image.effect_noise((size[0] // 8, size[1] // 8), 40 + seed % 20).resize(size)
+    image = Image.merge('RGB', (noise, Image.linear_gradient('L').resize(size), noise.transpose(Image.FLIP_LEFT_RIGHT)))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=90)
+    return out.getvalue()
+
+
+def upload(app_module, photos, clients, total):
+    """Upload total photos from clients threads; returns (latencies, refused, job ids)"""
+    latencies, busy, jobs = [], [0], []
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def client_loop():
+        client = app_module.app.test_client()
+        while True:
+            with lock:
+                index = next(counter, None)
+            if index is None:
+                return
+            started = time.perf_counter()
+            response = client.post('/scan_disease', data=photos[index % len(photos)], content_type='image/jpeg')
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code == 503:
+                    busy[0] += 1
+                else:
+                    latencies.append(elapsed)
+                    jobs.append(response.get_json()['job_id'])
+
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, busy[0], jobs
+
+
+def finished(app_module, job_ids):
+    with app_module.app.app_context():
+        connection = app_module.db.session.connection()
+        return [app_module.jobs.get(connection, job_id)['status'] for job_id in job_ids]
+
+
+def run(app_module, photos, clients, total, workers):
+    """Upload while workers job threads analyze; returns (seconds until all analyzed, latencies, refused)"""
+    worker = app_module.job_queue.Worker(app_module.jobs, threads=workers, poll_interval=0.05,
+                                         context=app_module.app.app_context)
+    started = time.perf_counter()
+    worker.start()
+    latencies, busy, job_ids = upload(app_module, photos, clients, total)
+    while any(status in ('queued', 'running') for status in finished(app_module, job_ids)):
+        time.sleep(0.05)
+    seconds = time.perf_counter() - started
+    worker.stop()
+    failed = sum(status != 'done' for status in finished(app_module, job_ids))
+    if failed:
+        print(f'  {failed} jobs failed')
+    return seconds, latencies, busy
+
+
+def report(label, seconds, latencies, busy):
+    print(f'{label:32s} {len(latencies) / seconds:6.1f} scans/s  upload p50 {percentile(latencies, 50) * 1000:7.1f}ms'
+          f'  p95 {percentile(latencies, 95) * 1000:7.1f}ms  refused {busy}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=200)
+    parser.add_argument('--clients', type=int, default=8, help='concurrent uploaders')
+    parser.add_argument('--workers', type=int, default=4, help='analysis processes')
+    args = parser.parse_args()
+
+    photos = [phone_photo(seed) for seed in range(8)]
+    print(f'{len(photos)} test photos of {sum(map(len, photos)) // len(photos) // 1024} KB on average')
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0', JOB_WORKER_THREADS='0',
+                                         IMAGE_WORKERS=str(args.workers), IMAGE_MAX_PENDING=str(args.images))
+    analysis = app_module.image_analysis
+
+    # What the request thread would spend if it analyzed the upload itself
+    latencies = []
+    directory = app_module.app.config['IMAGE_UPLOAD_DIR']
+    started = time.perf_counter()
+    for index in range(min(args.images, 40)):
+        begun = time.perf_counter()
+        path = analysis.save_upload(io.BytesIO(photos[index % len(photos)]), directory, 1 << 30)
+        analysis.analyze_file(path, analysis.STUB_ANALYZER, app_module.app.config['IMAGE_MAX_SIDE'])
+        latencies.append(time.perf_counter() - begun)
+    report('inline on the request thread', time.perf_counter() - started, latencies, 0)
+
+    run(app_module, photos, args.workers, args.workers, args.workers)  # start the worker processes
+    report(f'queued, {args.workers} analysis processes', *run(app_module, photos, args.clients, args.images,
+                                                              args.workers))
+
+    app_module.app.config['IMAGE_MAX_PENDING'] = 2 * args.workers
+    report(f'overload, {2 * args.workers} pending at most', *run(app_module, photos, 4 * args.clients, args.images,
+                                                                args.workers))
+    app_module.image_analyzer.shutdown()
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
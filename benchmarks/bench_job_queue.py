@@ -0,0 +1,85 @@
+"""
+Benchmark the durable job queue: enqueue latency from a request-sized
+transaction, and jobs per second drained by worker threads and by forked
+worker processes, for no-op jobs and for jobs waiting 5ms on I/O
+
+    python benchmarks/bench_job_queue.py [--jobs 2000] [--threads 4] [--processes 2]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app, percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=2)
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0', JOB_WORKER_THREADS='0')
+    db, jobs, job_queue = app_module.db, app_module.jobs, app_module.job_queue
+    jobs.task('bench_noop')(lambda payload: None)
+    jobs.task('bench_io')(lambda payload: time.sleep(0.005))
+
+    def enqueue(kind):
+        latencies = []
+        with app_module.app.app_context():
+            for i in range(args.jobs):
+                started = time.perf_counter()
+                jobs.enqueue(db.session.connection(), kind, {'n': i})
+                db.session.commit()
+                latencies.append(time.perf_counter() - started)
+        return latencies
+
+    def drain_threads(threads):
+        worker = job_queue.Worker(jobs, threads=threads, poll_interval=0.05, context=app_module.app.app_context)
+        started = time.perf_counter()
+        worker.start()
+        while worker.processed < args.jobs:
+            time.sleep(0.01)
+        worker.stop()
+        return time.perf_counter() - started
+
+    def drain_processes(processes):
+        app_module.job_engine().dispose()
+        started = time.perf_counter()
+        children = []
+        for _ in range(processes):
+            pid = os.fork()
+            if pid == 0:
+                app_module.job_engine().dispose(close=False)
+                job_queue.Worker(jobs, threads=args.threads, context=app_module.app.app_context).run_pending()
+                os._exit(0)
+            children.append(pid)
+        for pid in children:
+            os.waitpid(pid, 0)
+        return time.perf_counter() - started
+
+    for kind in ('bench_noop', 'bench_io'):
+        latencies = enqueue(kind)
+        print(f'{kind}: enqueue + commit p50 {percentile(latencies, 50) * 1000:.2f}ms '
+              f'p99 {percentile(latencies, 99) * 1000:.2f}ms')
+        seconds = drain_threads(1)
+        print(f'  1 thread:                 {args.jobs / seconds:8.0f} jobs/s')
+        enqueue(kind)
+        seconds = drain_threads(args.threads)
+        print(f'  {args.threads} threads:                {args.jobs / seconds:8.0f} jobs/s')
+        enqueue(kind)
+        seconds = drain_processes(args.processes)
+        print(f'  {args.processes} processes x {args.threads} threads: {args.jobs / seconds:8.0f} jobs/s')
+
+    with app_module.app.app_context():
+        counts = db.session.execute(db.text('SELECT status, COUNT(*) FROM job GROUP BY status')).fetchall()
+    print('jobs by status:', dict(counts))
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
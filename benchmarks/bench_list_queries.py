@@ -0,0 +1,104 @@
+"""
+Check that the appointment and prescription lists and the dashboards run the
+same number of SQL queries however many rows they show, i.e. that the related
+patients and professionals are loaded in one batch rather than one per row
+
+    python benchmarks/bench_list_queries.py [--sizes 1,5,50]
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from jinja2 import ChoiceLoader, DictLoader
+
+from _app import load_app
+
+# Used only where the tree ships no template of that name; each one reads the
+# related users of every row, as the real pages do
+TEMPLATES = {
+    'appointments.html': '{% for a in appointments %}{{ a.professional.name }} {{ a.professional.specialty }}\n'
+                         '{% endfor %}',
+    'prescriptions.html': '{% for p in prescriptions %}{{ p.medication }} {{ p.professional.name }}\n{% endfor %}',
+    'patient_dashboard.html': '{% for a in appointments %}{{ a.professional.name }}\n{% endfor %}'
+                              '{% for p in prescriptions %}{{ p.professional.name }}\n{% endfor %}',
+    'professional_dashboard.html': '{% for a in appointments %}{{ a.patient.name }} {{ a.patient.age }}\n'
+                                   '{% endfor %}',
+}
+
+
+def seed(app_module, size, index):
+    """A patient and a professional who each see size rows, every one with a different counterpart"""
+    db, User = app_module.db, app_module.User
+    soon = (datetime.utcnow() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    with app_module.app.app_context():
+        patient = User(name=f'Patient {index}', email=f'patient{index}@example.lr', password_hash='',
+                       user_type='patient', county='Bong')
+        professional = User(name=f'Dr {index}', email=f'dr{index}@example.lr', password_hash='',
+                            user_type='professional', is_approved=True, specialty='General Practice')
+        others = [User(name=f'Other {index}-{i}', email=f'other{index}-{i}@example.lr', password_hash='',
+                       user_type='professional', is_approved=True, specialty='Pediatrics', age=30 + i % 40)
+                  for i in range(size)]
+        db.session.add_all([patient, professional] + others)
+        db.session.flush()
+        for i, other in enumerate(others):
+            when = soon + timedelta(hours=i)
+            db.session.add(app_module.Appointment(patient_id=patient.id, professional_id=other.id,
+                                                  appointment_date=when, appointment_type='in-person'))
+            db.session.add(app_module.Appointment(patient_id=other.id, professional_id=professional.id,
+                                                  appointment_date=when, appointment_type='virtual'))
+            db.session.add(app_module.Prescription(patient_id=patient.id, professional_id=other.id,
+                                                   medication='Paracetamol', dosage='1g'))
+        db.session.commit()
+        return patient.id, professional.id
+
+
+def count_queries(app_module, user_id, user_type, url):
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = user_id
+        sess['user_type'] = user_type
+    with app_module.query_plans.capture_statements(*app_module.engines.values()) as statements:
+        response = client.get(url)
+    return response.status_code, len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,5,50', help='rows per list, comma separated')
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(',')]
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0', JOB_WORKER_THREADS='0', IMAGE_WORKERS='0',
+                                         METRICS_SAMPLE_RATE='0')
+    app = app_module.app
+    app.jinja_loader = ChoiceLoader([app.jinja_loader, DictLoader(TEMPLATES)])
+    users = [seed(app_module, size, index) for index, size in enumerate(sizes)]
+
+    routes = [('patient', url) for url in ('/appointments', '/api/appointments', '/prescriptions',
+                                           '/api/prescriptions', '/dashboard')] + [('professional', '/dashboard')]
+    failed = 0
+    print(f"{'user':13s}{'route':20s}" + ''.join(f'{size:>8d} rows' for size in sizes))
+    for user_type, url in routes:
+        counts = []
+        for (patient_id, professional_id), size in zip(users, sizes):
+            user_id = patient_id if user_type == 'patient' else professional_id
+            status, queries = count_queries(app_module, user_id, user_type, f'{url}?page_size={size}')
+            counts.append(queries if status == 200 else f'HTTP {status}')
+        steady = len(set(counts)) == 1 and all(isinstance(count, int) for count in counts)
+        failed += not steady
+        print(f'{user_type:13s}{url:20s}' + ''.join(f'{count:>13}' for count in counts)
+              + ('' if steady else '  <- varies with the rows shown'))
+
+    app_module.image_analyzer.shutdown()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
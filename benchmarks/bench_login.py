@@ -0,0 +1,104 @@
+"""
+Benchmark login throughput and the latency of an unrelated route during a login burst,
+with password hashing inline on request threads versus in the process pool
+
+    python benchmarks/bench_login.py [--threads 8] [--seconds 5] [--workers 2]
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app, percentile
+
+
+def run(main, hasher, threads, seconds, users):
+    main.password_hasher = hasher
+    stop = threading.Event()
+    login_times, probe_times = [], []
+    busy = [0]
+    lock = threading.Lock()
+
+    def login_worker(index):
+        client = main.app.test_client()
+        email = users[index % len(users)]
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = client.post('/login', json={'email': email, 'password': 'correct horse'})
+            elapsed = time.perf_counter() - start
+            with lock:
+                if response.status_code == 503:
+                    busy[0] += 1
+                else:
+                    login_times.append(elapsed)
+
+    def probe_worker():
+        client = main.app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            client.get('/api/facets/facilities')
+            probe_times.append(time.perf_counter() - start)
+            time.sleep(0.005)
+
+    workers = [threading.Thread(target=login_worker, args=(i,)) for i in range(threads)]
+    workers.append(threading.Thread(target=probe_worker))
+    for worker in workers:
+        worker.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker in workers:
+        worker.join()
+
+    return {
+        'logins_per_second': len(login_times) / seconds,
+        'login_p50_ms': percentile(login_times, 50) * 1000,
+        'login_p99_ms': percentile(login_times, 99) * 1000,
+        'probe_p50_ms': percentile(probe_times, 50) * 1000,
+        'probe_p99_ms': percentile(probe_times, 99) * 1000,
+        'busy_rejections': busy[0],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='concurrent login clients')
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--workers', type=int, default=2, help='hashing processes in pool mode')
+    parser.add_argument('--max-pending', type=int, default=16)
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    from password_hashing import PasswordHasher
+
+    inline = PasswordHasher(workers=0)
+    users = []
+    with app_module.app.app_context():
+        for i in range(args.threads):
+            email = f'bench{i}@example.lr'
+            app_module.db.session.add(app_module.User(
+                name=f'Bench {i}', email=email, password_hash=inline.hash('correct horse'),
+                user_type='patient', is_approved=True))
+            users.append(email)
+        app_module.db.session.commit()
+
+    pooled = PasswordHasher(workers=args.workers, max_pending=args.max_pending)
+    pooled.verify(inline.hash('warm up'), 'warm up')  # start the worker processes
+
+    try:
+        for label, hasher in (('inline', inline), (f'pool({args.workers})', pooled)):
+            result = run(app_module, hasher, args.threads, args.seconds, users)
+            print(f"{label:10s} logins/s {result['logins_per_second']:7.1f}  "
+                  f"login p50 {result['login_p50_ms']:7.1f}ms p99 {result['login_p99_ms']:7.1f}ms  "
+                  f"other route p50 {result['probe_p50_ms']:6.2f}ms p99 {result['probe_p99_ms']:7.2f}ms  "
+                  f"busy {result['busy_rejections']}")
+    finally:
+        pooled.shutdown()
+        os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Benchmark the mental-health trend cache on a large assessment history: the
+vectorized initial build against a row-by-row Python pass over the same rows,
+the cost of folding in one new assessment, and the trend API reads
+
+    python benchmarks/bench_mental_health_trends.py [--assessments 1000000] [--users 50000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+
+INDICATORS = ['sleep', 'appetite', 'energy', 'focus', 'hopelessness', 'isolation', 'guilt']
+
+
+def row_by_row(connection, window, query):
+    """The same county/week means, indicator counts and per-user windows computed one row at a time"""
+    counties = dict(connection.exec_driver_sql('SELECT id, county FROM "user"').fetchall())
+    weeks = defaultdict(lambda: [0, 0.0, 0, 0.0, 0])
+    indicators = defaultdict(int)
+    recent = defaultdict(list)
+    cell_of = {}
+    cursor = connection.connection.cursor()
+    for assessment_id, user_id, seconds, mood, anxiety in cursor.execute(query, (0,)):
+        key = cell_of[assessment_id] = (counties.get(user_id), (seconds // 86400 + 3) // 7)
+        cell = weeks[key]
+        cell[0] += 1
+        if mood is not None:
+            cell[1] += mood
+            cell[2] += 1
+        if anxiety is not None:
+            cell[3] += anxiety
+            cell[4] += 1
+        history = recent[user_id]
+        history.append((seconds, mood, anxiety))
+        history.sort()
+        del history[:-2 * window]
+    for assessment_id, indicator in cursor.execute('SELECT assessment_id, indicator FROM assessment_indicator'):
+        indicators[cell_of[assessment_id] + (indicator,)] += 1
+    cursor.close()
+    return weeks, indicators, recent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--assessments', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=50000)
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    db, trends = app_module.db, app_module.mental_health_trends
+    rng = random.Random(18)
+    now = datetime.utcnow()
+    with app_module.app.app_context():
+        db.session.execute(app_module.User.__table__.insert(), [{
+            'name': f'Patient {i}', 'email': f'patient{i}@example.lr', 'password_hash': '', 'user_type': 'patient',
+            'county': rng.choice(app_module.LIBERIAN_COUNTIES),
+        } for i in range(args.users)])
+        started = time.perf_counter()
+        for offset in range(0, args.assessments, 100000):
+            count = min(100000, args.assessments - offset)
+            rows = [{
+                'id': offset + i + 1, 'user_id': rng.randint(1, args.users),
+                'mood_score': rng.randint(1, 10), 'anxiety_level': rng.randint(1, 10),
+                'depression_indicators': json.dumps(rng.sample(INDICATORS, rng.randint(0, 3))),
+                'assessment_date': now - timedelta(seconds=rng.randint(0, 365 * 86400)),
+            } for i in range(count)]
+            db.session.execute(app_module.MentalHealthAssessment.__table__.insert(), rows)
+            db.session.execute(app_module.AssessmentIndicator.__table__.insert(), [
+                indicator for row in rows for indicator in trends.indicator_rows(row['id'], row['depression_indicators'])])
+        db.session.commit()
+        print(f'{args.assessments:,} assessments for {args.users:,} users inserted in '
+              f'{time.perf_counter() - started:.1f}s')
+
+        connection = db.session.connection()
+        started = time.perf_counter()
+        app_module.get_trend_cache()
+        print(f'vectorized build:  {time.perf_counter() - started:6.2f}s')
+        started = time.perf_counter()
+        row_by_row(connection, app_module.app.config['MENTAL_HEALTH_WINDOW'], trends.NEW_ASSESSMENTS)
+        print(f'row-by-row Python: {time.perf_counter() - started:6.2f}s (same aggregates)')
+        patient_id = rng.randint(1, args.users)
+        db.session.rollback()
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = patient_id
+    for label, url in (('county trends, all counties', '/api/mental_health/county_trends?weeks=52'),
+                       ('county trends, one county', '/api/mental_health/county_trends?county=Bong&weeks=12'),
+                       ("one user's trend", '/api/mental_health/trends')):
+        started = time.perf_counter()
+        for _ in range(20):
+            client.get(url)
+        print(f'{label:28s} {(time.perf_counter() - started) / 20 * 1000:7.1f}ms')
+
+    timings = []
+    for _ in range(20):
+        client.post('/assessment', json={'mood_score': 2, 'anxiety_level': 9, 'depression_indicators': ['sleep']})
+        started = time.perf_counter()
+        client.get('/api/mental_health/county_trends?county=Bong&weeks=12')
+        timings.append(time.perf_counter() - started)
+    print(f'read after one new assessment {sum(timings) / len(timings) * 1000:7.1f}ms (incremental fold-in)')
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
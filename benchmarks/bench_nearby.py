@@ -0,0 +1,101 @@
+"""
+Benchmark k-nearest facility queries on a synthetic 100k-facility set
+
+    python benchmarks/bench_nearby.py [--facilities 100000] [--queries 5000] [--k 5]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from spatial_index import FacilityIndex, haversine_km, parse_services
+
+# Rough bounding box of Liberia
+LAT_RANGE = (4.35, 8.55)
+LON_RANGE = (-11.50, -7.37)
+
+# Valid coordinates far from every facility, where the ring search used to run away
+FAR_POINTS = [(-89.0, 179.0), (-30.0, 40.0), (60.0, -150.0), (89.9, -11.0)]
+
+SERVICES = ['Emergency', 'Surgery', 'Maternity', 'Pediatrics', 'Laboratory', 'Pharmacy',
+            'Vaccinations', 'Family Planning', 'Mental Health', 'Dental Care', 'Eye Care',
+            'HIV/AIDS Treatment', 'TB Treatment', 'Outpatient Care']
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def synthetic_facilities(n, rng):
+    for facility_id in range(1, n + 1):
+        yield (facility_id,
+               rng.uniform(*LAT_RANGE),
+               rng.uniform(*LON_RANGE),
+               ', '.join(rng.sample(SERVICES, rng.randint(2, 6))))
+
+
+def run_queries(index, points, k, service):
+    timings = []
+    for lat, lon in points:
+        start = time.perf_counter()
+        index.nearest(lat, lon, k, service=service)
+        timings.append((time.perf_counter() - start) * 1e6)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--facilities', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=5000)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=2024)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = list(synthetic_facilities(args.facilities, rng))
+
+    start = time.perf_counter()
+    index = FacilityIndex()
+    index.load(rows)
+    print(f"built index over {len(index)} facilities in {time.perf_counter() - start:.2f}s")
+
+    points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(args.queries)]
+
+    # Spot-check against a brute-force scan
+    for lat, lon in points[:20] + FAR_POINTS:
+        expected = sorted((haversine_km(lat, lon, r[1], r[2]), r[0]) for r in rows)[:args.k]
+        got = index.nearest(lat, lon, args.k)
+        assert [key for _, key in got] == [key for _, key in expected], (lat, lon)
+        expected = sorted((haversine_km(lat, lon, r[1], r[2]), r[0]) for r in rows
+                          if 'mental health' in parse_services(r[3]))[:args.k]
+        got = index.nearest(lat, lon, args.k, service='Mental Health')
+        assert [key for _, key in got] == [key for _, key in expected], (lat, lon)
+
+    for label, service in [('all facilities', None), ('service=maternity', 'maternity'),
+                           ('service=care (substring)', 'care')]:
+        timings = run_queries(index, points, args.k, service)
+        print(f"{label:28s} k={args.k}: mean {sum(timings) / len(timings):7.1f}us  "
+              f"p50 {percentile(timings, 50):7.1f}us  p99 {percentile(timings, 99):7.1f}us")
+
+    timings = run_queries(index, FAR_POINTS * 5, 50, None)
+    print(f"{'far from all facilities':28s} k=50: mean {sum(timings) / len(timings) / 1000:7.1f}ms  "
+          f"max {max(timings) / 1000:7.1f}ms")
+    small = FacilityIndex()
+    small.load(rows[:40])
+    timings = run_queries(small, FAR_POINTS * 5, 50, None)
+    print(f"{'far, 40 facilities':28s} k=50: mean {sum(timings) / len(timings):7.1f}us  "
+          f"max {max(timings):7.1f}us")
+
+    start = time.perf_counter()
+    for facility_id, lat, lon, services in rows[:10000]:
+        index.upsert(facility_id, lat + 0.01, lon - 0.01, services)
+    print(f"incremental upsert: {(time.perf_counter() - start) / 10000 * 1e6:.1f}us per facility")
+
+
+if __name__ == '__main__':
+    main()
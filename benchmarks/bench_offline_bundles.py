@@ -0,0 +1,76 @@
+"""
+Benchmark building the offline bundle of every county on a synthetic
+directory, reporting raw, gzip and brotli sizes and the build time per county
+
+    python benchmarks/bench_offline_bundles.py [--facilities 5000] [--professionals 2000] [--articles 300]
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--facilities', type=int, default=5000)
+    parser.add_argument('--professionals', type=int, default=2000)
+    parser.add_argument('--articles', type=int, default=300)
+    args = parser.parse_args()
+
+    bundle_dir = tempfile.mkdtemp(prefix='carenet-bundles-')
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0', OFFLINE_BUNDLE_DIR=bundle_dir)
+    db, counties = app_module.db, app_module.LIBERIAN_COUNTIES
+    offline_bundles = app_module.offline_bundles
+    rng = random.Random(16)
+    with app_module.app.app_context():
+        db.session.execute(app_module.HealthFacility.__table__.insert(), [{
+            'name': f'Facility {i}', 'county': rng.choice(counties), 'facility_type': 'clinic',
+            'services': 'General Medicine, Maternity, Immunization', 'contact': f'0770{i:06d}',
+            'latitude': 6.3 + rng.random(), 'longitude': -10.8 + rng.random(),
+        } for i in range(args.facilities)])
+        db.session.execute(app_module.User.__table__.insert(), [{
+            'name': f'Dr Bundle {i}', 'email': f'bundle{i}@example.lr', 'password_hash': '',
+            'user_type': 'professional', 'is_approved': True, 'county': rng.choice(counties),
+            'specialty': rng.choice(['General Practice', 'Pediatrics', 'Psychiatry']),
+            'availability': 'Mon-Fri 08:00-16:00',
+        } for i in range(args.professionals)])
+        db.session.execute(app_module.HealthEducation.__table__.insert(), [{
+            'title': f'Article {i}', 'content': 'Wash hands with soap and clean water. ' * 40,
+            'category': rng.choice(['hygiene', 'malaria', 'nutrition']), 'language': rng.choice(['English', 'Kpelle', 'Bassa']),
+        } for i in range(args.articles)])
+        db.session.commit()
+
+    encodings = offline_bundles.available_encodings()
+    print(f'encodings: {", ".join(encodings)}' + ('' if 'br' in encodings else ' (pip install brotli for br)'))
+    print(f'{"county":18s} {"raw KiB":>8s} ' + ' '.join(f'{e + " KiB":>9s}' for e in encodings) + f' {"build ms":>9s}')
+    total_started = time.perf_counter()
+    for county in counties:
+        started = time.perf_counter()
+        app_module.build_county_bundle(county)
+        elapsed = time.perf_counter() - started
+        with app_module.app.app_context():
+            raw = len(json.dumps(app_module.county_bundle(county), ensure_ascii=False, separators=(',', ':')).encode())
+        files = offline_bundles.manifest(bundle_dir, [county])[county]['files']
+        print(f'{county:18s} {raw / 1024:8.1f} ' + ' '.join(f'{files[e]["size"] / 1024:9.1f}' for e in encodings)
+              + f' {elapsed * 1000:9.0f}')
+    print(f'all {len(counties)} counties built in {time.perf_counter() - total_started:.2f}s')
+
+    started = time.perf_counter()
+    for county in counties:
+        app_module.build_county_bundle(county)
+    print(f'unchanged rebuild of all counties: {time.perf_counter() - started:.2f}s (no files rewritten)')
+    shutil.rmtree(bundle_dir)
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark /offline_sync with large gzip batches of mixed records, then replay
+the same batch as a client would after a dropped connection
+
+    python benchmarks/bench_offline_sync.py [--records 10000] [--appointments 200]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+
+
+def build_batch(count, appointments, professional_ids, rng):
+    start = (datetime.utcnow() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+    records = []
+    for i in range(count):
+        key = uuid.uuid4().hex
+        if i < appointments:
+            records.append({'key': key, 'type': 'appointment', 'data': {
+                'professional_id': rng.choice(professional_ids),
+                'appointment_date': (start + timedelta(minutes=30 * rng.randint(0, 48 * 7))).isoformat(),
+                'appointment_type': 'in-person'}})
+        elif i % 100 == 0:
+            records.append({'key': key, 'type': 'profile', 'data': {'contact': f'0770{i:06d}'}})
+        else:
+            records.append({'key': key, 'type': 'assessment', 'data': {
+                'mood_score': rng.randint(1, 10), 'anxiety_level': rng.randint(1, 10),
+                'depression_indicators': rng.sample(['sleep', 'appetite', 'energy', 'focus'], 2),
+                'assessment_date': (datetime.utcnow() - timedelta(hours=rng.randint(0, 72))).isoformat()}})
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--appointments', type=int, default=200, help='appointment requests among the records')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    db, User = app_module.db, app_module.User
+    rng = random.Random(5)
+    with app_module.app.app_context():
+        worker = User(name='Field Worker', email='field@example.lr', password_hash='', user_type='patient',
+                      is_approved=True)
+        professionals = [User(name=f'Dr Sync {i}', email=f'sync{i}@example.lr', password_hash='',
+                              user_type='professional', is_approved=True, availability='Daily 00:00-24:00')
+                         for i in range(20)]
+        db.session.add_all([worker] + professionals)
+        db.session.commit()
+        worker_id, professional_ids = worker.id, [p.id for p in professionals]
+
+    records = build_batch(args.records, args.appointments, professional_ids, rng)
+    raw = json.dumps({'records': records}).encode()
+    body = gzip.compress(raw)
+    print(f'{args.records} records: {len(raw) / 1024:.0f} KiB JSON, {len(body) / 1024:.0f} KiB gzip')
+
+    client = app_module.app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = worker_id
+    for label in ('first upload', 'replay'):
+        started = time.perf_counter()
+        response = client.post('/offline_sync', data=body, headers={'Content-Encoding': 'gzip',
+                                                                    'Content-Type': 'application/json'})
+        elapsed = time.perf_counter() - started
+        result = response.get_json()
+        print(f'{label:12s} {elapsed * 1000:8.0f}ms ({args.records / elapsed:,.0f} records/s)  {result["counts"]}')
+
+    with app_module.app.app_context():
+        print(f'assessments stored: {app_module.MentalHealthAssessment.query.count()}, '
+              f'appointments stored: {app_module.Appointment.query.count()}')
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
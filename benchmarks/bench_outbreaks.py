@@ -0,0 +1,81 @@
+"""
+Benchmark the outbreak monitor: folding a long signal history in from scratch,
+the per-read cost of catching up with one new signal, the time-series and
+alert reads, and the bucket count the retention settings hold it to
+
+    python benchmarks/bench_outbreaks.py [--signals 1000000] [--days 1095]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+
+DISEASES = ['fever', 'malaria', 'cholera', 'lassa fever', 'measles', 'mental-distress']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--signals', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=3 * 365, help='days of history the signals span')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    db, table = app_module.db, app_module.OutbreakSignal.__table__
+    rng = random.Random(19)
+    today = datetime.utcnow().date()
+    with app_module.app.app_context():
+        started = time.perf_counter()
+        for offset in range(0, args.signals, 100000):
+            db.session.execute(table.insert(), [{
+                'day': today - timedelta(days=rng.randint(0, args.days - 1)),
+                'county': rng.choice(app_module.LIBERIAN_COUNTIES), 'disease': rng.choice(DISEASES),
+                'source': 'chat', 'count': 1,
+            } for _ in range(min(100000, args.signals - offset))])
+        # An outbreak in the last three days of one series
+        db.session.execute(table.insert(), [{'day': today - timedelta(days=day), 'county': 'Lofa',
+                                             'disease': 'cholera', 'source': 'chat', 'count': 1}
+                                            for day in range(3) for _ in range(40)])
+        db.session.commit()
+        print(f'{args.signals:,} signals over {args.days} days inserted in {time.perf_counter() - started:.1f}s')
+
+        monitor = app_module.outbreak_monitor
+        started = time.perf_counter()
+        app_module.get_outbreak_monitor()
+        print(f'initial fold-in:           {time.perf_counter() - started:7.2f}s')
+        print(f'buckets held:              {monitor.bucket_count():7,} for {len(monitor.series)} series '
+              f'({app_module.app.config["OUTBREAK_DAILY_DAYS"]} daily days, '
+              f'{app_module.app.config["OUTBREAK_WEEKLY_WEEKS"]} weekly weeks)')
+        db.session.rollback()
+
+    client = app_module.app.test_client()
+    for label, url in (('time series, all', '/api/outbreaks?days=30'),
+                       ('time series, one county', '/api/outbreaks?county=Lofa&days=90'),
+                       ('alerts', '/api/outbreaks/alerts')):
+        started = time.perf_counter()
+        for _ in range(20):
+            response = client.get(url)
+        print(f'{label:26s} {(time.perf_counter() - started) / 20 * 1000:7.1f}ms')
+    alerts = response.get_json()['alerts']
+    print('alarming:', ', '.join(f"{alert['county']}/{alert['disease']} (score {alert['score']})"
+                                 for alert in alerts) or 'none')
+
+    timings = []
+    for _ in range(20):
+        client.post('/chat', json={'message': 'I have a fever'})
+        client.delete_cookie('session')  # a new session signals again
+        started = time.perf_counter()
+        client.get('/api/outbreaks/alerts')
+        timings.append(time.perf_counter() - started)
+    print(f'read after one new signal  {sum(timings) / len(timings) * 1000:7.1f}ms (incremental fold-in)')
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,314 @@
+"""
+Benchmark every route of the app against synthetic data of a chosen scale:
+throughput and p50/p95/p99 latency per route, saved as JSON that a later run
+(for instance on another commit) can be compared with
+
+    python benchmarks/bench_routes.py [--scale 1.0] [--database carenet-bench.db] [--requests 50]
+        [--concurrency 1] [--routes REGEX] [--wsgi] [--output results.json] [--compare baseline.json]
+
+At scale 1.0 the data is 10k professionals, 100k patients and 1M each of
+appointments and prescriptions; --database keeps the generated file, so later
+runs and other commits reuse the same rows. Requests go through the Flask test
+client, or with --wsgi over HTTP to a local threaded WSGI server.
+"""
+
+import argparse
+import gzip
+import io
+import itertools
+import json
+import os
+import platform
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import ROOT, load_app, percentile
+import synthetic
+
+PASSWORD = 'benchmark-password'
+CHAT_MESSAGES = ['I have a fever and headache', 'Where can I get a malaria test?', 'My child has diarrhoea',
+                 'I feel anxious and cannot sleep', 'How do I book an appointment?']
+REGRESSION = 1.10  # flag routes at least 10% slower at p50 or p95 than the baseline
+
+
+class Case:
+    """One benchmarked request; body(n) builds the n-th request's keyword arguments"""
+
+    def __init__(self, method, url, body=None, anonymous=False):
+        self.method = method
+        self.url = url
+        self.body = body or (lambda n: {})
+        self.anonymous = anonymous  # sent without the logged-in session
+
+    @property
+    def name(self):
+        return f'{self.method} {self.url}'
+
+
+class TestClientDriver:
+    def __init__(self, app):
+        self.app = app
+
+    def client(self):
+        return self.app.test_client()
+
+    @staticmethod
+    def send(client, method, url, json=None, data=None, headers=None):
+        return client.open(url, method=method, json=json, data=data, headers=headers).status_code
+
+
+class WsgiDriver:
+    """Serve the app on a free local port and talk HTTP to it"""
+
+    def __init__(self, app):
+        import requests
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+
+        self.requests = requests
+        self.server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+        self.base = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def client(self):
+        return self.requests.Session()
+
+    def send(self, client, method, url, json=None, data=None, headers=None):
+        return client.request(method, self.base + url, json=json, data=data, headers=headers,
+                              allow_redirects=False).status_code
+
+
+def scan_image():
+    from PIL import Image
+    out = io.BytesIO()
+    Image.effect_noise((640, 480), 40).convert('RGB').save(out, 'JPEG', quality=85)
+    return out.getvalue()
+
+
+def build_cases(app_module, client, driver, patient, professional_ids):
+    """Every GET route without arguments, the filtered variants, the routes with arguments and the POSTs"""
+    app = app_module.app
+    cases = [Case('GET', rule.rule, anonymous=rule.rule == '/logout')
+             for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule)
+             if 'GET' in rule.methods and not rule.arguments]
+    cases += [Case('GET', url) for url in app_module.QUERY_PLAN_PROBES]
+    first_slot = (datetime.utcnow() + timedelta(days=120)).replace(hour=0, minute=0, second=0, microsecond=0)
+    slot = timedelta(minutes=app.config['APPOINTMENT_SLOT_MINUTES'])
+    image = scan_image()
+    cases += [
+        Case('GET', '/api/professionals?county=Nimba&specialty=pediatrics'),
+        Case('GET', '/api/slots?county=Bong&count=20'),
+        Case('GET', '/api/mental_health/county_trends?county=Lofa&weeks=26'),
+        Case('GET', '/api/outbreaks?county=Montserrado&days=90'),
+        Case('GET', '/api/changes?limit=500'),
+        Case('GET', f'/approve_professional/{professional_ids[0]}'),
+        Case('GET', '/set_language/kpelle'),
+        Case('POST', '/register', anonymous=True, body=lambda n: {'json': {
+            'name': 'Bench Patient', 'email': f'bench-{os.getpid()}-{n}-{time.time_ns()}@example.lr',
+            'password': PASSWORD, 'user_type': 'patient', 'county': 'Bong'}}),
+        Case('POST', '/login', anonymous=True, body=lambda n: {'json': {'email': patient.email, 'password': PASSWORD}}),
+        Case('POST', '/book_appointment', body=lambda n: {'json': {
+            'professional_id': professional_ids[n % len(professional_ids)], 'appointment_type': 'virtual',
+            'appointment_date': (first_slot + slot * (n // len(professional_ids))).isoformat()}}),
+        Case('POST', '/chat', body=lambda n: {'json': {'message': CHAT_MESSAGES[n % len(CHAT_MESSAGES)]}}),
+        Case('POST', '/assessment', body=lambda n: {'json': {
+            'mood_score': 1 + n % 10, 'anxiety_level': 1 + n * 7 % 10, 'depression_indicators': ['sleep']}}),
+        Case('POST', '/translate', body=lambda n: {'json': {'text': 'Hello, how are you?', 'language': 'kpelle'}}),
+        Case('POST', '/offline_sync', body=lambda n: {'data': gzip.compress(json.dumps({'records': [
+            {'key': f'bench-{time.time_ns()}-{n}-{i}', 'type': 'assessment',
+             'data': {'mood_score': 5, 'anxiety_level': 4}} for i in range(10)]}).encode()),
+            'headers': {'Content-Type': 'application/json', 'Content-Encoding': 'gzip'}}),
+        Case('POST', '/scan_disease', body=lambda n: {'data': image, 'headers': {'Content-Type': 'image/jpeg'}}),
+    ]
+
+    # Routes whose arguments come from the app's own replies
+    deadline = time.monotonic() + 120  # the first manifest request starts building the bundles
+    while time.monotonic() < deadline:
+        bundles = [bundle for bundle in json.loads(client_get(driver, client, '/api/offline_bundles'))['bundles'].values()
+                   if bundle]
+        if bundles:
+            cases.append(Case('GET', next(iter(bundles[0]['files'].values()))['url']))
+            break
+        time.sleep(1)
+    scan = driver.send(client, 'POST', '/scan_disease', data=image, headers={'Content-Type': 'image/jpeg'})
+    if scan == 202:
+        with app.app_context():
+            connection = app_module.db.session.connection()
+            job_id = connection.exec_driver_sql(f'SELECT MAX(id) FROM {app_module.job_queue.JOB_TABLE}').scalar()
+            cases.append(Case('GET', f"/scan_disease/{job_id}/{app_module.jobs.get(connection, job_id)['payload']['token']}"))
+    covered = {re.sub(r'\?.*', '', case.url) for case in cases}
+    missing = [rule.rule for rule in app.url_map.iter_rules() if rule.endpoint != 'static'
+               and not any(re.fullmatch(re.sub(r'<[^>]+>', '[^/]+', rule.rule), url) for url in covered)]
+    return cases, missing
+
+
+def client_get(driver, client, url):
+    if isinstance(driver, TestClientDriver):
+        return client.get(url).get_data(as_text=True)
+    return client.get(driver.base + url).text
+
+
+def run_case(driver, case, clients, anonymous_clients, requests_per_case):
+    """Send requests_per_case requests spread over the clients; returns the route's statistics"""
+    pool = anonymous_clients if case.anonymous else clients
+    counter = itertools.count()
+    latencies, statuses, lock = [], {}, threading.Lock()
+
+    def loop(client):
+        while True:
+            n = next(counter)
+            if n >= requests_per_case:
+                return
+            kwargs = case.body(n)
+            started = time.perf_counter()
+            try:
+                status = driver.send(client, case.method, case.url, **kwargs)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    driver.send(pool[0], case.method, case.url, **case.body(requests_per_case))  # warm-up, not timed
+    threads = [threading.Thread(target=loop, args=(client,)) for client in pool]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+    errors = sum(count for status, count in statuses.items() if not status.isdigit() or int(status) >= 500)
+    return {
+        'requests': len(latencies), 'errors': errors, 'statuses': statuses,
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2), 'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2), 'max_ms': round(max(latencies) * 1000, 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Print p50/p95 against a baseline result file, flagging regressions"""
+    print(f"\nAgainst {baseline['meta'].get('commit')} ({baseline['meta'].get('date')}):")
+    for key in ('rows', 'requests', 'concurrency', 'driver', 'cpus'):
+        if baseline['meta'].get(key) != results['meta'].get(key):
+            print(f"  note: {key} differs ({baseline['meta'].get(key)} -> {results['meta'].get(key)})")
+    print(f"{'route':60s} {'p50 ms':>17s} {'p95 ms':>17s}")
+    regressions = 0
+    for name, current in results['routes'].items():
+        before = baseline['routes'].get(name)
+        if before is None:
+            print(f'{name[:60]:60s} new')
+            continue
+        slower = any(current[key] > before[key] * REGRESSION and current[key] - before[key] > 1
+                     for key in ('p50_ms', 'p95_ms'))
+        regressions += slower
+        print(f"{name[:60]:60s} {before['p50_ms']:7.1f} -> {current['p50_ms']:7.1f} "
+              f"{before['p95_ms']:7.1f} -> {current['p95_ms']:7.1f}{'  SLOWER' if slower else ''}")
+    print(f'{regressions} route(s) slower by more than {REGRESSION - 1:.0%}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=1.0, help='fraction of the full synthetic data set')
+    parser.add_argument('--database', help='SQLite file to keep and reuse; generated when missing')
+    parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--concurrency', type=int, default=1, help='clients sending at once')
+    parser.add_argument('--routes', help='only routes whose "METHOD url" matches this regex')
+    parser.add_argument('--wsgi', action='store_true', help='send real HTTP to a local WSGI server')
+    parser.add_argument('--output', help='results file (default route-bench-<commit>.json)')
+    parser.add_argument('--compare', help='earlier results file to compare with')
+    args = parser.parse_args()
+
+    # Before the app starts threads: a pool forking meanwhile would inherit git's pipes
+    commit = git_commit()
+    database_path = os.path.abspath(args.database) if args.database else None
+    generate = database_path is None or not os.path.exists(database_path)
+    app_module, database_path = load_app(database_path, PASSWORD_HASH_WORKERS='0', JOB_WORKER_THREADS='1',
+                                         STATS_RECONCILE_INTERVAL='0')
+    app = app_module.app
+    if generate:
+        started = time.perf_counter()
+        synthetic.generate(app_module, args.scale)
+        print(f'Generated in {time.perf_counter() - started:.0f}s')
+    counts = synthetic.table_counts(app_module)
+    print('Rows:', ', '.join(f'{name} {count:,}' for name, count in counts.items()))
+
+    with app.app_context():
+        User = app_module.User
+        patient = User.query.filter_by(user_type='patient').order_by(User.id).first()
+        patient.password_hash = app_module.password_hasher.hash(PASSWORD)
+        app_module.db.session.commit()
+        app_module.db.session.refresh(patient)
+        professional_ids = [row.id for row in User.query.filter_by(user_type='professional', is_approved=True)
+                            .filter(User.availability == 'Daily 08:00-20:00').order_by(User.id).limit(50)]
+        app_module.db.session.expunge(patient)
+        started = time.perf_counter()
+        app_module.warm_indexes()
+        print(f'In-memory indexes loaded in {time.perf_counter() - started:.1f}s')
+
+    driver = WsgiDriver(app) if args.wsgi else TestClientDriver(app)
+    clients, anonymous_clients = [], []
+    for _ in range(args.concurrency):
+        client = driver.client()
+        driver.send(client, 'POST', '/login', json={'email': patient.email, 'password': PASSWORD})
+        clients.append(client)
+        anonymous_clients.append(driver.client())
+
+    cases, missing = build_cases(app_module, clients[0], driver, patient, professional_ids)
+    if args.routes:
+        cases = [case for case in cases if re.search(args.routes, case.name)]
+    if missing:
+        print('Not covered:', ', '.join(missing))
+
+    results = {
+        'meta': {
+            'commit': commit, 'date': datetime.utcnow().isoformat(timespec='seconds'), 'scale': args.scale,
+            'rows': counts, 'requests': args.requests, 'concurrency': args.concurrency,
+            'driver': 'wsgi' if args.wsgi else 'test_client', 'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version, 'cpus': os.cpu_count(),
+        },
+        'routes': {},
+    }
+    print(f"\n{'route':60s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'errors':>6s}")
+    for case in cases:
+        stats = run_case(driver, case, clients, anonymous_clients, args.requests)
+        results['routes'][case.name] = stats
+        print(f"{case.name[:60]:60s} {stats['rps']:8.1f} {stats['p50_ms']:8.1f} {stats['p95_ms']:8.1f} "
+              f"{stats['p99_ms']:8.1f} {stats['errors']:6d}")
+
+    output = args.output or f"route-bench-{results['meta']['commit'] or 'local'}.json"
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=1)
+    print(f'\nSaved {output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    app_module.job_worker.stop()
+    app_module.image_analyzer.shutdown()
+    if not args.database:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(database_path + suffix):
+                os.remove(database_path + suffix)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark /api/slots free-slot search over thousands of professionals with
+mixed weekly schedules and a busy appointment book
+
+    python benchmarks/bench_slots.py [--professionals 5000] [--appointments 50000] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app, percentile
+
+SPECIALTIES = ['Pediatrics', 'Internal Medicine', 'Obstetrics', 'General Practice', 'Nursing', 'Surgery']
+SCHEDULES = ['Mon-Fri 08:00-17:00', 'Mon-Sat 9am-1pm', 'Tue, Thu 13:00-18:00',
+             'Daily 07:00-19:00; closed 2026-12-25', 'weekdays 8-5; Sat 09:00-12:00', '']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--professionals', type=int, default=5000)
+    parser.add_argument('--appointments', type=int, default=50000)
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0')
+    db, User, Appointment = app_module.db, app_module.User, app_module.Appointment
+    counties = app_module.LIBERIAN_COUNTIES
+    rng = random.Random(3)
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+
+    with app_module.app.app_context():
+        db.session.execute(User.__table__.insert(), [{
+            'name': f'Professional {i}', 'email': f'pro{i}@example.lr', 'password_hash': '',
+            'user_type': 'professional', 'is_approved': True, 'county': rng.choice(counties),
+            'specialty': rng.choice(SPECIALTIES), 'availability': rng.choice(SCHEDULES),
+        } for i in range(args.professionals)])
+        db.session.execute(Appointment.__table__.insert(), [{
+            'patient_id': 1, 'professional_id': rng.randint(1, args.professionals),
+            'appointment_date': now + timedelta(minutes=30 * rng.randint(0, 14 * 48)),
+            'status': 'scheduled',
+        } for _ in range(args.appointments)])
+        db.session.commit()
+
+        start = time.perf_counter()
+        app_module.get_slot_index()
+        print(f'index load: {(time.perf_counter() - start) * 1000:.0f}ms '
+              f'for {args.professionals} professionals and {args.appointments} appointments')
+
+    client = app_module.app.test_client()
+    for label, make_query in (
+        ('county', lambda: f'county={rng.choice(counties)}'),
+        ('county+specialty', lambda: f'county={rng.choice(counties)}&specialty={rng.choice(SPECIALTIES)}'),
+        ('all professionals, 50 slots', lambda: 'count=50'),
+    ):
+        times = []
+        for _ in range(args.queries):
+            query = make_query()
+            started = time.perf_counter()
+            response = client.get(f'/api/slots?{query}')
+            times.append(time.perf_counter() - started)
+            assert response.get_json()['success']
+        print(f'{label:28s} p50 {percentile(times, 50) * 1000:6.2f}ms  p99 {percentile(times, 99) * 1000:6.2f}ms')
+
+    os.remove(database_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Load-test concurrent writes from several forked app processes, the way
+gunicorn workers share one SQLite file: each process registers patients,
+books appointments and submits assessments while reading appointment lists,
+and the test reports throughput, latency and every failed request
+
+    python benchmarks/bench_write_contention.py [--processes 4] [--threads 2] [--iterations 100]
+        [--journal-mode WAL] [--busy-timeout 5000] [--synchronous NORMAL]
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app, percentile
+
+OPERATIONS = ('register', 'book', 'assessment', 'list')
+
+
+def client_loop(app_module, client, patient_id, professional_id, first_slot, slot, iterations, results):
+    with client.session_transaction() as sess:
+        sess['user_id'] = patient_id
+        sess['user_type'] = 'patient'
+    for i in range(iterations):
+        for operation in OPERATIONS:
+            started = time.perf_counter()
+            try:
+                if operation == 'register':
+                    response = client.post('/register', json={
+                        'name': 'Load Test', 'email': f'load-{patient_id}-{i}@example.lr', 'password': 'secret',
+                        'user_type': 'patient', 'county': 'Bong'})
+                elif operation == 'book':
+                    response = client.post('/book_appointment', json={
+                        'professional_id': professional_id, 'appointment_type': 'in-person',
+                        'appointment_date': (first_slot + slot * (patient_id * iterations + i)).isoformat()})
+                elif operation == 'assessment':
+                    response = client.post('/assessment', json={'mood_score': 2 + i % 8, 'anxiety_level': i % 10,
+                                                                'depression_indicators': ['sleep']})
+                else:
+                    response = client.get('/api/appointments')
+                status = response.status_code
+            except Exception as e:
+                status = type(e).__name__
+            results.append((operation, status, time.perf_counter() - started))
+
+
+def run_process(app_module, patient_ids, professional_id, first_slot, iterations):
+    """Body of one forked worker process: a client thread per patient"""
+    slot = timedelta(minutes=app_module.app.config['APPOINTMENT_SLOT_MINUTES'])
+    results = []
+    threads = [threading.Thread(target=client_loop, args=(app_module, app_module.app.test_client(), patient_id,
+                                                          professional_id, first_slot, slot, iterations, results))
+               for patient_id in patient_ids]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=2, help='client threads per process')
+    parser.add_argument('--iterations', type=int, default=100, help='rounds of the four requests per thread')
+    parser.add_argument('--journal-mode', default='WAL')
+    parser.add_argument('--busy-timeout', type=int, default=5000, help='milliseconds')
+    parser.add_argument('--synchronous', default='NORMAL')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(
+        PASSWORD_HASH_WORKERS='0', PASSWORD_HASH_METHOD='pbkdf2:sha256:1000', JOB_WORKER_THREADS='0',
+        DB_JOURNAL_MODE=args.journal_mode, DB_BUSY_TIMEOUT=args.busy_timeout, DB_SYNCHRONOUS=args.synchronous)
+    db, User = app_module.db, app_module.User
+    with app_module.app.app_context():
+        professional = User(name='Dr Load', email='load@example.lr', password_hash='', user_type='professional',
+                            is_approved=True, availability='Daily 00:00-24:00')
+        patients = [User(name=f'Patient {i}', email=f'patient{i}@example.lr', password_hash='', user_type='patient',
+                         county='Bong') for i in range(args.processes * args.threads)]
+        db.session.add_all([professional] + patients)
+        db.session.commit()
+        professional_id, patient_ids = professional.id, [patient.id for patient in patients]
+        journal_mode = db.session.execute(db.text('PRAGMA journal_mode')).scalar()
+    first_slot = (datetime.utcnow() + timedelta(days=1)).replace(minute=0, second=0, microsecond=0)
+
+    started = time.perf_counter()
+    children = []
+    for index in range(args.processes):
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            mine = patient_ids[index * args.threads:(index + 1) * args.threads]
+            results = run_process(app_module, mine, professional_id, first_slot, args.iterations)
+            with os.fdopen(write_end, 'w') as out:
+                json.dump(results, out)
+            os._exit(0)
+        os.close(write_end)
+        children.append((pid, read_end))
+    results = []
+    for pid, read_end in children:
+        with os.fdopen(read_end) as pipe:
+            results += json.load(pipe)
+        os.waitpid(pid, 0)
+    duration = time.perf_counter() - started
+
+    print(f'{args.processes} processes x {args.threads} threads, journal_mode={journal_mode}, '
+          f'busy_timeout={args.busy_timeout}ms, synchronous={args.synchronous}')
+    by_operation = defaultdict(list)
+    statuses = defaultdict(Counter)
+    for operation, status, elapsed in results:
+        by_operation[operation].append(elapsed)
+        statuses[operation][status] += 1
+    failed = 0
+    for operation in OPERATIONS:
+        latencies = by_operation[operation]
+        errors = sum(count for status, count in statuses[operation].items() if status != 200)
+        failed += errors
+        print(f'{operation:11s} {len(latencies):6d} requests  p50 {percentile(latencies, 50) * 1000:7.1f}ms  '
+              f'p99 {percentile(latencies, 99) * 1000:7.1f}ms  failed {errors}'
+              + (f'  {dict(statuses[operation])}' if errors else ''))
+    print(f'{len(results)} requests in {duration:.1f}s: {len(results) / duration:.0f} req/s, '
+          f'{sum(len(by_operation[op]) for op in OPERATIONS[:3]) / duration:.0f} writes/s, {failed} failed')
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
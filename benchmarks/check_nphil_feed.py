@@ -0,0 +1,96 @@
+"""
+Check the NPHIL feed cache against a local stub of nphil.gov.lr: a 200 stores
+the page, a 304 keeps it and resets its age, a 5xx keeps the last good copy,
+and a copy the source has not confirmed for max_stale seconds is withheld
+
+    python benchmarks/check_nphil_feed.py
+"""
+
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nphil_feed import NphilFeed
+
+ETAG = '"v1"'
+
+
+class Stub(BaseHTTPRequestHandler):
+    """Answers with the status the check sets next, honouring If-None-Match on 200"""
+
+    status = 200
+    body = b'cholera alert;measles update'
+    requests = []
+
+    def do_GET(self):
+        Stub.requests.append(dict(self.headers))
+        if Stub.status == 200 and self.headers.get('If-None-Match') == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(Stub.status)
+        if Stub.status == 200:
+            self.send_header('ETag', ETAG)
+            self.send_header('Content-Length', str(len(Stub.body)))
+            self.end_headers()
+            self.wfile.write(Stub.body)
+        else:
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def age(feed, seconds):
+    """Pretend the last confirmation from the source was seconds ago"""
+    feed.snapshot = feed.snapshot._replace(checked_at=feed.snapshot.checked_at - seconds)
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Stub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    feed = NphilFeed(f'http://127.0.0.1:{server.server_address[1]}/',
+                     lambda content: content.decode().split(';'), ttl=60, max_stale=3600, timeout=5)
+    feed._ensure_started = lambda: None  # drive refresh() by hand, no background thread
+    failures = []
+
+    def check(name, condition):
+        print(f"{'ok' if condition else 'FAIL':5s}{name}")
+        if not condition:
+            failures.append(name)
+
+    check('200 stores the page', feed.refresh() and feed.get() == ['cholera alert', 'measles update'])
+    check('200 keeps the ETag', feed.snapshot.etag == ETAG and feed.status()['version'] == 1)
+
+    age(feed, 120)
+    check('stale snapshot is still served', feed.status()['stale'] and len(feed.get()) == 2)
+    check('304 keeps the content', not feed.refresh() and feed.snapshot.version == 1 and len(feed.get()) == 2)
+    check('revalidation sent If-None-Match', Stub.requests[-1].get('If-None-Match') == ETAG)
+    check('304 resets the age', not feed.status()['stale'] and feed.status()['age'] < 5)
+
+    Stub.status = 503
+    age(feed, 120)
+    check('5xx keeps the last good copy', not feed.refresh() and len(feed.get()) == 2)
+    check('5xx is reported', '503' in (feed.status()['last_error'] or ''))
+
+    age(feed, 3600)
+    check('copy past max_stale is withheld', feed.status()['expired'] and feed.get() == [])
+    Stub.status = 200
+    check('304 after expiry serves it again', not feed.refresh() and len(feed.get()) == 2
+          and not feed.status()['expired'] and feed.status()['last_error'] is None)
+
+    Stub.body = b'ebola alert'
+    feed.snapshot = feed.snapshot._replace(etag='"v0"')
+    check('changed page replaces the snapshot', feed.refresh() and feed.get() == ['ebola alert']
+          and feed.snapshot.version == 2)
+
+    server.shutdown()
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
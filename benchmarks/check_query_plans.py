@@ -0,0 +1,69 @@
+"""
+Check that the check-query-plans gate passes on synthetic data and fails, naming
+the route and table, once an index a list route depends on is dropped
+
+    python benchmarks/check_query_plans.py [--scale 0.001]
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _app import load_app
+import synthetic
+
+# Index dropped -> (table then scanned, one route whose queries need the index)
+REGRESSIONS = {
+    'ix_appointment_patient': ('appointment', '/api/appointments'),
+    'ix_prescription_patient': ('prescription', '/api/prescriptions'),
+    'ix_assessment_user': ('mental_health_assessment', '/api/mental_health/trends'),
+}
+
+
+def run_gate(app_module):
+    result = app_module.app.test_cli_runner().invoke(app_module.check_query_plans_command)
+    return result.exit_code, result.output
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.001, help='synthetic data scale, 1.0 = 1M appointments')
+    args = parser.parse_args()
+
+    app_module, database_path = load_app(PASSWORD_HASH_WORKERS='0', JOB_WORKER_THREADS='0', IMAGE_WORKERS='0',
+                                         METRICS_SAMPLE_RATE='0')
+    synthetic.generate(app_module, args.scale, progress=lambda line: None)
+    failures = []
+
+    def check(name, condition, output):
+        print(f"{'ok' if condition else 'FAIL':5s}{name}")
+        if not condition:
+            failures.append(name)
+            print(output)
+
+    code, output = run_gate(app_module)
+    check('gate passes with every index in place', code == 0 and 'no full table scans' in output, output)
+
+    for index, (table, route) in REGRESSIONS.items():
+        with app_module.app.app_context(), app_module.db.engine.begin() as connection:
+            create = connection.exec_driver_sql('SELECT sql FROM sqlite_master WHERE name = ?', (index,)).scalar()
+            connection.exec_driver_sql(f'DROP INDEX {index}')
+        code, output = run_gate(app_module)
+        check(f'gate fails without {index}', code == 1 and f'FULL SCAN of {table} in {route}:' in output, output)
+        with app_module.app.app_context(), app_module.db.engine.begin() as connection:
+            connection.exec_driver_sql(create)
+
+    code, output = run_gate(app_module)
+    check('gate passes again once the indexes are back', code == 0, output)
+
+    app_module.image_analyzer.shutdown()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(database_path + suffix):
+            os.remove(database_path + suffix)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
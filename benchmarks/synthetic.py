@@ -0,0 +1,212 @@
+"""
+Synthetic CareNet Liberia data at a configurable scale, for benchmarks
+Facilities and professionals take the shapes of health_facilities.json and
+health_professionals.json: their facility types, services, professions and
+specializations, names, and GPS points scattered around each county's seed
+facilities. Patients, appointments, prescriptions, assessments and outbreak
+signals are spread over the 15 counties. Rows are bulk inserted with Core, so
+the admin counters are reconciled afterwards rather than kept as they go
+"""
+
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from _app import ROOT
+
+# Rows at scale 1.0
+FULL_SCALE = {
+    'facilities': 5000,
+    'professionals': 10000,
+    'patients': 100000,
+    'appointments': 1000000,
+    'prescriptions': 1000000,
+    'assessments': 200000,
+    'signals': 100000,
+    'articles': 2000,
+}
+BATCH_SIZE = 50000
+
+AVAILABILITY = ['Mon-Fri 08:00-17:00', 'Mon-Sat 09:00-15:00', 'Daily 08:00-20:00', 'Tue,Thu 10:00-16:00',
+                'Mon-Fri 07:00-13:00']
+MEDICATIONS = [('Artemether-lumefantrine', '80/480mg twice daily for 3 days'), ('Amoxicillin', '500mg three times daily'),
+               ('Paracetamol', '1g every 6 hours as needed'), ('ORS', 'One sachet after each loose stool'),
+               ('Metformin', '500mg twice daily'), ('Ferrous sulfate', '200mg once daily'),
+               ('Cotrimoxazole', '960mg twice daily'), ('Amlodipine', '5mg once daily')]
+INDICATORS = ['sleep', 'appetite', 'fatigue', 'hopelessness', 'concentration', 'isolation', 'irritability']
+DISEASES = ['fever', 'malaria', 'cholera', 'lassa fever', 'measles', 'ebola', 'mental-distress']
+CATEGORIES = ['malaria', 'maternal', 'mental', 'nutrition', 'hygiene', 'vaccination']
+LANGUAGES = ['English', 'Kpelle', 'Bassa', 'Kru']
+
+
+def scaled_counts(scale):
+    return {table: max(1, int(rows * scale)) for table, rows in FULL_SCALE.items()}
+
+
+def load_seeds():
+    with open(os.path.join(ROOT, 'health_facilities.json')) as f:
+        facilities = json.load(f)
+    with open(os.path.join(ROOT, 'health_professionals.json')) as f:
+        professionals = json.load(f)
+    return facilities, professionals
+
+
+def facility_records(rng, seeds, counties, count):
+    """JSON records in the shape of health_facilities.json"""
+    services = sorted({service.strip() for seed in seeds for service in seed['services'].split(',')})
+    points = {}
+    for seed in seeds:
+        lat, lon = (float(part) for part in seed['gps'].split(','))
+        points.setdefault(seed['county'], []).append((lat, lon))
+    for i in range(count):
+        seed = rng.choice(seeds)
+        county = counties[i % len(counties)]
+        lat, lon = rng.choice(points.get(county) or points[seed['county']])
+        yield {
+            'name': f"{seed['name'].split()[0]} {seed['type']} {i}",
+            'type': seed['type'],
+            'county': county,
+            'district': seed['district'],
+            'contact': f'231-77-{i // 1000 % 1000:03d}-{i % 1000:03d}',
+            'gps': f'{lat + rng.gauss(0, 0.15):.4f},{lon + rng.gauss(0, 0.15):.4f}',
+            'services': ', '.join(rng.sample(services, rng.randint(2, 6))),
+        }
+
+
+def professional_records(rng, seeds, counties, count):
+    """JSON records in the shape of health_professionals.json"""
+    first_names = sorted({seed['name'].split()[0] for seed in seeds})
+    last_names = sorted({seed['name'].split()[-1] for seed in seeds})
+    for i in range(count):
+        seed = rng.choice(seeds)
+        prefix = seed['license'].split('-')[0]
+        yield {
+            'name': f'{rng.choice(first_names)} {rng.choice(last_names)}',
+            'profession': seed['profession'],
+            'specialization': seed['specialization'],
+            'facility': seed['facility'],
+            'county': counties[i % len(counties)],
+            'phone': f'231-88-{i // 1000 % 1000:03d}-{i % 1000:03d}',
+            'email': f'professional{i}@synthetic.carenet.lr',
+            'license': f'{prefix}-LIB-{2000 + i % 25}-{i:06d}',
+        }
+
+
+def insert_rows(connection, table, rows):
+    """Insert an iterable of row dicts in batches; returns the count"""
+    batch, total = [], 0
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            connection.execute(table.insert(), batch)
+            total += len(batch)
+            batch = []
+    if batch:
+        connection.execute(table.insert(), batch)
+        total += len(batch)
+    return total
+
+
+def generate(app_module, scale=1.0, seed=23, progress=print):
+    """Fill the app's (empty) database with synthetic rows; returns {table: rows inserted}"""
+    import importer
+    from availability import parse_availability
+
+    rng = random.Random(seed)
+    counts = scaled_counts(scale)
+    counties = app_module.LIBERIAN_COUNTIES
+    facility_seeds, professional_seeds = load_seeds()
+    db = app_module.db
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    schedules = {text: parse_availability(text).to_json() for text in AVAILABILITY}
+    professional_ids = range(1, counts['professionals'] + 1)
+    patient_ids = range(counts['professionals'] + 1, counts['professionals'] + counts['patients'] + 1)
+    inserted = {}
+
+    def step(name, table, rows):
+        started = time.perf_counter()
+        with app_module.app.app_context(), db.engine.begin() as connection:
+            inserted[name] = insert_rows(connection, table, rows)
+        progress(f'  {name:14s} {inserted[name]:9,} rows in {time.perf_counter() - started:6.1f}s')
+
+    def professionals():
+        for record in professional_records(rng, professional_seeds, counties, counts['professionals']):
+            availability = rng.choice(AVAILABILITY)
+            yield dict(importer.professional_row(record), password_hash='', user_type='professional',
+                       availability=availability, availability_schedule=schedules[availability],
+                       rating=round(rng.uniform(3, 5), 1), is_approved=rng.random() < 0.95,
+                       gender=rng.choice(['female', 'male']), updated_at=now)
+
+    def patients():
+        for i in range(counts['patients']):
+            yield {'name': f'Patient {i}', 'email': f'patient{i}@synthetic.carenet.lr', 'password_hash': '',
+                   'user_type': 'patient', 'age': rng.randint(1, 90), 'county': counties[rng.randrange(len(counties))],
+                   'gender': rng.choice(['female', 'male']), 'contact': f'231-{i:09d}'[:20], 'medical_history': '',
+                   'is_approved': True, 'created_at': now - timedelta(days=rng.randint(0, 1000)), 'updated_at': now}
+
+    def appointments():
+        for _ in range(counts['appointments']):
+            # A year of history and two months ahead, on half-hour boundaries
+            when = now.replace(minute=0) + timedelta(minutes=30 * rng.randint(-365 * 48, 60 * 48))
+            status = 'scheduled' if when > now else rng.choice(['completed', 'completed', 'completed', 'cancelled'])
+            yield {'patient_id': rng.choice(patient_ids), 'professional_id': rng.choice(professional_ids),
+                   'appointment_date': when, 'appointment_type': rng.choice(['in-person', 'virtual']),
+                   'status': status, 'notes': '', 'created_at': when - timedelta(days=rng.randint(1, 30))}
+
+    def prescriptions():
+        for _ in range(counts['prescriptions']):
+            medication, dosage = rng.choice(MEDICATIONS)
+            yield {'patient_id': rng.choice(patient_ids), 'professional_id': rng.choice(professional_ids),
+                   'medication': medication, 'dosage': dosage, 'instructions': 'Take with water after meals',
+                   'prescribed_date': now - timedelta(minutes=rng.randint(0, 2 * 365 * 24 * 60))}
+
+    assessment_indicators = []
+
+    def assessments():
+        for assessment_id in range(1, counts['assessments'] + 1):
+            indicators = rng.sample(INDICATORS, rng.randint(0, 3))
+            assessment_indicators.extend({'assessment_id': assessment_id, 'indicator': indicator}
+                                         for indicator in indicators)
+            yield {'id': assessment_id, 'user_id': rng.choice(patient_ids), 'mood_score': rng.randint(1, 10),
+                   'anxiety_level': rng.randint(1, 10), 'depression_indicators': json.dumps(indicators),
+                   'assessment_date': now - timedelta(minutes=rng.randint(0, 365 * 24 * 60))}
+
+    def signals():
+        for _ in range(counts['signals']):
+            yield {'day': (now - timedelta(days=rng.randint(0, 365))).date(), 'county': rng.choice(counties),
+                   'disease': rng.choice(DISEASES), 'source': 'chat', 'count': 1}
+
+    def articles():
+        for i in range(counts['articles']):
+            category = rng.choice(CATEGORIES)
+            yield {'title': f'{category.title()} guidance {i}', 'category': category,
+                   'content': f'Community health guidance on {category}. ' * 20, 'language': rng.choice(LANGUAGES),
+                   'content_type': rng.choice(['article', 'video', 'podcast']), 'created_at': now, 'updated_at': now}
+
+    progress(f'Generating synthetic data at scale {scale:g}')
+    step('facilities', app_module.HealthFacility.__table__,
+         (importer.facility_row(record) for record in
+          facility_records(rng, facility_seeds, counties, counts['facilities'])))
+    step('professionals', app_module.User.__table__, professionals())
+    step('patients', app_module.User.__table__, patients())
+    step('appointments', app_module.Appointment.__table__, appointments())
+    step('prescriptions', app_module.Prescription.__table__, prescriptions())
+    step('assessments', app_module.MentalHealthAssessment.__table__, assessments())
+    step('indicators', app_module.AssessmentIndicator.__table__, assessment_indicators)
+    step('signals', app_module.OutbreakSignal.__table__, signals())
+    step('articles', app_module.HealthEducation.__table__, articles())
+    app_module.reconcile_stats()
+    return inserted
+
+
+def table_counts(app_module):
+    """Rows per main table of the app's database"""
+    db = app_module.db
+    models = {'facilities': app_module.HealthFacility, 'users': app_module.User,
+              'appointments': app_module.Appointment, 'prescriptions': app_module.Prescription,
+              'assessments': app_module.MentalHealthAssessment, 'signals': app_module.OutbreakSignal,
+              'articles': app_module.HealthEducation}
+    with app_module.app.app_context():
+        return {name: db.session.query(model).count() for name, model in models.items()}
@@ -0,0 +1,154 @@
+"""
+Double-booking-safe appointments for CareNet Liberia
+Keeps each professional's upcoming bookings as a sorted interval list so a
+conflict check is a binary search, and writes new appointments with a single
+conditional INSERT that only succeeds when the slot is still free
+"""
+
+import threading
+from bisect import bisect_right
+
+from sqlalchemy import exists, insert, literal, select
+
+# Appointments in these states no longer hold their slot
+RELEASED_STATUSES = ('cancelled',)
+
+
+class BookingError(Exception):
+    """Raised when an appointment request cannot be booked; carries the HTTP status to reply with"""
+
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class BookingConflict(BookingError):
+    """Raised when a requested slot overlaps an existing booking"""
+
+    status_code = 409
+
+    def __init__(self, appointment_id=None):
+        super().__init__('That time slot is already booked')
+        self.appointment_id = appointment_id
+
+
+class Schedule:
+    """One professional's bookings, sorted by start time.
+
+    Every booking lasts the same slot length, so ends are sorted too and only
+    the neighbours of the insertion point can overlap a new interval.
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.ids = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def overlapping(self, start, end):
+        """Return the id of a booking overlapping [start, end), or None"""
+        i = bisect_right(self.starts, start)
+        if i and self.ends[i - 1] > start:
+            return self.ids[i - 1]
+        if i < len(self.starts) and self.starts[i] < end:
+            return self.ids[i]
+        return None
+
+    def add(self, appointment_id, start, end):
+        i = bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.ids.insert(i, appointment_id)
+
+    def discard(self, appointment_id, start):
+        i = bisect_right(self.starts, start) - 1
+        while i >= 0 and self.starts[i] == start:
+            if self.ids[i] == appointment_id:
+                del self.starts[i], self.ends[i], self.ids[i]
+                return
+            i -= 1
+
+
+class BookingIndex:
+    """Thread-safe per-professional interval index over active appointments"""
+
+    def __init__(self, slot_length):
+        self.slot_length = slot_length
+        self.schedules = {}
+        self.appointments = {}  # id -> (professional_id, start)
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.appointments)
+
+    def load(self, rows):
+        """Replace the index contents with (id, professional_id, appointment_date, status) rows"""
+        with self._lock:
+            self.schedules = {}
+            self.appointments = {}
+            for row in rows:
+                self._upsert(*row)
+            self.loaded = True
+
+    def upsert(self, appointment_id, professional_id, start, status):
+        with self._lock:
+            self._upsert(appointment_id, professional_id, start, status)
+
+    def remove(self, appointment_id):
+        with self._lock:
+            self._remove(appointment_id)
+
+    def conflict(self, professional_id, start):
+        """Return the id of an active booking overlapping a slot starting at start, or None"""
+        with self._lock:
+            schedule = self.schedules.get(professional_id)
+            if schedule is None:
+                return None
+            return schedule.overlapping(start, start + self.slot_length)
+
+    def _upsert(self, appointment_id, professional_id, start, status):
+        self._remove(appointment_id)
+        if start is None or professional_id is None or status in RELEASED_STATUSES:
+            return
+        schedule = self.schedules.get(professional_id)
+        if schedule is None:
+            schedule = self.schedules[professional_id] = Schedule()
+        schedule.add(appointment_id, start, start + self.slot_length)
+        self.appointments[appointment_id] = (professional_id, start)
+
+    def _remove(self, appointment_id):
+        entry = self.appointments.pop(appointment_id, None)
+        if entry is None:
+            return
+        professional_id, start = entry
+        schedule = self.schedules[professional_id]
+        schedule.discard(appointment_id, start)
+        if not schedule:
+            del self.schedules[professional_id]
+
+
+def insert_if_free(connection, table, values, slot_length):
+    """INSERT an appointment row unless an active booking overlaps its slot.
+
+    The overlap test is part of the INSERT statement itself, and SQLite takes
+    the write lock before the statement reads anything, so two connections
+    racing for one slot cannot both succeed. Returns the new id, or None when
+    the slot was taken.
+    """
+    start = values['appointment_date']
+    clash = select(table.c.id).where(
+        table.c.professional_id == values['professional_id'],
+        table.c.status.notin_(RELEASED_STATUSES),
+        table.c.appointment_date > start - slot_length,
+        table.c.appointment_date < start + slot_length,
+    )
+    columns = list(values)
+    source = select(*[literal(values[name], table.c[name].type) for name in columns]).where(~exists(clash))
+    row = connection.execute(insert(table).from_select(columns, source).returning(table.c.id)).first()
+    return row[0] if row else None
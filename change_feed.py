@@ -0,0 +1,178 @@
+"""
+Incremental change feed for CareNet Liberia mobile clients
+Triggers append the id of every created, modified or deleted facility,
+professional and education article to change_log, whose autoincrement seq
+orders changes the way SQLite committed them. A client keeps the last seq it
+saw and asks only for rows changed after it; deleted rows come back as
+tombstones. The server's in-memory indexes follow the same log, and a second
+one, appointment_log, which clients never see
+"""
+
+import threading
+from datetime import datetime
+
+from sqlalchemy import text
+
+CHANGE_LOG = 'change_log'
+APPOINTMENT_LOG = 'appointment_log'
+
+# Feed name -> (table, columns whose changes clients care about, row filter)
+FEEDS = {
+    'facilities': ('health_facility', None, None),
+    'professionals': ('"user"', 'name, county, specialty, availability, availability_schedule, rating, '
+                                'is_approved, user_type', "{row}.user_type = 'professional'"),
+    'education': ('health_education', None, None),
+}
+
+# Bookings, kept out of change_log so they neither reach clients nor move the directory's version
+APPOINTMENT_FEEDS = {
+    'appointments': ('appointment', 'professional_id, appointment_date, status', None),
+}
+
+FEED_LOGS = dict([(feed, CHANGE_LOG) for feed in FEEDS] + [(feed, APPOINTMENT_LOG) for feed in APPOINTMENT_FEEDS])
+
+
+def _triggers(log, feed, table, columns, condition):
+    name = table.strip('"')
+
+    def when(row):
+        return f'WHEN {condition.format(row=row)} ' if condition else ''
+
+    def record(row, op):
+        return (f"INSERT INTO {log} (feed, row_id, op, changed_at) "
+                f"VALUES ('{feed}', {row}.id, '{op}', datetime('now'));")
+
+    update_of = f'OF {columns} ' if columns else ''
+    update_when = f"WHEN {condition.format(row='old')} OR {condition.format(row='new')} " if condition else ''
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS {log}_{name}_ai AFTER INSERT ON {table}
+        {when('new')}BEGIN {record('new', 'insert')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {log}_{name}_au AFTER UPDATE {update_of}ON {table}
+        {update_when}BEGIN {record('new', 'update')} END""",
+        f"""CREATE TRIGGER IF NOT EXISTS {log}_{name}_ad AFTER DELETE ON {table}
+        {when('old')}BEGIN {record('old', 'delete')} END""",
+    ]
+
+
+def _log_schema(log, feeds):
+    return [
+        f"""CREATE TABLE IF NOT EXISTS {log} (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            feed VARCHAR(20) NOT NULL,
+            row_id INTEGER NOT NULL,
+            op VARCHAR(10) NOT NULL,
+            changed_at DATETIME NOT NULL
+        )""",
+        f'CREATE INDEX IF NOT EXISTS ix_{log}_row ON {log} (feed, row_id, seq)',
+    ] + [statement for feed, spec in feeds.items() for statement in _triggers(log, feed, *spec)]
+
+
+CHANGE_SCHEMA = _log_schema(CHANGE_LOG, FEEDS)
+APPOINTMENT_SCHEMA = _log_schema(APPOINTMENT_LOG, APPOINTMENT_FEEDS)
+
+
+def create_change_log(connection):
+    """Create change_log and its triggers, logging every existing row as an insert"""
+    for statement in CHANGE_SCHEMA:
+        connection.exec_driver_sql(statement)
+    for feed, (table, _, condition) in FEEDS.items():
+        where = f"WHERE {condition.format(row=table)}" if condition else ''
+        connection.exec_driver_sql(
+            f"""INSERT INTO {CHANGE_LOG} (feed, row_id, op, changed_at)
+            SELECT '{feed}', id, 'insert', datetime('now') FROM {table} {where} ORDER BY id"""
+        )
+
+
+def create_appointment_log(connection):
+    """Create appointment_log and its triggers; existing bookings are read from the table itself"""
+    for statement in APPOINTMENT_SCHEMA:
+        connection.exec_driver_sql(statement)
+
+
+CHANGES_SINCE = {log: text(f"""
+    SELECT feed, row_id, MAX(seq) AS seq FROM {log}
+    WHERE seq > :since
+    GROUP BY feed, row_id
+    ORDER BY seq
+    LIMIT :limit
+""") for log in (CHANGE_LOG, APPOINTMENT_LOG)}
+
+
+def changes_since(connection, since, limit, log=CHANGE_LOG):
+    """Latest (feed, row_id, seq) per row changed after seq since, oldest first.
+
+    Only the newest entry of a row counts, so a row edited many times since
+    the cursor is sent once; whether it is an upsert or a tombstone is
+    decided from the row's current state.
+    """
+    return connection.execute(CHANGES_SINCE[log], {'since': since, 'limit': limit}).fetchall()
+
+
+def latest_change(connection, log=CHANGE_LOG):
+    """(seq, changed_at) of the newest change, or (0, None) when nothing was logged yet"""
+    # MAX(seq) reads the last rowid directly; EXPLAIN reports ORDER BY ... LIMIT 1 as a scan
+    row = connection.exec_driver_sql(
+        f'SELECT seq, changed_at FROM {log} WHERE seq = (SELECT MAX(seq) FROM {log})'
+    ).first()
+    if row is None:
+        return 0, None
+    return row[0], datetime.fromisoformat(row[1])
+
+
+def compact_change_log(connection, log=CHANGE_LOG):
+    """Drop entries superseded by a later change to the same row; returns the number removed"""
+    result = connection.exec_driver_sql(
+        f"""DELETE FROM {log} WHERE seq NOT IN (
+            SELECT MAX(seq) FROM {log} GROUP BY feed, row_id
+        )"""
+    )
+    return result.rowcount
+
+
+class IndexFollower:
+    """Keeps an in-memory index current with the change logs of the rows it holds.
+
+    load() fills the index from scratch and reloads maps each feed it follows
+    to reload(row_ids), which re-reads just those rows; versions maps each log
+    to a cheap, possibly slightly late, reading of its newest seq, such as a
+    DataVersion. sync() runs on every access: the first call loads the index,
+    later ones replay the rows changed since the seqs it reflects, whichever
+    process changed them. Seqs are read before rows, so a change committed
+    during a load is replayed by the next sync rather than lost, and more
+    than limit changes at once (a bulk import) reload the index instead.
+    """
+
+    def __init__(self, load, reloads, versions, limit=1000):
+        self.load = load
+        self.reloads = reloads
+        self.versions = {FEED_LOGS[feed]: versions[FEED_LOGS[feed]] for feed in reloads}
+        self.limit = limit
+        self.seqs = None
+        self._lock = threading.Lock()
+
+    def sync(self, connection):
+        latest = {log: version() for log, version in self.versions.items()}
+        if self.seqs is not None and all(latest[log] <= seq for log, seq in self.seqs.items()):
+            return
+        with self._lock:
+            if self.seqs is None:
+                self._load(connection)
+                return
+            for log, seq in self.seqs.items():
+                if latest[log] <= seq:
+                    continue
+                changes = changes_since(connection, seq, self.limit, log)
+                if len(changes) >= self.limit:
+                    self._load(connection)
+                    return
+                for feed, reload in self.reloads.items():
+                    row_ids = [row_id for changed, row_id, _ in changes if changed == feed]
+                    if row_ids:
+                        reload(row_ids)
+                # Entries of other feeds count too; a lagging replica just syncs again next time
+                self.seqs[log] = max([seq] + [changed_seq for _, _, changed_seq in changes])
+
+    def _load(self, connection):
+        seqs = {log: latest_change(connection, log)[0] for log in self.versions}
+        self.load()
+        self.seqs = seqs
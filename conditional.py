@@ -0,0 +1,100 @@
+"""
+Conditional GET support for CareNet Liberia
+Read-mostly routes describe their response by a few cheap validators (data
+version, session language, template version); when a client's cached copy
+still matches, the route answers 304 before running the view, so no query
+or template rendering happens
+"""
+
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request
+
+
+def make_etag(*parts):
+    return hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:24]
+
+
+def tree_version(*directories):
+    """(token, last modified) over every file below directories, e.g. templates and static files"""
+    latest = 0
+    for directory in directories:
+        for root, _, files in os.walk(directory):
+            for name in files:
+                latest = max(latest, os.stat(os.path.join(root, name)).st_mtime_ns)
+    modified = datetime.fromtimestamp(latest / 1e9, timezone.utc).replace(tzinfo=None) if latest else None
+    return latest, modified
+
+
+class DataVersion:
+    """Shared data version read through load() and cached in memory.
+
+    load() returns (version, last_modified). The cached value is re-read when
+    a local commit invalidates it, and at most every recheck seconds otherwise
+    so writes made by other processes are picked up too.
+    """
+
+    def __init__(self, load, recheck=5.0):
+        self.load = load
+        self.recheck = recheck
+        self.value = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        if self.value is None or now >= self._next_check:
+            with self._lock:
+                if self.value is None or now >= self._next_check:
+                    self.value = self.load()
+                    self._next_check = now + self.recheck
+        return self.value
+
+    def invalidate(self):
+        self._next_check = 0.0
+
+
+def _http_date(value):
+    return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+
+def conditional(validators):
+    """View decorator that answers GET with 304 while the client's copy is current.
+
+    validators() returns (etag_parts, last_modified) describing the response,
+    or None to serve the view without validators (e.g. a flash message is
+    pending).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            described = validators() if request.method in ('GET', 'HEAD') else None
+            if described is None:
+                return view(*args, **kwargs)
+            parts, last_modified = described
+            etag = make_etag(*parts)
+            last_modified = _http_date(last_modified.replace(microsecond=0)) if last_modified else None
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                since = request.if_modified_since
+                not_modified = bool(last_modified and since and last_modified <= since)
+            response = make_response('', 304) if not_modified else make_response(view(*args, **kwargs))
+            if response.status_code not in (200, 304):
+                return response
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            # Responses depend on the session cookie (language, login) and must be revalidated
+            response.vary.add('Cookie')
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
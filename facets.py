@@ -0,0 +1,107 @@
+"""
+Materialized filter facets for CareNet Liberia directories
+Keeps counts of dimension value combinations (county, specialty, facility
+type, service, ...) in memory so dropdowns and "remaining results" counts
+never need a SELECT DISTINCT or GROUP BY per page view
+"""
+
+import threading
+from collections import Counter
+
+
+def _matches(value, wanted):
+    if callable(wanted):
+        return value is not None and wanted(value)
+    return value == wanted
+
+
+class FacetIndex:
+    """Incrementally maintained facet counts over a set of rows.
+
+    ``dimensions`` names the facet fields. At most one of them may be
+    ``multi`` valued (e.g. a facility's list of services); rows are then
+    counted once per value of that field when it is counted or filtered on.
+    """
+
+    def __init__(self, dimensions, multi=None):
+        self.dimensions = tuple(dimensions)
+        self.multi = multi
+        self.single_dimensions = tuple(d for d in self.dimensions if d != multi)
+        self.rows = {}
+        self.combos = Counter()        # single-valued dimensions per row
+        self.multi_combos = Counter()  # single-valued dimensions + one multi value
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def load(self, rows):
+        """Replace all counts with (row_id, {dimension: value}) pairs"""
+        with self._lock:
+            self.rows = {}
+            self.combos = Counter()
+            self.multi_combos = Counter()
+            for row_id, values in rows:
+                self._add(row_id, values)
+            self.loaded = True
+
+    def upsert(self, row_id, values):
+        with self._lock:
+            self._discard(row_id)
+            self._add(row_id, values)
+
+    def remove(self, row_id):
+        with self._lock:
+            self._discard(row_id)
+
+    def _key(self, values):
+        return tuple(values.get(d) for d in self.single_dimensions)
+
+    def _multi_values(self, values):
+        return tuple(sorted(set(values.get(self.multi) or ())))
+
+    def _add(self, row_id, values):
+        key = self._key(values)
+        multi_values = self._multi_values(values) if self.multi else ()
+        self.rows[row_id] = (key, multi_values)
+        self.combos[key] += 1
+        for value in multi_values:
+            self.multi_combos[key + (value,)] += 1
+
+    def _discard(self, row_id):
+        entry = self.rows.pop(row_id, None)
+        if entry is None:
+            return
+        key, multi_values = entry
+        self.combos[key] -= 1
+        if not self.combos[key]:
+            del self.combos[key]
+        for value in multi_values:
+            multi_key = key + (value,)
+            self.multi_combos[multi_key] -= 1
+            if not self.multi_combos[multi_key]:
+                del self.multi_combos[multi_key]
+
+    def counts(self, dimension, **filters):
+        """Count rows per value of ``dimension`` among rows matching ``filters``.
+
+        Filter values are matched exactly, or may be a predicate callable.
+        Empty filters are ignored, and a filter on ``dimension`` itself does
+        not narrow its own counts, so dropdowns keep showing alternatives.
+        """
+        filters = {d: v for d, v in filters.items() if v not in (None, '') and d != dimension}
+        use_multi = self.multi is not None and (dimension == self.multi or self.multi in filters)
+        names = self.single_dimensions + ((self.multi,) if use_multi else ())
+        position = names.index(dimension)
+        checks = [(names.index(d), wanted) for d, wanted in filters.items() if d in names]
+
+        result = Counter()
+        with self._lock:
+            for key, count in (self.multi_combos if use_multi else self.combos).items():
+                if all(_matches(key[i], wanted) for i, wanted in checks):
+                    value = key[position]
+                    if value is not None and value != '':
+                        result[value] += count
+        return dict(result)
+
+    def values(self, dimension):
+        """All values of a dimension currently present, sorted"""
+        return sorted(self.counts(dimension))
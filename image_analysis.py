@@ -0,0 +1,153 @@
+"""
+Asynchronous image analysis for the CareNet Liberia disease scanner
+Uploads are streamed to disk in fixed-size chunks and queued as background
+jobs; the job decodes, downscales and analyzes the image in a process pool
+so neither the decoding nor the model holds a request thread. The analyzer
+is a pluggable "module:function" taking a Pillow image. The app bounds the
+number of pending scans: extra uploads fail fast with AnalyzerBusy
+"""
+
+import importlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from PIL import Image, ImageOps, ImageStat, UnidentifiedImageError
+
+ACCEPTED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+CHUNK_SIZE = 64 * 1024
+STUB_ANALYZER = 'image_analysis:stub_analyzer'
+
+
+class AnalyzerBusy(Exception):
+    """Raised when too many analysis jobs are already queued"""
+
+
+class UploadError(Exception):
+    """The upload is missing, too large or not an accepted image"""
+
+
+def save_upload(stream, directory, max_bytes, chunk_size=CHUNK_SIZE):
+    """Copy stream to a new file in directory chunk by chunk; returns its path.
+
+    Raises UploadError past max_bytes or for an empty upload, leaving no file behind.
+    """
+    os.makedirs(directory, exist_ok=True)
+    handle, path = tempfile.mkstemp(dir=directory, prefix='scan-', suffix='.upload')
+    size = 0
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadError(f'Images are limited to {max_bytes // (1024 * 1024)} MB')
+                f.write(chunk)
+        if not size:
+            raise UploadError('No image uploaded')
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def load_image(path, max_side):
+    """Decode path and downscale it to fit max_side x max_side, upright and in RGB"""
+    try:
+        with Image.open(path) as image:
+            if image.format not in ACCEPTED_FORMATS:
+                raise UploadError('Upload a JPEG, PNG or WebP image')
+            # JPEG can decode at 1/2, 1/4 or 1/8 scale directly, far cheaper than resizing after
+            image.draft('RGB', (max_side, max_side))
+            image = ImageOps.exif_transpose(image).convert('RGB')
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError) as e:
+        raise UploadError('The upload is not a readable image') from e
+    image.thumbnail((max_side, max_side), Image.Resampling.LANCZOS)
+    return image
+
+
+@lru_cache(maxsize=None)
+def load_analyzer(spec):
+    """Resolve a "module:function" analyzer, once per process"""
+    module, _, name = spec.partition(':')
+    return getattr(importlib.import_module(module), name)
+
+
+def stub_analyzer(image):
+    """Placeholder until a computer-vision model is plugged in; reports what it was given"""
+    brightness = ImageStat.Stat(image.convert('L')).mean[0]
+    return {
+        'analysis': 'Common skin condition detected. Consult healthcare provider.',
+        'confidence': 85,
+        'image': {'width': image.width, 'height': image.height, 'brightness': round(brightness, 1)},
+    }
+
+
+def analyze_file(path, analyzer, max_side):
+    """Worker entry point: decode, downscale and analyze the upload at path.
+
+    The upload is deleted once analyzed or found unreadable; other errors
+    leave it in place for the job's next attempt.
+    """
+    try:
+        result = load_analyzer(analyzer)(load_image(path, max_side))
+    except UploadError:
+        remove_upload(path)
+        raise
+    remove_upload(path)
+    return result
+
+
+def remove_upload(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ImageAnalyzer:
+    """Decode and analyze uploads in worker processes.
+
+    ``workers=0`` analyzes inline on the calling thread. analyze() blocks its
+    caller (a job-queue worker thread) while a process does the work.
+    """
+
+    def __init__(self, analyzer=STUB_ANALYZER, workers=2, max_side=1024, timeout=120):
+        self.analyzer = analyzer
+        self.workers = workers
+        self.max_side = max_side
+        self.timeout = timeout
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # Forked like the password hasher's workers: spawn would re-import the app in each
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('fork'))
+        return self._pool
+
+    def analyze(self, path):
+        """The analyzer's result for the upload at path, see analyze_file"""
+        if not self.workers:
+            return analyze_file(path, self.analyzer, self.max_side)
+        try:
+            return self._get_pool().submit(analyze_file, path, self.analyzer, self.max_side).result(self.timeout)
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            with self._pool_lock:
+                self._pool = None
+            raise
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,242 @@
+"""
+Streaming bulk importer for the CareNet Liberia directory
+Loads health_facilities.json / health_professionals.json (and larger exports
+in the same schema) with a streaming JSON parser and batched upserts, so the
+import is idempotent and memory stays flat however big the file is
+"""
+
+import codecs
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+DEFAULT_BATCH_SIZE = 1000
+READ_CHUNK_SIZE = 64 * 1024
+
+FACILITY_UPSERT = text("""
+    INSERT INTO health_facility (name, county, facility_type, address, contact, services, latitude, longitude,
+                                 updated_at)
+    VALUES (:name, :county, :facility_type, :address, :contact, :services, :latitude, :longitude, :updated_at)
+    ON CONFLICT (name, county) DO UPDATE SET
+        facility_type = excluded.facility_type,
+        address = excluded.address,
+        contact = excluded.contact,
+        services = excluded.services,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        updated_at = excluded.updated_at
+    WHERE facility_type IS NOT excluded.facility_type
+        OR address IS NOT excluded.address
+        OR contact IS NOT excluded.contact
+        OR services IS NOT excluded.services
+        OR latitude IS NOT excluded.latitude
+        OR longitude IS NOT excluded.longitude
+""")
+
+# The conflict target repeats the WHERE clause of the partial unique index
+# on user.license_info so SQLite can use it for the upsert. Both upserts skip
+# rows whose values did not change, so re-importing the same file leaves
+# updated_at and the change feed alone
+PROFESSIONAL_UPSERT = text("""
+    INSERT INTO "user" (name, email, password_hash, user_type, county, contact, specialty,
+                        license_info, availability, rating, is_approved, created_at, updated_at)
+    VALUES (:name, :email, '', 'professional', :county, :contact, :specialty,
+            :license_info, '', 5.0, 1, :created_at, :created_at)
+    ON CONFLICT (license_info) WHERE license_info IS NOT NULL AND license_info != '' DO UPDATE SET
+        name = excluded.name,
+        email = excluded.email,
+        county = excluded.county,
+        contact = excluded.contact,
+        specialty = excluded.specialty,
+        updated_at = excluded.updated_at
+    WHERE name IS NOT excluded.name
+        OR email IS NOT excluded.email
+        OR county IS NOT excluded.county
+        OR contact IS NOT excluded.contact
+        OR specialty IS NOT excluded.specialty
+""")
+
+
+class ImportStats:
+    def __init__(self, label):
+        self.label = label
+        self.read = 0
+        self.upserted = 0
+        self.skipped = 0
+        self.rejected = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        return (f"{self.label}: {self.read} read, {self.upserted} upserted, {self.skipped} skipped, "
+                f"{self.rejected} rejected in {self.elapsed:.2f}s ({self.rows_per_second:,.0f} rows/s)")
+
+
+def iter_json_array(fp, chunk_size=READ_CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array without loading the whole file"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer = ''
+    position = 0
+    eof = False
+
+    def fill():
+        nonlocal buffer, position, eof
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        if isinstance(chunk, bytes):
+            # The incremental decoder holds back characters split across chunks
+            chunk = text_decoder.decode(chunk)
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    skip_whitespace()
+    if position >= len(buffer) or buffer[position] != '[':
+        raise ValueError('Expected a JSON array')
+    position += 1
+
+    expect_value = True
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ValueError('Unterminated JSON array')
+        char = buffer[position]
+        if char == ']':
+            return
+        if char == ',' and not expect_value:
+            position += 1
+            expect_value = True
+            continue
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The element may straddle a chunk boundary
+                if eof or not fill():
+                    raise
+                continue
+            if end == len(buffer) and not eof:
+                # A number at the end of the buffer may continue in the next chunk
+                if fill():
+                    continue
+            break
+        position = end
+        expect_value = False
+        yield value
+
+
+def parse_gps(gps):
+    """Parse a "lat,lon" string into floats, or (None, None) when missing or invalid"""
+    try:
+        lat, lon = (float(part) for part in str(gps).split(','))
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None, None
+    return lat, lon
+
+
+def facility_row(record):
+    name = (record.get('name') or '').strip()
+    county = (record.get('county') or '').strip()
+    if not name or not county:
+        return None
+    latitude, longitude = parse_gps(record.get('gps'))
+    return {
+        'name': name[:200],
+        'county': county[:50],
+        'facility_type': (record.get('type') or record.get('facility_type') or '').strip().lower()[:50] or None,
+        'address': (record.get('district') or record.get('address') or '')[:200] or None,
+        'contact': (record.get('contact') or '')[:20] or None,
+        'services': record.get('services'),
+        'latitude': latitude,
+        'longitude': longitude,
+        'updated_at': datetime.utcnow(),
+    }
+
+
+def professional_row(record):
+    name = (record.get('name') or '').strip()
+    license_info = (record.get('license') or record.get('license_info') or '').strip()
+    if not name or not license_info:
+        return None
+    email = (record.get('email') or '').strip() or f"{license_info.lower()}@directory.carenet.lr"
+    return {
+        'name': name[:100],
+        'email': email[:100],
+        'county': (record.get('county') or '')[:50] or None,
+        'contact': (record.get('phone') or record.get('contact') or '')[:20] or None,
+        'specialty': (record.get('specialization') or record.get('specialty') or '')[:100] or None,
+        'license_info': license_info[:100],
+        'created_at': datetime.utcnow(),
+    }
+
+
+def _flush(engine, statement, batch, stats):
+    try:
+        with engine.begin() as connection:
+            connection.execute(statement, batch)
+        stats.upserted += len(batch)
+    except IntegrityError:
+        # A row clashed with another unique column (e.g. an email already used
+        # under a different license); retry one by one and reject the culprits
+        for row in batch:
+            try:
+                with engine.begin() as connection:
+                    connection.execute(statement, row)
+                stats.upserted += 1
+            except IntegrityError:
+                stats.rejected += 1
+
+
+def import_records(engine, records, to_row, statement, label, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Upsert records in chunked transactions of batch_size rows"""
+    stats = ImportStats(label)
+    batch = []
+    for record in records:
+        stats.read += 1
+        row = to_row(record) if isinstance(record, dict) else None
+        if row is None:
+            stats.skipped += 1
+            continue
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _flush(engine, statement, batch, stats)
+            batch = []
+            if progress is not None:
+                stats.elapsed = time.perf_counter() - stats.started
+                progress(stats)
+    if batch:
+        _flush(engine, statement, batch, stats)
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+
+def import_facilities(engine, path, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    with open(path, 'rb') as fp:
+        return import_records(engine, iter_json_array(fp), facility_row, FACILITY_UPSERT,
+                              'facilities', batch_size, progress)
+
+
+def import_professionals(engine, path, batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    with open(path, 'rb') as fp:
+        return import_records(engine, iter_json_array(fp), professional_row, PROFESSIONAL_UPSERT,
+                              'professionals', batch_size, progress)
@@ -0,0 +1,116 @@
+"""
+Intent matching for the CareNet Liberia chat assistant
+Every keyword and per-language synonym in the intent catalog is compiled into
+one Aho-Corasick automaton, so a message is scanned once whatever the size of
+the catalog and all matching intents are scored together
+"""
+
+import json
+import unicodedata
+from collections import deque
+
+
+def normalize(text):
+    """Lowercase, NFC-normalize and collapse whitespace so keywords and messages line up"""
+    return ' '.join(unicodedata.normalize('NFC', text or '').lower().split())
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton reporting (start, end, payload) for every keyword occurrence"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]  # per state: list of (keyword_length, payload)
+        self.built = False
+
+    def add(self, keyword, payload):
+        state = 0
+        for char in keyword:
+            next_state = self.goto[state].get(char)
+            if next_state is None:
+                next_state = len(self.goto)
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+                self.goto[state][char] = next_state
+            state = next_state
+        self.output[state].append((len(keyword), payload))
+        self.built = False
+
+    def build(self):
+        """Compute failure links breadth-first and merge outputs along them"""
+        queue = deque()
+        for state in self.goto[0].values():
+            self.fail[state] = 0
+            queue.append(state)
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(char, 0)
+                self.fail[next_state] = target if target != next_state else 0
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+        self.built = True
+
+    def find(self, text):
+        if not self.built:
+            self.build()
+        goto, fail, output = self.goto, self.fail, self.output
+        state = 0
+        for index, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for length, payload in output[state]:
+                yield index - length + 1, index + 1, payload
+
+
+def _is_word_boundary(text, index):
+    return index <= 0 or index >= len(text) or not text[index].isalnum() or not text[index - 1].isalnum()
+
+
+class IntentMatcher:
+    """Scores every intent whose keywords occur as whole words in a message"""
+
+    def __init__(self, catalog):
+        self.intents = catalog['intents']
+        self.default_response = catalog.get('default_response', {})
+        self.automaton = KeywordAutomaton()
+        self.keyword_count = 0
+        for position, intent in enumerate(self.intents):
+            weight = float(intent.get('weight', 1.0))
+            for language, keywords in intent.get('keywords', {}).items():
+                for keyword in keywords:
+                    keyword = normalize(keyword)
+                    if keyword:
+                        self.automaton.add(keyword, (position, keyword, weight))
+                        self.keyword_count += 1
+        self.automaton.build()
+
+    def match(self, message):
+        """Return [(intent, score, keywords)] for all matching intents, best first"""
+        text = normalize(message)
+        scores = {}
+        for start, end, (position, keyword, weight) in self.automaton.find(text):
+            if not (_is_word_boundary(text, start) and _is_word_boundary(text, end)):
+                continue
+            keywords = scores.setdefault(position, {})
+            # A keyword counts once however often it repeats; longer phrases weigh more
+            keywords[keyword] = weight * len(keyword.split())
+        ranked = sorted(scores.items(), key=lambda item: (-sum(item[1].values()), item[0]))
+        return [(self.intents[position], sum(found.values()), sorted(found)) for position, found in ranked]
+
+    def respond(self, message, language='english'):
+        """Return (reply, matches) choosing the best-scoring intent's reply for language"""
+        matches = self.match(message)
+        replies = matches[0][0].get('responses', {}) if matches else self.default_response
+        return replies.get(language, replies.get('english', '')), matches
+
+
+def load_intents(path):
+    with open(path, encoding='utf-8') as f:
+        return IntentMatcher(json.load(f))
@@ -0,0 +1,342 @@
+"""
+Durable background jobs for CareNet Liberia
+Jobs are rows of the job table in the app's own SQLite database, so they
+survive restarts and any process can enqueue or run them. A worker claims
+the most urgent ready job with a single UPDATE ... RETURNING, which also
+leases it: a job whose worker died becomes claimable again when the lease
+runs out, so every job runs at least once. Failures are retried with
+exponential backoff until the task's attempts are used up
+"""
+
+import json
+import os
+import random
+import signal
+import socket
+import threading
+import time
+
+JOB_TABLE = 'job'
+ACTIVE = "('queued', 'running')"
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+JOB_SCHEMA = [
+    f"""CREATE TABLE IF NOT EXISTS {JOB_TABLE} (
+        id INTEGER PRIMARY KEY,
+        kind VARCHAR(50) NOT NULL,
+        payload TEXT NOT NULL,
+        priority INTEGER NOT NULL DEFAULT 0,
+        status VARCHAR(10) NOT NULL DEFAULT 'queued',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        timeout REAL NOT NULL,
+        available_at REAL NOT NULL,
+        unique_key VARCHAR(100),
+        worker VARCHAR(100),
+        result TEXT,
+        error TEXT,
+        created_at REAL NOT NULL,
+        finished_at REAL
+    )""",
+    # Queued jobs become available at their run time, running ones when their lease expires
+    f"""CREATE INDEX IF NOT EXISTS ix_{JOB_TABLE}_ready ON {JOB_TABLE} (priority DESC, available_at)
+    WHERE status IN {ACTIVE}""",
+    f'CREATE INDEX IF NOT EXISTS ix_{JOB_TABLE}_kind ON {JOB_TABLE} (kind) WHERE status IN {ACTIVE}',
+    f'CREATE INDEX IF NOT EXISTS ix_{JOB_TABLE}_finished ON {JOB_TABLE} (finished_at) WHERE finished_at IS NOT NULL',
+    # At most one active job per unique_key, e.g. one pending import
+    f"""CREATE UNIQUE INDEX IF NOT EXISTS uq_{JOB_TABLE}_unique_key ON {JOB_TABLE} (unique_key)
+    WHERE unique_key IS NOT NULL AND status IN {ACTIVE}""",
+]
+
+CLAIM = f"""
+    UPDATE {JOB_TABLE} SET status = 'running', attempts = attempts + 1, worker = ?, available_at = ? + timeout
+    WHERE id = (
+        SELECT id FROM {JOB_TABLE} WHERE status IN {ACTIVE} AND available_at <= ? AND attempts < max_attempts
+        ORDER BY priority DESC, available_at LIMIT 1
+    )
+    RETURNING id, kind, payload, attempts, max_attempts, worker
+"""
+
+
+def create_job_table(connection):
+    for statement in JOB_SCHEMA:
+        connection.exec_driver_sql(statement)
+
+
+class PermanentFailure(Exception):
+    """Raised by a task to fail its job at once; the message is kept as the job's error"""
+
+
+class Task:
+    __slots__ = ('name', 'fn', 'max_attempts', 'timeout', 'priority', 'on_failure')
+
+    def __init__(self, name, fn, max_attempts, timeout, priority, on_failure):
+        self.name = name
+        self.fn = fn
+        self.max_attempts = max_attempts
+        self.timeout = timeout  # lease: seconds before another worker may take the job over
+        self.priority = priority
+        self.on_failure = on_failure  # on_failure(payload) once the job has failed for good
+
+
+class JobQueue:
+    """Enqueue, claim and settle jobs; tasks are registered with @queue.task(name).
+
+    get_engine() returns the SQLAlchemy engine of the database holding the
+    job table; it is called on every use, so the engine can be made lazily.
+    """
+
+    def __init__(self, get_engine, backoff=5.0, max_backoff=3600.0):
+        self.get_engine = get_engine
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.tasks = {}
+        self.enqueued = threading.Event()  # wakes this process's idle workers
+
+    def task(self, name, max_attempts=5, timeout=300, priority=PRIORITY_NORMAL, on_failure=None):
+        """Register fn(payload) as the handler of jobs of kind name; its return value is stored as JSON"""
+        def register(fn):
+            self.tasks[name] = Task(name, fn, max_attempts, timeout, priority, on_failure)
+            return fn
+        return register
+
+    def enqueue(self, connection, kind, payload=None, priority=None, delay=0, unique_key=None):
+        """Queue a job in connection's transaction; returns its id.
+
+        With unique_key, a job already queued or running under the same key
+        is returned instead of adding another.
+        """
+        task = self.tasks[kind]
+        now = time.time()
+        row = (kind, json.dumps(payload or {}), task.priority if priority is None else priority,
+               task.max_attempts, task.timeout, now + delay, unique_key, now)
+        job_id = connection.exec_driver_sql(
+            f"""INSERT OR IGNORE INTO {JOB_TABLE}
+            (kind, payload, priority, max_attempts, timeout, available_at, unique_key, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?) RETURNING id""", row).scalar()
+        if job_id is None:
+            job_id = connection.exec_driver_sql(
+                f'SELECT id FROM {JOB_TABLE} WHERE unique_key = ? AND status IN {ACTIVE}', (unique_key,)).scalar()
+        self.enqueued.set()
+        return job_id
+
+    def claim(self, worker):
+        """Lease the most urgent ready job to worker; returns (id, kind, payload, attempts, max_attempts, worker) or None"""
+        now = time.time()
+        with self.get_engine().begin() as connection:
+            return connection.exec_driver_sql(CLAIM, (worker, now, now)).first()
+
+    def run(self, job):
+        """Run a claimed job's task and settle the job: done, retried later, or failed.
+
+        Only the lease this claim took can settle the job: once it expired and
+        another worker claimed the job, this run's outcome is dropped.
+        """
+        job_id, kind, payload, attempts, max_attempts, worker = job
+        lease = (job_id, worker, attempts)
+        task = self.tasks.get(kind)
+        try:
+            if task is None:
+                raise PermanentFailure(f'No task registered for {kind!r}')
+            result = task.fn(json.loads(payload))
+        except PermanentFailure as e:
+            self._fail(task, lease, payload, str(e))
+        except Exception as e:
+            print(f"Error running job {job_id} ({kind}), attempt {attempts} of {max_attempts}: {e!r}")
+            if attempts >= max_attempts:
+                self._fail(task, lease, payload, f'Failed after {attempts} attempts ({type(e).__name__})')
+            else:
+                # Exponential backoff with jitter so retries of a burst spread out
+                delay = min(self.backoff * 2 ** (attempts - 1), self.max_backoff) * random.uniform(0.5, 1.0)
+                with self.get_engine().begin() as connection:
+                    connection.exec_driver_sql(
+                        f"""UPDATE {JOB_TABLE} SET status = 'queued', available_at = ?, error = ?
+                        WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?""",
+                        (time.time() + delay, repr(e)[:500]) + lease)
+        else:
+            self._settle(lease, 'done', result=result)
+
+    def _fail(self, task, lease, payload, error):
+        if self._settle(lease, 'failed', error=error):
+            self._cleanup(task, lease[0], payload)
+
+    def _cleanup(self, task, job_id, payload):
+        if task is not None and task.on_failure is not None:
+            try:
+                task.on_failure(json.loads(payload))
+            except Exception as e:
+                print(f"Error cleaning up failed job {job_id}: {e!r}")
+
+    def _settle(self, lease, status, result=None, error=None):
+        """Finish the job held under lease (id, worker, attempts); False when that lease was lost"""
+        with self.get_engine().begin() as connection:
+            return connection.exec_driver_sql(
+                f"""UPDATE {JOB_TABLE} SET status = ?, result = ?, error = ?, finished_at = ?
+                WHERE id = ? AND status = 'running' AND worker = ? AND attempts = ?""",
+                (status, None if result is None else json.dumps(result), error, time.time()) + lease).rowcount > 0
+
+    def expire_leases(self):
+        """Fail running jobs whose lease ran out with no attempts left (their worker died every time)"""
+        now = time.time()
+        with self.get_engine().begin() as connection:
+            expired = connection.exec_driver_sql(
+                f"""UPDATE {JOB_TABLE} SET status = 'failed', finished_at = ?, error = 'Worker lost'
+                WHERE status IN {ACTIVE} AND status = 'running' AND available_at <= ? AND attempts >= max_attempts
+                RETURNING id, kind, payload""", (now, now)).fetchall()
+        for job_id, kind, payload in expired:
+            self._cleanup(self.tasks.get(kind), job_id, payload)
+        return len(expired)
+
+    def get(self, connection, job_id):
+        """The job as a dict, or None"""
+        row = connection.exec_driver_sql(
+            f"""SELECT id, kind, payload, status, attempts, max_attempts, result, error, created_at, finished_at
+            FROM {JOB_TABLE} WHERE id = ?""", (job_id,)).first()
+        if row is None:
+            return None
+        job = dict(zip(('id', 'kind', 'payload', 'status', 'attempts', 'max_attempts', 'result', 'error',
+                        'created_at', 'finished_at'), row))
+        job['payload'] = json.loads(job['payload'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def pending(self, connection, kind):
+        """Jobs of kind queued or running"""
+        return connection.exec_driver_sql(
+            f'SELECT COUNT(*) FROM {JOB_TABLE} WHERE kind = ? AND status IN {ACTIVE}', (kind,)).scalar()
+
+    def prune(self, before):
+        """Delete jobs finished before the Unix time before; returns the number removed"""
+        with self.get_engine().begin() as connection:
+            return connection.exec_driver_sql(
+                f'DELETE FROM {JOB_TABLE} WHERE finished_at IS NOT NULL AND finished_at < ?', (before,)).rowcount
+
+
+class Worker:
+    """Threads claiming and running jobs until stopped.
+
+    Idle threads poll every poll_interval seconds, or sooner when a job is
+    enqueued in this process. Finished jobs are pruned after retention seconds.
+    """
+
+    def __init__(self, queue, threads=1, poll_interval=1.0, retention=7 * 24 * 3600, context=None, name=None):
+        self.queue = queue
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self.context = context  # e.g. app.app_context, entered around every job
+        self.name = name or f'{socket.gethostname()}:{os.getpid()}'
+        self.processed = 0
+        self._stopped = threading.Event()
+        self._start_lock = threading.Lock()
+        self._threads = []
+        self._next_housekeeping = 0.0
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self.threads <= 0 or any(thread.is_alive() for thread in self._threads):
+            return
+        with self._start_lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._stopped.clear()
+            self._threads = [threading.Thread(target=self._run, args=(f'{self.name}/{i}',),
+                                              name=f'job-worker-{i}', daemon=True) for i in range(self.threads)]
+            for thread in self._threads:
+                thread.start()
+
+    def stop(self, timeout=None):
+        """Stop after the jobs in progress; unfinished leases are retaken by other workers when they expire"""
+        self._stopped.set()
+        self.queue.enqueued.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def run_pending(self):
+        """Run ready jobs in the calling thread until none is left; returns how many ran"""
+        ran = 0
+        while self._run_one(self.name):
+            ran += 1
+        return ran
+
+    def _run_one(self, worker):
+        try:
+            job = self.queue.claim(worker)
+        except Exception as e:
+            print(f"Error claiming a job: {e}")
+            return False
+        if job is None:
+            return False
+        if self.context is not None:
+            with self.context():
+                self.queue.run(job)
+        else:
+            self.queue.run(job)
+        self.processed += 1
+        return True
+
+    def _housekeeping(self):
+        now = time.time()
+        if now < self._next_housekeeping:
+            return
+        self._next_housekeeping = now + 60
+        try:
+            self.queue.expire_leases()
+            if self.retention:
+                self.queue.prune(now - self.retention)
+        except Exception as e:
+            print(f"Error in job queue housekeeping: {e}")
+
+    def _run(self, worker):
+        while not self._stopped.is_set():
+            self._housekeeping()
+            if not self._run_one(worker):
+                self.queue.enqueued.wait(self.poll_interval)
+                self.queue.enqueued.clear()
+
+
+def _serve(make_worker):
+    """Run make_worker() in this process until SIGTERM or SIGINT"""
+    stopped = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopped.set())
+    worker = make_worker()
+    worker.start()
+    while not stopped.wait(1.0):
+        pass
+    worker.stop()
+
+
+def run_processes(make_worker, processes):
+    """Run make_worker() in processes processes (forked when more than one) until SIGTERM or SIGINT"""
+    if processes <= 1:
+        _serve(make_worker)
+        return
+    children = []
+    for _ in range(processes):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(make_worker)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, forward)
+    for pid in children:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
@@ -1,26 +1,166 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, flash, send_from_directory, abort, g
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 import os
 import json
-import requests
+import secrets
+import click
 from bs4 import BeautifulSoup
-from translations import get_translation, get_available_languages, translate_text, LIBERIAN_LANGUAGES
+from translations import get_translation, get_available_languages, get_language_map, translate_text, LIBERIAN_LANGUAGES, catalog_version
+from nphil_feed import NphilFeed
+from model_events import Change, model_events
+from spatial_index import FacilityIndex
+from migrations import run_migrations
+import search_index
+from pagination import InvalidCursor, decode_cursor, encode_cursor, listing_id, paginate, page_size_from
+from facets import FacetIndex
+import importer
+import query_plans
+import change_feed
+from conditional import DataVersion, conditional, make_etag, tree_version
+import offline_bundles
+import stats
+import mental_health_trends
+import outbreak_surveillance
+import image_analysis
+import job_queue
+import storage
+import metrics
+from password_hashing import HasherBusy, PasswordHasher
+from intent_matcher import load_intents
+from booking import BookingConflict, BookingError, BookingIndex, RELEASED_STATUSES, insert_if_free
+from availability import Availability, SlotIndex, parse_availability
+from offline_sync import RecordRejected, SyncError, assessment_row, assessment_values, profile_changes, read_batch, record_key
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'ecare-liberia-health-app-2024'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///ecare.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///ecare.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Read-only requests query this database through their own pool; a replica, or by default the same file
+app.config['DATABASE_READ_URL'] = os.environ.get('DATABASE_READ_URL', app.config['SQLALCHEMY_DATABASE_URI'])
+# SQLite settings applied to every connection: WAL lets reads run beside the writer, and writers
+# wait up to DB_BUSY_TIMEOUT milliseconds for the write lock instead of failing with "database is locked"
+app.config['DB_JOURNAL_MODE'] = os.environ.get('DB_JOURNAL_MODE', 'WAL')
+app.config['DB_BUSY_TIMEOUT'] = int(os.environ.get('DB_BUSY_TIMEOUT', 5000))
+app.config['DB_SYNCHRONOUS'] = os.environ.get('DB_SYNCHRONOUS', 'NORMAL')  # NORMAL is crash-safe under WAL
+# Pools are per process: size them to a worker's request threads plus JOB_WORKER_THREADS. SQLite
+# takes one writer at a time, so extra write connections only wait; reads share the larger pool
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 5))
+app.config['DB_READ_POOL_SIZE'] = int(os.environ.get('DB_READ_POOL_SIZE', 10))
+app.config['DB_POOL_OVERFLOW'] = int(os.environ.get('DB_POOL_OVERFLOW', 5))  # connections opened past the pool size
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))  # seconds to wait for a free connection
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = storage.pool_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], app.config['DB_POOL_SIZE'], app.config['DB_POOL_OVERFLOW'],
+    app.config['DB_POOL_TIMEOUT'])
+if ':memory:' not in app.config['DATABASE_READ_URL']:
+    app.config['SQLALCHEMY_BINDS'] = {storage.READ_BIND: dict(storage.pool_options(
+        app.config['DATABASE_READ_URL'], app.config['DB_READ_POOL_SIZE'], app.config['DB_POOL_OVERFLOW'],
+        app.config['DB_POOL_TIMEOUT']), url=app.config['DATABASE_READ_URL'])}
+app.config['NPHIL_URL'] = os.environ.get('NPHIL_URL', 'https://nphil.gov.lr/')
+app.config['NPHIL_FEED_TTL'] = int(os.environ.get('NPHIL_FEED_TTL', 15 * 60))  # seconds before a refresh is due
+app.config['NPHIL_FEED_MAX_STALE'] = int(os.environ.get('NPHIL_FEED_MAX_STALE', 24 * 60 * 60))  # then articles are withheld
+app.config['PAGE_SIZE'] = int(os.environ.get('PAGE_SIZE', 20))  # default rows per list page
+# Werkzeug hash method; existing hashes are upgraded on the next successful login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))  # 0 hashes inline
+app.config['PASSWORD_HASH_MAX_PENDING'] = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 16))
+# Seconds a login or registration waits for its hash before answering 503
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 30))
+app.config['APPOINTMENT_SLOT_MINUTES'] = int(os.environ.get('APPOINTMENT_SLOT_MINUTES', 30))  # length of one booking
+# Seconds a cached data version is trusted before checking for writes from other processes
+app.config['CONDITIONAL_GET_RECHECK'] = float(os.environ.get('CONDITIONAL_GET_RECHECK', 5))
+app.config['OFFLINE_BUNDLE_DIR'] = os.environ.get('OFFLINE_BUNDLE_DIR', os.path.join(app.instance_path, 'offline_bundles'))
+app.config['OFFLINE_BUNDLE_DELAY'] = float(os.environ.get('OFFLINE_BUNDLE_DELAY', 2))  # seconds to batch changes
+app.config['STATS_RECONCILE_INTERVAL'] = int(os.environ.get('STATS_RECONCILE_INTERVAL', 60 * 60))  # seconds, 0 disables
+app.config['CHANGE_FEED_LIMIT'] = int(os.environ.get('CHANGE_FEED_LIMIT', 500))  # rows per /api/changes reply
+app.config['SYNC_MAX_RECORDS'] = int(os.environ.get('SYNC_MAX_RECORDS', 20000))  # records per offline batch
+app.config['SYNC_MAX_BYTES'] = int(os.environ.get('SYNC_MAX_BYTES', 32 * 1024 * 1024))  # decompressed batch size
+# Assessments per rolling window, and the mood/anxiety change in points that flags deterioration
+app.config['MENTAL_HEALTH_WINDOW'] = int(os.environ.get('MENTAL_HEALTH_WINDOW', 5))
+app.config['MENTAL_HEALTH_DETERIORATION'] = float(os.environ.get('MENTAL_HEALTH_DETERIORATION', 2))
+# Days of daily outbreak buckets kept before downsampling to weeks, and weeks kept after that
+app.config['OUTBREAK_DAILY_DAYS'] = int(os.environ.get('OUTBREAK_DAILY_DAYS', 90))
+app.config['OUTBREAK_WEEKLY_WEEKS'] = int(os.environ.get('OUTBREAK_WEEKLY_WEEKS', 104))
+# Standard deviations above the EWMA baseline, and the CUSUM level, that raise an outbreak alarm
+app.config['OUTBREAK_Z_SCORE'] = float(os.environ.get('OUTBREAK_Z_SCORE', 3))
+app.config['OUTBREAK_CUSUM_LIMIT'] = float(os.environ.get('OUTBREAK_CUSUM_LIMIT', 5))
+# Disease-scanner analyzer ("module:function" taking a Pillow image) and its worker pool; 0 workers analyzes inline
+app.config['IMAGE_ANALYZER'] = os.environ.get('IMAGE_ANALYZER', image_analysis.STUB_ANALYZER)
+app.config['IMAGE_WORKERS'] = int(os.environ.get('IMAGE_WORKERS', 2))
+app.config['IMAGE_MAX_PENDING'] = int(os.environ.get('IMAGE_MAX_PENDING', 32))  # queued scans before 503
+app.config['IMAGE_MAX_BYTES'] = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))  # upload size limit
+app.config['IMAGE_MAX_SIDE'] = int(os.environ.get('IMAGE_MAX_SIDE', 1024))  # pixels the analyzer sees at most
+app.config['IMAGE_UPLOAD_DIR'] = os.environ.get('IMAGE_UPLOAD_DIR', os.path.join(app.instance_path, 'scans'))
+# Background job threads inside each web process; set to 0 when `flask worker` runs the jobs instead
+app.config['JOB_WORKER_THREADS'] = int(os.environ.get('JOB_WORKER_THREADS', 1))
+app.config['JOB_RETENTION'] = int(os.environ.get('JOB_RETENTION', 7 * 24 * 60 * 60))  # seconds finished jobs are kept
+app.config['CHAT_INTENTS_PATH'] = os.environ.get('CHAT_INTENTS_PATH', os.path.join(app.root_path, 'chat_intents.json'))
+# Fraction of requests whose SQL, templates and N+1 suspects are recorded; latency is recorded for all
+app.config['METRICS_SAMPLE_RATE'] = float(os.environ.get('METRICS_SAMPLE_RATE', 0.1))
+app.config['METRICS_N_PLUS_ONE'] = int(os.environ.get('METRICS_N_PLUS_ONE', 5))  # repeats of one SELECT to flag
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN', '')  # bearer token /metrics requires, if set
+
+db = SQLAlchemy(app, session_options={'class_': storage.Session})
+with app.app_context():
+    engines = dict(db.engines)
+for _key, _engine in engines.items():
+    # Read connections leave the journal mode, which may be a replica's, to the writer
+    storage.configure_sqlite(_engine, journal_mode=app.config['DB_JOURNAL_MODE'] if _key is None else None,
+                             busy_timeout=app.config['DB_BUSY_TIMEOUT'], synchronous=app.config['DB_SYNCHRONOUS'],
+                             read_only=_key == storage.READ_BIND)
+storage.dispose_after_fork(engines.values)
+
+@app.before_request
+def route_reads():
+    """GET and HEAD requests read from the read pool, see storage.read_only"""
+    if request.method in ('GET', 'HEAD'):
+        g.read_only = True
+
+def read_engine():
+    return engines.get(storage.READ_BIND, engines[None])
+
+request_metrics = metrics.RequestMetrics(sample_rate=app.config['METRICS_SAMPLE_RATE'],
+                                         n_plus_one=app.config['METRICS_N_PLUS_ONE'])
+request_metrics.init_app(app, engines.values())
+nphil_scrape_time = request_metrics.registry.histogram('carenet_nphil_scrape_seconds',
+                                                       'Time to fetch and parse the NPHIL page',
+                                                       metrics.SCRAPE_BUCKETS)
+
+password_hasher = PasswordHasher(method=app.config['PASSWORD_HASH_METHOD'],
+                                 workers=app.config['PASSWORD_HASH_WORKERS'],
+                                 max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+                                 timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+image_analyzer = image_analysis.ImageAnalyzer(analyzer=app.config['IMAGE_ANALYZER'],
+                                              workers=app.config['IMAGE_WORKERS'],
+                                              max_side=app.config['IMAGE_MAX_SIDE'])
+
+def job_engine():
+    with app.app_context():
+        return db.engine
 
-db = SQLAlchemy(app)
+# Durable jobs in the app database, run by job_worker threads here or by `flask worker`
+jobs = job_queue.JobQueue(job_engine)
+job_worker = job_queue.Worker(jobs, threads=app.config['JOB_WORKER_THREADS'], context=app.app_context,
+                              retention=app.config['JOB_RETENTION'])
 
 # Database Models
 class User(db.Model):
+    __table_args__ = (
+        # Directory imports upsert professionals keyed by their license
+        db.Index('uq_user_license_info', 'license_info', unique=True,
+                 sqlite_where=db.text("license_info IS NOT NULL AND license_info != ''")),
+        # Professional directory: filtered by type/approval (and county), listed by name
+        db.Index('ix_user_directory', 'user_type', 'is_approved', 'county', 'name'),
+        db.Index('ix_user_listing', 'user_type', 'is_approved', 'name'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(100), unique=True, nullable=False)
-    password_hash = db.Column(db.String(100), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     user_type = db.Column(db.String(20), nullable=False)  # 'patient' or 'professional'
     age = db.Column(db.Integer)
     county = db.Column(db.String(50))
@@ -30,11 +170,29 @@ class User(db.Model):
     specialty = db.Column(db.String(100))  # for professionals
     license_info = db.Column(db.String(100))  # for professionals
     availability = db.Column(db.String(500))  # for professionals
+    availability_schedule = db.Column(db.Text)  # availability parsed to JSON, see availability.py
     rating = db.Column(db.Float, default=5.0)
     is_approved = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_public_dict(self):
+        """Fields of a professional's profile that can be listed publicly"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'county': self.county,
+            'specialty': self.specialty,
+            'availability': self.availability,
+            'rating': self.rating
+        }
 
 class Appointment(db.Model):
+    __table_args__ = (
+        db.Index('ix_appointment_patient', 'patient_id', 'appointment_date'),
+        db.Index('ix_appointment_professional', 'professional_id', 'appointment_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     professional_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -44,7 +202,27 @@ class Appointment(db.Model):
     notes = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Lists load these with selectinload, one batched query per page rather than one per row
+    patient = db.relationship('User', foreign_keys=[patient_id])
+    professional = db.relationship('User', foreign_keys=[professional_id])
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'professional_id': self.professional_id,
+            'professional': self.professional.to_public_dict() if self.professional else None,
+            'appointment_date': self.appointment_date.isoformat() if self.appointment_date else None,
+            'appointment_type': self.appointment_type,
+            'status': self.status,
+            'notes': self.notes
+        }
+
 class MentalHealthAssessment(db.Model):
+    __table_args__ = (
+        db.Index('ix_assessment_user', 'user_id', 'assessment_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     mood_score = db.Column(db.Integer)  # 1-10 scale
@@ -52,7 +230,42 @@ class MentalHealthAssessment(db.Model):
     depression_indicators = db.Column(db.Text)
     assessment_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    user = db.relationship('User')
+
+class AssessmentIndicator(db.Model):
+    """One depression indicator of an assessment, normalized out of its JSON list"""
+    __table_args__ = (
+        db.Index('ix_assessment_indicator_indicator', 'indicator', 'assessment_id'),
+    )
+
+    assessment_id = db.Column(db.Integer, db.ForeignKey('mental_health_assessment.id'), primary_key=True)
+    indicator = db.Column(db.String(50), primary_key=True)
+
+class OutbreakSignal(db.Model):
+    """Signals of a disease in a county on a day, see outbreak_surveillance.py"""
+    __table_args__ = (
+        # Scraped alerts are logged once however many scrapes still show them
+        db.Index('uq_outbreak_signal_fingerprint', 'fingerprint', unique=True,
+                 sqlite_where=db.text('fingerprint IS NOT NULL')),
+        db.Index('ix_outbreak_signal_day', 'day'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    county = db.Column(db.String(50), nullable=False, default='')  # '' when unknown
+    disease = db.Column(db.String(50), nullable=False)
+    source = db.Column(db.String(20), nullable=False)  # 'nphil', 'chat' or 'assessment'
+    count = db.Column(db.Integer, nullable=False, default=1)
+    fingerprint = db.Column(db.String(32))
+
 class HealthFacility(db.Model):
+    __table_args__ = (
+        # Directory imports upsert facilities keyed by name and county; names repeat across counties
+        db.Index('uq_health_facility_name_county', 'name', 'county', unique=True),
+        db.Index('ix_health_facility_county_type', 'county', 'facility_type', 'name'),
+        db.Index('ix_health_facility_type', 'facility_type', 'name'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False)
     county = db.Column(db.String(50), nullable=False)
@@ -62,8 +275,27 @@ class HealthFacility(db.Model):
     services = db.Column(db.Text)
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'county': self.county,
+            'facility_type': self.facility_type,
+            'address': self.address,
+            'contact': self.contact,
+            'services': self.services,
+            'latitude': self.latitude,
+            'longitude': self.longitude
+        }
 
 class HealthEducation(db.Model):
+    __table_args__ = (
+        db.Index('ix_health_education_listing', 'language', 'category', 'created_at'),
+        db.Index('ix_health_education_language', 'language', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -71,8 +303,24 @@ class HealthEducation(db.Model):
     language = db.Column(db.String(20), default='English')
     content_type = db.Column(db.String(20))  # article, video, podcast
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'content': self.content,
+            'category': self.category,
+            'language': self.language,
+            'content_type': self.content_type,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
 
 class Prescription(db.Model):
+    __table_args__ = (
+        db.Index('ix_prescription_patient', 'patient_id', 'prescribed_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     professional_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -81,6 +329,36 @@ class Prescription(db.Model):
     instructions = db.Column(db.Text)
     prescribed_date = db.Column(db.DateTime, default=datetime.utcnow)
 
+    patient = db.relationship('User', foreign_keys=[patient_id])
+    professional = db.relationship('User', foreign_keys=[professional_id])
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'patient_id': self.patient_id,
+            'professional_id': self.professional_id,
+            'professional': self.professional.to_public_dict() if self.professional else None,
+            'medication': self.medication,
+            'dosage': self.dosage,
+            'instructions': self.instructions,
+            'prescribed_date': self.prescribed_date.isoformat() if self.prescribed_date else None
+        }
+
+class SyncRecord(db.Model):
+    """Outcome of one offline-synced record, kept so a replayed batch gets the same answer"""
+    __table_args__ = (
+        db.Index('uq_sync_record_key', 'user_id', 'idempotency_key', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    idempotency_key = db.Column(db.String(64), nullable=False)
+    record_type = db.Column(db.String(20))
+    status = db.Column(db.String(20), nullable=False)  # applied, rejected, conflict
+    result_id = db.Column(db.Integer)  # id of the row the record created or changed
+    message = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
 # Liberian Counties
 LIBERIAN_COUNTIES = [
     'Bomi', 'Bong', 'Gbarpolu', 'Grand Bassa', 'Grand Cape Mount',
@@ -88,8 +366,75 @@ LIBERIAN_COUNTIES = [
     'Montserrado', 'Nimba', 'River Cess', 'River Gee', 'Sinoe'
 ]
 
+def full_text_search_enabled():
+    """FTS5 tables are created by the SQLite migrations; other databases fall back to LIKE"""
+    return db.engine.dialect.name == 'sqlite'
+
+def paginate_request(query, order_by):
+    """Paginate a list query using the cursor and page_size request args"""
+    return paginate(query, order_by, request.args.get('cursor'),
+                    page_size_from(request.args, app.config['PAGE_SIZE']), name=request.endpoint)
+
 # Routes
+# Validators for conditional GETs. Facilities, professionals and education
+# share the change feed's latest seq as their data version
+def _latest_directory_change():
+    with read_engine().connect() as connection:
+        return change_feed.latest_change(connection)
+
+directory_version = DataVersion(_latest_directory_change, app.config['CONDITIONAL_GET_RECHECK'])
+template_version = tree_version(*(folder for folder in (
+    os.path.join(app.root_path, app.template_folder), app.static_folder) if folder and os.path.isdir(folder)))
+
+for _model in (HealthFacility, User, HealthEducation):
+    model_events.subscribe(_model, lambda changes: directory_version.invalidate())
+
+def _latest_appointment_change():
+    with read_engine().connect() as connection:
+        return change_feed.latest_change(connection, change_feed.APPOINTMENT_LOG)
+
+# Read by the booking indexes only; appointment pages are per user and not cached
+appointment_version = DataVersion(_latest_appointment_change, app.config['CONDITIONAL_GET_RECHECK'])
+model_events.subscribe(Appointment, lambda changes: appointment_version.invalidate())
+
+# Newest seq of each change log, for the in-memory indexes' IndexFollowers
+log_versions = {change_feed.CHANGE_LOG: lambda: directory_version.get()[0],
+                change_feed.APPOINTMENT_LOG: lambda: appointment_version.get()[0]}
+
+def directory_validator():
+    return directory_version.get()
+
+_nphil_digest = [None, None]  # articles tuple, digest of it
+
+def nphil_validator():
+    served = nphil_feed.get()  # wakes the refresher when the snapshot is stale
+    snapshot = nphil_feed.snapshot
+    if snapshot.articles and not served:
+        return make_etag('expired'), None  # older than NPHIL_FEED_MAX_STALE, nothing is served
+    if _nphil_digest[0] is not snapshot.articles:
+        _nphil_digest[:] = [snapshot.articles, make_etag(json.dumps(snapshot.articles, sort_keys=True, default=str))]
+    fetched = datetime.utcfromtimestamp(snapshot.fetched_at) if snapshot.fetched_at else None
+    return _nphil_digest[1], fetched
+
+def page_validators(*sources):
+    """Describe a response by its route, arguments, session and the given data sources"""
+    def validators():
+        if session.get('_flashes'):
+            return None
+        # The session carries the language inject_translation() renders with and the login state
+        parts = [request.endpoint, request.full_path, template_version[0], catalog_version(),
+                 sorted((key, str(value)) for key, value in session.items() if not key.startswith('_'))]
+        last_modified = template_version[1]
+        for source in sources:
+            version, modified = source()
+            parts.append(version)
+            if modified and (last_modified is None or modified > last_modified):
+                last_modified = modified
+        return parts, last_modified
+    return validators
+
 @app.route('/')
+@conditional(page_validators())
 def index():
     return render_template('index.html')
 
@@ -97,11 +442,13 @@ def index():
 def register():
     if request.method == 'POST':
         data = request.get_json() if request.is_json else request.form
+        password_hash = password_hasher.hash(data.get('password'))
+        schedule = parse_availability(data.get('availability', ''))
 
         user = User(
             name=data.get('name'),
             email=data.get('email'),
-            password_hash=generate_password_hash(data.get('password')),
+            password_hash=password_hash,
             user_type=data.get('user_type'),
             age=data.get('age'),
             county=data.get('county'),
@@ -111,6 +458,7 @@ def register():
             specialty=data.get('specialty', ''),
             license_info=data.get('license_info', ''),
             availability=data.get('availability', ''),
+            availability_schedule=schedule.to_json() if schedule else None,
             is_approved=True if data.get('user_type') == 'patient' else False
         )
 
@@ -122,6 +470,7 @@ def register():
     return render_template('register.html', counties=LIBERIAN_COUNTIES)
 
 @app.route('/login', methods=['GET', 'POST'])
+@storage.read_only  # only a hash upgrade writes, by primary key
 def login():
     if request.method == 'POST':
         data = request.get_json() if request.is_json else request.form
@@ -130,7 +479,14 @@ def login():
 
         user = User.query.filter_by(email=email).first()
 
-        if user and check_password_hash(user.password_hash, password):
+        # Directory-imported professionals have no password until they set one
+        if user and password_hasher.verify(user.password_hash, password):
+            if password_hasher.needs_rehash(user.password_hash):
+                try:
+                    user.password_hash = password_hasher.hash(password)
+                    db.session.commit()
+                except HasherBusy:
+                    pass  # upgrade on a quieter login
             session['user_id'] = user.id
             session['user_type'] = user.user_type
             return jsonify({'success': True, 'redirect': '/dashboard'})
@@ -139,49 +495,220 @@ def login():
 
     return render_template('login.html')
 
+DASHBOARD_ROWS = 5  # upcoming appointments and recent prescriptions shown
+
 @app.route('/dashboard')
 def dashboard():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
     user = User.query.get(session['user_id'])
+    if user is None:
+        session.clear()
+        return redirect(url_for('login'))
+    upcoming = Appointment.query.filter(Appointment.appointment_date >= datetime.utcnow(),
+                                        Appointment.status == 'scheduled')
     if user.user_type == 'patient':
-        return render_template('patient_dashboard.html', user=user)
+        appointments = upcoming.filter(Appointment.patient_id == user.id).options(
+            selectinload(Appointment.professional)).order_by(
+            Appointment.appointment_date).limit(DASHBOARD_ROWS).all()
+        prescriptions = Prescription.query.filter_by(patient_id=user.id).options(
+            selectinload(Prescription.professional)).order_by(
+            Prescription.prescribed_date.desc()).limit(DASHBOARD_ROWS).all()
+        return render_template('patient_dashboard.html', user=user, appointments=appointments,
+                               prescriptions=prescriptions)
     else:
-        return render_template('professional_dashboard.html', user=user)
-
-@app.route('/professionals')
-def professionals():
-    county = request.args.get('county', '')
-    specialty = request.args.get('specialty', '')
-    name = request.args.get('name', '')
-    profession = request.args.get('profession', '')
+        appointments = upcoming.filter(Appointment.professional_id == user.id).options(
+            selectinload(Appointment.patient)).order_by(
+            Appointment.appointment_date).limit(DASHBOARD_ROWS).all()
+        return render_template('professional_dashboard.html', user=user, appointments=appointments)
+
+def professionals_query(args):
+    """Build the approved-professionals query and its keyset ordering from request args"""
+    county = args.get('county', '')
+    specialty = args.get('specialty', '')
+    name = args.get('name', '')
+    profession = args.get('profession', '')
 
     query = User.query.filter_by(user_type='professional', is_approved=True)
+    order_by = [(User.name, False), (User.id, False)]
 
     if county:
         query = query.filter_by(county=county)
-    if specialty:
-        query = query.filter(User.specialty.ilike(f'%{specialty}%'))
-    if name:
-        query = query.filter(User.name.ilike(f'%{name}%'))
-    if profession:
-        query = query.filter(User.specialty.ilike(f'%{profession}%'))
+    if full_text_search_enabled():
+        match = search_index.match_expression(specialty=f'{specialty} {profession}', name=name)
+        if match:
+            matches = search_index.professional_matches(match)
+            query = query.join(matches, matches.c.id == User.id)
+            order_by = [(matches.c.rank, False), (User.id, False)]
+    else:
+        if specialty:
+            query = query.filter(User.specialty.ilike(f'%{specialty}%'))
+        if name:
+            query = query.filter(User.name.ilike(f'%{name}%'))
+        if profession:
+            query = query.filter(User.specialty.ilike(f'%{profession}%'))
 
-    professionals = query.all()
+    return query, order_by
 
-    # Get unique specializations for filter dropdown
-    specializations = db.session.query(User.specialty).filter(
-        User.user_type == 'professional',
-        User.is_approved == True,
-        User.specialty.isnot(None)
-    ).distinct().all()
-    specializations = [s[0] for s in specializations if s[0]]
+@app.route('/professionals')
+@conditional(page_validators(directory_validator))
+def professionals():
+    query, order_by = professionals_query(request.args)
+    page = paginate_request(query, order_by)
+
+    # Unique specializations for the filter dropdown, served from the facet index
+    specializations = get_professional_facets().values('specialty')
 
     return render_template('professionals.html', 
-                         professionals=professionals, 
+                         professionals=page.items, 
+                         page=page,
                          counties=LIBERIAN_COUNTIES,
-                         specializations=specializations)
+                         specializations=specializations,
+                         facet_counts=professional_facet_counts(request.args))
+
+@app.route('/api/professionals')
+def api_professionals():
+    query, order_by = professionals_query(request.args)
+    page = paginate_request(query, order_by)
+    return jsonify(page.to_dict(User.to_public_dict))
+
+# Upcoming bookings per professional, kept in step with appointment_log
+booking_index = BookingIndex(timedelta(minutes=app.config['APPOINTMENT_SLOT_MINUTES']))
+
+def _upcoming_appointments(slot_length):
+    return db.session.query(Appointment.id, Appointment.professional_id,
+                            Appointment.appointment_date, Appointment.status).filter(
+        Appointment.appointment_date > datetime.utcnow() - slot_length,
+        Appointment.status.notin_(RELEASED_STATUSES)
+    ).all()
+
+def _changed_appointments(appointment_ids):
+    """(id, professional_id, appointment_date, status) of the given appointments that still exist"""
+    rows = db.session.query(Appointment.id, Appointment.professional_id,
+                            Appointment.appointment_date, Appointment.status).filter(
+        Appointment.id.in_(appointment_ids)).all()
+    return rows, set(appointment_ids) - {row.id for row in rows}
+
+def _reload_bookings(appointment_ids):
+    rows, deleted = _changed_appointments(appointment_ids)
+    for row in rows:
+        booking_index.upsert(row.id, row.professional_id, row.appointment_date, row.status)
+    for appointment_id in deleted:
+        booking_index.remove(appointment_id)
+
+booking_follower = change_feed.IndexFollower(
+    lambda: booking_index.load(_upcoming_appointments(booking_index.slot_length)),
+    {'appointments': _reload_bookings}, log_versions)
+
+def get_booking_index():
+    """Return the booking interval index, loading upcoming appointments on first use and
+    replaying bookings any worker changed since"""
+    booking_follower.sync(db.session.connection())
+    return booking_index
+
+# Weekly availability and booked slots as per-day bitmaps, for free-slot search
+slot_index = SlotIndex(app.config['APPOINTMENT_SLOT_MINUTES'])
+
+def professional_availability(availability, availability_schedule):
+    """Structured availability of a professional row, parsing the text if it was never stored"""
+    if availability_schedule:
+        return Availability.from_json(availability_schedule)
+    return parse_availability(availability)
+
+_SLOT_COLUMNS = (User.id, User.name, User.county, User.specialty, User.availability, User.availability_schedule)
+
+def _slot_professional(row):
+    return (row.id, row.name, row.county, row.specialty,
+            professional_availability(row.availability, row.availability_schedule))
+
+def _load_slot_index():
+    professionals = db.session.query(*_SLOT_COLUMNS).filter(
+        User.user_type == 'professional',
+        User.is_approved == True
+    ).all()
+    slot_index.load((_slot_professional(row) for row in professionals),
+                    _upcoming_appointments(slot_index.slot_length))
+
+def _reload_slot_professionals(user_ids):
+    listed = db.session.query(*_SLOT_COLUMNS).filter(
+        User.id.in_(user_ids),
+        User.user_type == 'professional',
+        User.is_approved == True
+    ).all()
+    for row in listed:
+        slot_index.upsert_professional(*_slot_professional(row))
+    for user_id in set(user_ids) - {row.id for row in listed}:
+        slot_index.remove_professional(user_id)
+
+def _reload_slot_bookings(appointment_ids):
+    rows, deleted = _changed_appointments(appointment_ids)
+    for row in rows:
+        slot_index.upsert_appointment(row.id, row.professional_id, row.appointment_date, row.status)
+    for appointment_id in deleted:
+        slot_index.remove_appointment(appointment_id)
+
+slot_follower = change_feed.IndexFollower(
+    _load_slot_index, {'professionals': _reload_slot_professionals, 'appointments': _reload_slot_bookings},
+    log_versions)
+
+def get_slot_index():
+    """Return the free-slot index, loading professionals and upcoming bookings on first use and
+    replaying the ones any worker changed since"""
+    slot_follower.sync(db.session.connection())
+    return slot_index
+
+def parse_appointment_date(value):
+    """Parse an ISO date from the booking form as a naive UTC datetime, or None"""
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def schedule_appointment(patient_id, professional_id, appointment_date, appointment_type=None, notes=''):
+    """Insert an appointment in the current transaction if its slot is free.
+
+    Returns the inserted row's values; raises BookingError when the request is
+    invalid or the slot is taken. The caller commits and then notifies
+    model_events with the returned values.
+    """
+    appointment_date = parse_appointment_date(appointment_date)
+    if appointment_date is None:
+        raise BookingError('Invalid appointment date')
+    if appointment_date < datetime.utcnow():
+        raise BookingError('Appointment date must be in the future')
+
+    professional = db.session.query(User.id).filter_by(
+        id=professional_id, user_type='professional', is_approved=True).with_for_update().first()
+    if professional is None:
+        raise BookingError('Professional not found', 404)
+    if not get_slot_index().is_available(professional.id, appointment_date):
+        raise BookingError('The professional is not available at that time', 409)
+
+    # Cheap in-memory check first; the conditional insert below is what
+    # actually guarantees the slot, including against other processes
+    index = get_booking_index()
+    taken = index.conflict(professional.id, appointment_date)
+    if taken is not None:
+        raise BookingConflict(taken)
+
+    values = {
+        'patient_id': patient_id,
+        'professional_id': professional.id,
+        'appointment_date': appointment_date,
+        'appointment_type': appointment_type,
+        'status': 'scheduled',
+        'notes': notes or '',
+        'created_at': datetime.utcnow(),
+    }
+    appointment_id = insert_if_free(db.session.connection(), Appointment.__table__, values, index.slot_length)
+    if appointment_id is None:
+        raise BookingConflict()
+    admin_stats.record(db.session, Appointment, values)
+    return dict(values, id=appointment_id)
 
 @app.route('/book_appointment', methods=['POST'])
 def book_appointment():
@@ -189,20 +716,40 @@ def book_appointment():
         return jsonify({'success': False, 'message': 'Please login first'})
 
     data = request.get_json()
-    appointment = Appointment(
-        patient_id=session['user_id'],
-        professional_id=data.get('professional_id'),
-        appointment_date=datetime.fromisoformat(data.get('appointment_date')),
-        appointment_type=data.get('appointment_type'),
-        notes=data.get('notes', '')
-    )
-
-    db.session.add(appointment)
+    appointment = schedule_appointment(session['user_id'], data.get('professional_id'), data.get('appointment_date'),
+                                       data.get('appointment_type'), data.get('notes', ''))
     db.session.commit()
-
-    return jsonify({'success': True, 'message': 'Appointment booked successfully!'})
+    model_events.notify(Appointment, [Change('insert', appointment, None)])
+
+    return jsonify({'success': True, 'message': 'Appointment booked successfully!', 'appointment_id': appointment['id']})
+
+@app.route('/api/slots')
+def api_slots():
+    """Next free appointment slots across approved professionals, earliest first"""
+    after = parse_appointment_date(request.args.get('after')) if request.args.get('after') else None
+    if request.args.get('after') and after is None:
+        return jsonify({'success': False, 'message': 'Invalid date'}), 400
+    now = datetime.utcnow()
+    after = max(after or now, now)
+    count = min(max(request.args.get('count', 10, type=int), 1), 100)
+    days = min(max(request.args.get('days', 14, type=int), 1), 90)
+
+    index = get_slot_index()
+    slots = index.free_slots(after, count=count, county=request.args.get('county', ''),
+                             specialty=request.args.get('specialty', ''), days=days)
+    data = []
+    for start, professional_id in slots:
+        professional = index.professionals[professional_id]
+        data.append({
+            'start': start.isoformat(),
+            'end': (start + index.slot_length).isoformat(),
+            'professional': {'id': professional_id, 'name': professional.name,
+                             'county': professional.county, 'specialty': professional.specialty},
+        })
+    return jsonify({'success': True, 'data': data, 'count': len(data)})
 
 @app.route('/search')
+@conditional(page_validators())
 def search():
     return render_template('search.html', counties=LIBERIAN_COUNTIES)
 
@@ -214,55 +761,27 @@ def ai_chatbot():
 def translator():
     return render_template('translator.html')
 
+# Intent catalog compiled once per process into a single keyword automaton
+chat_matcher = None
+
+def get_chat_matcher():
+    """Return the chat intent matcher, compiling the intent catalog on first use"""
+    global chat_matcher
+    if chat_matcher is None:
+        chat_matcher = load_intents(app.config['CHAT_INTENTS_PATH'])
+    return chat_matcher
+
 @app.route('/chat', methods=['POST'])
 def chat():
     data = request.get_json()
-    user_message = data.get('message', '').lower()
     user_language = session.get('language', 'english')
 
-    # Simple AI responses for demonstration - with language support
-    responses = {
-        'hello': {
-            'english': 'Hello! I\'m Wilmot, your AI health assistant. How can I help you today?',
-            'kpelle': 'Kɛ! Ma Wilmot ma, yee kɛɛn yuu. Na kɛ yuu kɛrɛ maa?',
-            'bassa': 'Nyɔnmɔ! Ma Wilmot ma, wɛn kɛɛn yuu. Na ke yuu nyɔn maa?',
-            'gio': 'Yɛ! Ma Wilmot ma, yɛɛ kɛɛn yuu. Na kɛ yuu nyɔɔn maa?',
-            'liberian_english': 'Hello o! I Wilmot, your health helper. How I can help you today?'
-        },
-        'fever': {
-            'english': 'For fever, rest and drink plenty of fluids. If fever persists above 101°F for more than 2 days, please consult a healthcare professional.',
-            'kpelle': 'Mɛni yii kɛ, gbɛɛ bɛrɛ kɛɛ nyu maa. Mɛni yii kɛ sɔɔng wulu fɛɛli kɛ, dokita nyɔn.',
-            'bassa': 'Mɛni yii ke, gbɛɛ bɛrɛ kɛɛ nyu maa. Mɛni yii ke sɔɔng wulu fɛɛli kɛ, dokita nyɔn.',
-            'gio': 'Mɛni yii kɛ, gbɛɛ bɛrɛ kɛɛ nyu maa. Mɛni yii kɛ sɔɔng wulu fɛɛli kɛ, dokita nyɔɔn.',
-            'liberian_english': 'For fever, rest and drink plenty water. If fever stay pass 2 days, go see doctor.'
-        },
-        'malaria': {
-            'english': 'Malaria symptoms include fever, chills, and flu-like illness. If you suspect malaria, seek immediate medical attention.',
-            'kpelle': 'Malaria kɛrɛng: mɛni yii, kɔlɔng, kɛɛ nɛɛng. Malaria bɛɛ kɛ, dokita nyɔn maa bɔ.',
-            'bassa': 'Malaria kɛrɛng: mɛni yii, kɔlɔng, kɛɛ nɛɛng. Malaria bɛɛ ke, dokita nyɔn maa bɔ.',
-            'gio': 'Malaria kɛrɛɛng: mɛni yii, kɔlɔɔng, kɛɛ nɛɛng. Malaria bɛɛ kɛ, dokita nyɔɔn maa bɔ.',
-            'liberian_english': 'Malaria signs: fever, cold, body pain. If you think malaria, go hospital quick quick.'
-        }
-    }
-
-    default_response = {
-        'english': 'I\'m here to help! Could you please provide more details about your health concern?',
-        'kpelle': 'Ma kɛ yuu bɔɔlɔ! Yuu yee kɛɛ kɛrɛng mɔɔ sɛbɛ?',
-        'bassa': 'Ma ke yuu bɔɔlɔ! Yuu wɛn kɛɛ kɛrɛng mɔɔ sɛbɛ?',
-        'gio': 'Ma kɛ yuu bɔɔlɔ! Yuu yɛɛ kɛɛ kɛrɛɛng mɔɔ sɛbɛ?',
-        'liberian_english': 'I here to help you! Tell me more about your health problem.'
-    }
-
-    response = default_response.get(user_language, default_response['english'])
-    
-    for keyword, reply_dict in responses.items():
-        if keyword in user_message:
-            response = reply_dict.get(user_language, reply_dict['english'])
-            break
-
-    return jsonify({'response': response})
+    response, matches = get_chat_matcher().respond(data.get('message', ''), user_language)
+    record_chat_signals(outbreak_surveillance.chat_diseases(matches))
+    return jsonify({'response': response, 'intents': [intent['name'] for intent, score, keywords in matches]})
 
 @app.route('/mental_health')
+@conditional(page_validators())
 def mental_health():
     return render_template('mental_health.html')
 
@@ -271,47 +790,276 @@ def mental_health_assessment():
     if 'user_id' not in session:
         return jsonify({'success': False, 'message': 'Please login first'})
 
-    data = request.get_json()
-    assessment = MentalHealthAssessment(
-        user_id=session['user_id'],
-        mood_score=data.get('mood_score'),
-        anxiety_level=data.get('anxiety_level'),
-        depression_indicators=json.dumps(data.get('depression_indicators', []))
-    )
+    data = request.get_json(silent=True)
+    try:
+        if not isinstance(data, dict):
+            raise RecordRejected('Expected a JSON object')
+        values = assessment_values(data)
+    except RecordRejected as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    assessment = MentalHealthAssessment(user_id=session['user_id'], **values)
 
     db.session.add(assessment)
+    db.session.flush()
+    rows = mental_health_trends.indicator_rows(assessment.id, assessment.depression_indicators)
+    if rows:
+        db.session.execute(insert(AssessmentIndicator.__table__), rows)
+    if outbreak_surveillance.is_distressed(assessment.mood_score, assessment.anxiety_level):
+        user = db.session.get(User, session['user_id'])
+        db.session.execute(insert(OutbreakSignal.__table__), outbreak_surveillance.signal_rows(
+            datetime.utcnow().date(), user.county if user else None, [outbreak_surveillance.DISTRESS_DISEASE],
+            'assessment'))
     db.session.commit()
 
     return jsonify({'success': True, 'message': 'Assessment completed. Thank you for sharing.'})
 
-@app.route('/facilities')
-def facilities():
-    county = request.args.get('county', '')
-    facility_type = request.args.get('facility_type', '')
-    service = request.args.get('service', '')
-    name = request.args.get('name', '')
+# Assessment statistics folded in batches; each read first picks up newer assessments
+trend_cache = mental_health_trends.TrendCache(window=app.config['MENTAL_HEALTH_WINDOW'],
+                                              threshold=app.config['MENTAL_HEALTH_DETERIORATION'])
+
+def get_trend_cache():
+    """Return the assessment trend cache with every committed assessment folded in"""
+    trend_cache.refresh(db.session.connection())
+    return trend_cache
+
+@app.route('/api/mental_health/trends')
+def api_mental_health_trends():
+    """The logged-in user's assessments with rolling averages and deterioration flag"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'})
+
+    rows = db.session.query(MentalHealthAssessment.assessment_date, MentalHealthAssessment.mood_score,
+                            MentalHealthAssessment.anxiety_level).filter(
+        MentalHealthAssessment.user_id == session['user_id']
+    ).order_by(MentalHealthAssessment.assessment_date).all()
+    trend = mental_health_trends.user_trend(rows, app.config['MENTAL_HEALTH_WINDOW'],
+                                            app.config['MENTAL_HEALTH_DETERIORATION'])
+    indicators = db.session.query(AssessmentIndicator.indicator, db.func.count()).join(
+        MentalHealthAssessment, MentalHealthAssessment.id == AssessmentIndicator.assessment_id
+    ).filter(MentalHealthAssessment.user_id == session['user_id']).group_by(AssessmentIndicator.indicator).all()
+    return jsonify(dict(trend, success=True, window=app.config['MENTAL_HEALTH_WINDOW'],
+                        indicators=dict(sorted(indicators, key=lambda item: (-item[1], item[0])))))
+
+@app.route('/api/mental_health/county_trends')
+def api_mental_health_county_trends():
+    """Weekly mood and anxiety, indicator frequencies and deteriorating users of a county (or all)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'})
+
+    county = request.args.get('county') or None
+    if county is not None and county not in LIBERIAN_COUNTIES:
+        return jsonify({'success': False, 'message': 'Unknown county'}), 400
+    weeks = min(max(request.args.get('weeks', 12, type=int), 1), 104)
+    return jsonify(dict(get_trend_cache().county_trends(county, weeks), success=True))
+
+def facilities_query(args):
+    """Build the facilities query and its keyset ordering from request args"""
+    county = args.get('county', '')
+    facility_type = args.get('facility_type', '')
+    service = args.get('service', '')
+    name = args.get('name', '')
 
     query = HealthFacility.query
+    order_by = [(HealthFacility.name, False), (HealthFacility.id, False)]
 
     if county:
         query = query.filter_by(county=county)
     if facility_type:
         query = query.filter_by(facility_type=facility_type)
-    if service:
-        query = query.filter(HealthFacility.services.ilike(f'%{service}%'))
-    if name:
-        query = query.filter(HealthFacility.name.ilike(f'%{name}%'))
+    if full_text_search_enabled():
+        match = search_index.match_expression(services=service, name=name)
+        if match:
+            matches = search_index.facility_matches(match)
+            query = query.join(matches, matches.c.id == HealthFacility.id)
+            order_by = [(matches.c.rank, False), (HealthFacility.id, False)]
+    else:
+        if service:
+            query = query.filter(HealthFacility.services.ilike(f'%{service}%'))
+        if name:
+            query = query.filter(HealthFacility.name.ilike(f'%{name}%'))
 
-    facilities = query.all()
+    return query, order_by
 
-    # Get unique facility types and services for filter dropdowns
-    facility_types = db.session.query(HealthFacility.facility_type).distinct().all()
-    facility_types = [ft[0] for ft in facility_types if ft[0]]
+@app.route('/facilities')
+@conditional(page_validators(directory_validator))
+def facilities():
+    query, order_by = facilities_query(request.args)
+    page = paginate_request(query, order_by)
+
+    # Unique facility types and services for filter dropdowns, served from the facet index
+    facet_index = get_facility_facets()
 
     return render_template('facilities.html', 
-                         facilities=facilities, 
+                         facilities=page.items, 
+                         page=page,
                          counties=LIBERIAN_COUNTIES,
-                         facility_types=facility_types)
+                         facility_types=facet_index.values('facility_type'),
+                         services=facet_index.values('service'),
+                         facet_counts=facility_facet_counts(request.args))
+
+@app.route('/api/facilities')
+def api_facilities():
+    query, order_by = facilities_query(request.args)
+    page = paginate_request(query, order_by)
+    return jsonify(page.to_dict(HealthFacility.to_dict))
+
+# Filter facets, kept in step with change_log
+professional_facets = FacetIndex(('county', 'specialty'))
+facility_facets = FacetIndex(('county', 'facility_type', 'service'), multi='service')
+
+def _facility_facet_values(county, facility_type, services):
+    return {
+        'county': county,
+        'facility_type': facility_type,
+        'service': [name.strip() for name in (services or '').split(',') if name.strip()]
+    }
+
+def _listed_professionals(*criteria):
+    return db.session.query(User.id, User.county, User.specialty).filter(
+        User.user_type == 'professional',
+        User.is_approved == True,
+        *criteria
+    ).all()
+
+def _reload_professional_facets(user_ids):
+    listed = _listed_professionals(User.id.in_(user_ids))
+    for row in listed:
+        professional_facets.upsert(row.id, {'county': row.county, 'specialty': row.specialty})
+    for user_id in set(user_ids) - {row.id for row in listed}:
+        professional_facets.remove(user_id)
+
+professional_facets_follower = change_feed.IndexFollower(
+    lambda: professional_facets.load((row.id, {'county': row.county, 'specialty': row.specialty})
+                                     for row in _listed_professionals()),
+    {'professionals': _reload_professional_facets}, log_versions)
+
+def _facility_facet_rows(*criteria):
+    return db.session.query(HealthFacility.id, HealthFacility.county,
+                            HealthFacility.facility_type, HealthFacility.services).filter(*criteria).all()
+
+def _reload_facility_facets(facility_ids):
+    rows = _facility_facet_rows(HealthFacility.id.in_(facility_ids))
+    for row in rows:
+        facility_facets.upsert(row.id, _facility_facet_values(row.county, row.facility_type, row.services))
+    for facility_id in set(facility_ids) - {row.id for row in rows}:
+        facility_facets.remove(facility_id)
+
+facility_facets_follower = change_feed.IndexFollower(
+    lambda: facility_facets.load((row.id, _facility_facet_values(row.county, row.facility_type, row.services))
+                                 for row in _facility_facet_rows()),
+    {'facilities': _reload_facility_facets}, log_versions)
+
+def get_professional_facets():
+    """Return facets over approved professionals, loading them on first use and replaying later changes"""
+    professional_facets_follower.sync(db.session.connection())
+    return professional_facets
+
+def get_facility_facets():
+    """Return facets over facilities, loading them on first use and replaying later changes"""
+    facility_facets_follower.sync(db.session.connection())
+    return facility_facets
+
+def _contains_all(terms):
+    terms = [term.strip().lower() for term in terms if term.strip()]
+    return lambda value: all(term in value.lower() for term in terms)
+
+def _equals_ignoring_case(term):
+    term = term.strip().lower()
+    return lambda value: value.lower() == term
+
+def professional_facet_counts(args):
+    """Per-value counts of the professional facets left after the current filters"""
+    facet_index = get_professional_facets()
+    terms = [args.get('specialty', ''), args.get('profession', '')]
+    filters = {
+        'county': args.get('county', ''),
+        'specialty': _contains_all(terms) if any(t.strip() for t in terms) else ''
+    }
+    return {dimension: facet_index.counts(dimension, **filters) for dimension in facet_index.dimensions}
+
+def facility_facet_counts(args):
+    """Per-value counts of the facility facets left after the current filters"""
+    facet_index = get_facility_facets()
+    service = args.get('service', '')
+    filters = {
+        'county': args.get('county', ''),
+        'facility_type': args.get('facility_type', ''),
+        # Each facility lists a service once, so an exact match keeps counts per facility
+        'service': _equals_ignoring_case(service) if service.strip() else ''
+    }
+    return {dimension: facet_index.counts(dimension, **filters) for dimension in facet_index.dimensions}
+
+@app.route('/api/facets/professionals')
+def api_professional_facets():
+    return jsonify({'success': True, 'facets': professional_facet_counts(request.args)})
+
+@app.route('/api/facets/facilities')
+def api_facility_facets():
+    return jsonify({'success': True, 'facets': facility_facet_counts(request.args)})
+
+# Nearest-facility search, kept in step with change_log
+facility_index = FacilityIndex()
+
+def _located_facilities(*criteria):
+    return db.session.query(HealthFacility.id, HealthFacility.latitude,
+                            HealthFacility.longitude, HealthFacility.services).filter(
+        HealthFacility.latitude.isnot(None),
+        HealthFacility.longitude.isnot(None),
+        *criteria
+    ).all()
+
+def _reload_facility_index(facility_ids):
+    rows = _located_facilities(HealthFacility.id.in_(facility_ids))
+    for row in rows:
+        facility_index.upsert(row.id, row.latitude, row.longitude, row.services)
+    for facility_id in set(facility_ids) - {row.id for row in rows}:
+        facility_index.remove(facility_id)
+
+facility_follower = change_feed.IndexFollower(lambda: facility_index.load(_located_facilities()),
+                                              {'facilities': _reload_facility_index}, log_versions)
+
+def get_facility_index():
+    """Return the facility spatial index, loading it on first use and replaying later changes"""
+    facility_follower.sync(db.session.connection())
+    return facility_index
+
+def warm_indexes():
+    """Load every lazily built in-memory index now rather than on first request"""
+    get_trend_cache()
+    get_outbreak_monitor()
+    get_facility_index()
+    get_facility_facets()
+    get_professional_facets()
+    get_chat_matcher()
+    get_booking_index()
+    get_slot_index()
+
+@app.route('/api/facilities/nearby')
+def nearby_facilities():
+    """Return the k facilities closest to a point, optionally offering a service"""
+    try:
+        lat = float(request.args['lat'])
+        lon = float(request.args['lon'])
+        k = int(request.args.get('k', 5))
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'lat and lon are required numbers'}), 400
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'success': False, 'message': 'lat/lon out of range'}), 400
+    k = max(1, min(k, 50))
+    service = request.args.get('service', '')
+
+    matches = get_facility_index().nearest(lat, lon, k, service=service or None)
+    facilities_by_id = {f.id: f for f in HealthFacility.query.filter(
+        HealthFacility.id.in_([facility_id for _, facility_id in matches])).all()}
+
+    results = []
+    for distance, facility_id in matches:
+        facility = facilities_by_id.get(facility_id)
+        if facility is not None:
+            item = facility.to_dict()
+            item['distance_km'] = round(distance, 3)
+            results.append(item)
+    return jsonify({'success': True, 'facilities': results, 'count': len(results)})
 
 @app.route('/telemedicine')
 def telemedicine():
@@ -319,10 +1067,10 @@ def telemedicine():
         return redirect(url_for('login'))
     return render_template('telemedicine.html')
 
-@app.route('/education')
-def health_education():
-    category = request.args.get('category', '')
-    language = request.args.get('language', 'English')
+def education_query(args):
+    """Build the education articles query and its keyset ordering (newest first)"""
+    category = args.get('category', '')
+    language = args.get('language', 'English')
 
     query = HealthEducation.query
     if category:
@@ -330,16 +1078,56 @@ def health_education():
     if language:
         query = query.filter_by(language=language)
 
-    articles = query.all()
-    return render_template('education.html', articles=articles)
+    return query, [(HealthEducation.created_at, True), (HealthEducation.id, True)]
+
+@app.route('/education')
+@conditional(page_validators(directory_validator))
+def health_education():
+    query, order_by = education_query(request.args)
+    page = paginate_request(query, order_by)
+    return render_template('education.html', articles=page.items, page=page)
+
+@app.route('/api/education')
+def api_education():
+    query, order_by = education_query(request.args)
+    page = paginate_request(query, order_by)
+    return jsonify(page.to_dict(HealthEducation.to_dict))
+
+PRESCRIPTIONS_ORDER = [(Prescription.prescribed_date, True), (Prescription.id, True)]
 
 @app.route('/prescriptions')
 def prescriptions():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user_prescriptions = Prescription.query.filter_by(patient_id=session['user_id']).all()
-    return render_template('prescriptions.html', prescriptions=user_prescriptions)
+    query = Prescription.query.filter_by(patient_id=session['user_id']).options(
+        selectinload(Prescription.professional))
+    page = paginate_request(query, PRESCRIPTIONS_ORDER)
+    return render_template('prescriptions.html', prescriptions=page.items, page=page)
+
+@app.route('/api/prescriptions')
+def api_prescriptions():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'})
+
+    query = Prescription.query.filter_by(patient_id=session['user_id']).options(
+        selectinload(Prescription.professional))
+    page = paginate_request(query, PRESCRIPTIONS_ORDER)
+    return jsonify(page.to_dict(Prescription.to_dict))
+
+# Counters kept in stat_counter by the flushes that change users and appointments
+admin_stats = stats.StatsTracker()
+admin_stats.track(User, stats.user_keys, ('user_type', 'county', 'is_approved'))
+admin_stats.track(Appointment, stats.appointment_keys, ('status', 'appointment_date'))
+ADMIN_PENDING_LIMIT = 50  # pending professionals listed on /admin; the total comes from the counters
+
+def reconcile_stats():
+    """Recount the admin statistics and fix any drift; returns the corrections"""
+    with app.app_context():
+        with db.engine.begin() as connection:
+            return stats.reconcile(connection)
+
+stats_reconciler = stats.Reconciler(reconcile_stats, app.config['STATS_RECONCILE_INTERVAL'])
 
 @app.route('/admin')
 def admin():
@@ -347,14 +1135,37 @@ def admin():
         return redirect(url_for('login'))
 
     # Simple admin check (in real app, you'd have proper role management)
-    pending_professionals = User.query.filter_by(user_type='professional', is_approved=False).all()
-    total_users = User.query.count()
-    total_appointments = Appointment.query.count()
+    stats_reconciler.start()
+    summary = stats.read_stats(db.session.connection())
+    pending_professionals = User.query.filter_by(user_type='professional', is_approved=False) \
+        .order_by(User.name).limit(ADMIN_PENDING_LIMIT).all()
 
     return render_template('admin.html', 
                          pending_professionals=pending_professionals,
-                         total_users=total_users,
-                         total_appointments=total_appointments)
+                         pending_total=summary['pending_approvals']['total'],
+                         total_users=summary['users']['total'],
+                         total_appointments=summary['appointments']['total'],
+                         stats=summary)
+
+@app.route('/api/admin/stats')
+def api_admin_stats():
+    """Users by type and county, appointments by status and day, and pending approvals"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'})
+
+    today = datetime.utcnow().date()
+    try:
+        since = date.fromisoformat(request.args['since']) if request.args.get('since') else today - timedelta(days=30)
+        until = date.fromisoformat(request.args['until']) if request.args.get('until') else today + timedelta(days=30)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'since and until must be YYYY-MM-DD dates'}), 400
+    if until < since or (until - since).days > 366:
+        return jsonify({'success': False, 'message': 'Date range must be between 0 and 366 days'}), 400
+
+    stats_reconciler.start()
+    summary = stats.read_stats(db.session.connection(), since.isoformat(), until.isoformat())
+    return jsonify(dict(summary, success=True, since=since.isoformat(), until=until.isoformat(),
+                        reconciliation=stats_reconciler.status()))
 
 @app.route('/approve_professional/<int:professional_id>')
 def approve_professional(professional_id):
@@ -365,49 +1176,395 @@ def approve_professional(professional_id):
     return redirect(url_for('admin'))
 
 @app.route('/disease_scanner')
+@conditional(page_validators())
 def disease_scanner():
     return render_template('disease_scanner.html')
 
+# County x disease x day buckets with EWMA/CUSUM detectors; each read first folds in newer signals
+outbreak_monitor = outbreak_surveillance.OutbreakMonitor(z=app.config['OUTBREAK_Z_SCORE'],
+                                                         h=app.config['OUTBREAK_CUSUM_LIMIT'],
+                                                         daily_days=app.config['OUTBREAK_DAILY_DAYS'],
+                                                         weekly_weeks=app.config['OUTBREAK_WEEKLY_WEEKS'])
+outbreak_signals = outbreak_surveillance.SignalExtractor(LIBERIAN_COUNTIES)
+
+def get_outbreak_monitor():
+    """Return the outbreak monitor with every logged signal folded in"""
+    outbreak_monitor.refresh(db.session.connection())
+    return outbreak_monitor
+
+def record_chat_signals(diseases):
+    """Log the diseases and symptoms a chat message asked about, once per session, disease and day"""
+    today = datetime.utcnow().date()
+    seen = {disease: day for disease, day in session.get('outbreak_signals', {}).items() if day == today.isoformat()}
+    diseases = [disease for disease in diseases if disease not in seen]
+    if not diseases:
+        return
+    county = None
+    if 'user_id' in session:
+        user = db.session.get(User, session['user_id'])
+        county = user.county if user else None
+    db.session.execute(insert(OutbreakSignal.__table__),
+                       outbreak_surveillance.signal_rows(today, county, diseases, 'chat'))
+    db.session.commit()
+    session['outbreak_signals'] = dict(seen, **dict.fromkeys(diseases, today.isoformat()))
+
+def record_nphil_alerts(articles):
+    """nphil_feed listener logging the diseases named by newly scraped health alerts"""
+    today = datetime.utcnow().date()
+    rows = [row for county, disease, fingerprint in outbreak_signals.alert_signals(articles)
+            for row in outbreak_surveillance.signal_rows(today, county, [disease], 'nphil', fingerprint)]
+    if rows:
+        with app.app_context():
+            with db.engine.begin() as connection:
+                # Alerts already logged by an earlier scrape keep their first day
+                connection.execute(insert(OutbreakSignal.__table__).prefix_with('OR IGNORE'), rows)
+
 @app.route('/disease_outbreak')
 def disease_outbreak():
-    return render_template('disease_outbreak.html')
+    return render_template('disease_outbreak.html', alerts=get_outbreak_monitor().alerts())
+
+@app.route('/api/outbreaks')
+def api_outbreaks():
+    """Daily signal counts, older weekly counts and detector state per county and disease"""
+    county = request.args.get('county')
+    if county and county not in LIBERIAN_COUNTIES:
+        return jsonify({'success': False, 'message': 'Unknown county'}), 400
+    days = min(max(request.args.get('days', 30, type=int), 1), app.config['OUTBREAK_DAILY_DAYS'])
+    # An empty county= selects the signals whose county is unknown
+    series = get_outbreak_monitor().time_series(county, request.args.get('disease') or None, days)
+    return jsonify({'success': True, 'days': days, 'series': series})
+
+@app.route('/api/outbreaks/alerts')
+def api_outbreak_alerts():
+    """County and disease series alarming now or within the last week"""
+    return jsonify({'success': True, 'alerts': get_outbreak_monitor().alerts()})
+
+@jobs.task('scan_image', max_attempts=3, priority=job_queue.PRIORITY_HIGH,
+           on_failure=lambda payload: image_analysis.remove_upload(payload['path']))
+def scan_image_job(payload):
+    try:
+        return image_analyzer.analyze(payload['path'])
+    except image_analysis.UploadError as e:
+        raise job_queue.PermanentFailure(str(e))
 
 @app.route('/scan_disease', methods=['POST'])
 def scan_disease():
-    # Placeholder for AI image analysis
-    # In production, this would integrate with computer vision AI
-    return jsonify({
-        'success': True, 
-        'analysis': 'Common skin condition detected. Consult healthcare provider.',
-        'confidence': 85
-    })
+    """Queue an image (multipart field ``image`` or the raw body) for analysis; returns a job to poll"""
+    job_worker.start()
+    # Refuse before reading the upload when the scanner is already behind
+    pending = jobs.pending(db.session.connection(), 'scan_image')
+    if pending >= app.config['IMAGE_MAX_PENDING']:
+        raise image_analysis.AnalyzerBusy('Too many images are being analyzed')
+    # Multipart overhead on top of the image; larger bodies are refused with 413 before parsing
+    request.max_content_length = app.config['IMAGE_MAX_BYTES'] + 64 * 1024
+    upload = request.files.get('image')
+    path = image_analysis.save_upload(upload.stream if upload else request.stream,
+                                      app.config['IMAGE_UPLOAD_DIR'], app.config['IMAGE_MAX_BYTES'])
+    # Job ids are sequential; the token keeps other people's results private
+    token = secrets.token_urlsafe(16)
+    try:
+        job_id = jobs.enqueue(db.session.connection(), 'scan_image', {'path': path, 'token': token})
+        db.session.commit()
+    except BaseException:
+        db.session.rollback()
+        image_analysis.remove_upload(path)
+        raise
+    return jsonify({'success': True, 'job_id': job_id, 'status': 'queued',
+                    'poll': url_for('scan_disease_job', job_id=job_id, token=token)}), 202
+
+@app.route('/scan_disease/<int:job_id>/<token>')
+def scan_disease_job(job_id, token):
+    """Status of an analysis job, with the analyzer's result once done"""
+    job_worker.start()
+    job = jobs.get(db.session.connection(), job_id)
+    if job is None or job['kind'] != 'scan_image' or not secrets.compare_digest(job['payload']['token'], token):
+        return jsonify({'success': False, 'message': 'Unknown or expired analysis job'}), 404
+    return jsonify({'success': True, 'job_id': job_id, 'status': job['status'], 'result': job['result'],
+                    'error': job['error'] if job['status'] == 'failed' else None,
+                    'created_at': job['created_at'], 'finished_at': job['finished_at']})
+
+APPOINTMENTS_ORDER = [(Appointment.appointment_date, False), (Appointment.id, False)]
 
 @app.route('/appointments')
 def appointments():
     if 'user_id' not in session:
         return redirect(url_for('login'))
 
-    user_appointments = Appointment.query.filter_by(patient_id=session['user_id']).all()
-    return render_template('appointments.html', appointments=user_appointments)
+    query = Appointment.query.filter_by(patient_id=session['user_id']).options(
+        selectinload(Appointment.professional))
+    page = paginate_request(query, APPOINTMENTS_ORDER)
+    return render_template('appointments.html', appointments=page.items, page=page)
+
+@app.route('/api/appointments')
+def api_appointments():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'})
+
+    query = Appointment.query.filter_by(patient_id=session['user_id']).options(
+        selectinload(Appointment.professional))
+    page = paginate_request(query, APPOINTMENTS_ORDER)
+    return jsonify(page.to_dict(Appointment.to_dict))
 
 @app.route('/nphil_health_info')
 def nphil_health_info():
     """Display health information from NPHIL website"""
-    health_data = scrape_nphil_health_info()
-    return render_template('nphil_health.html', health_data=health_data)
+    health_data = nphil_feed.get()
+    return render_template('nphil_health.html', health_data=health_data, feed_status=nphil_feed.status())
 
 @app.route('/api/fetch_nphil_data')
+@conditional(page_validators(nphil_validator))
 def fetch_nphil_data():
-    """API endpoint to fetch fresh NPHIL data"""
-    health_data = scrape_nphil_health_info()
-    return jsonify({'success': True, 'data': health_data, 'count': len(health_data)})
+    """API endpoint serving the cached NPHIL data (refreshed in the background)"""
+    health_data = nphil_feed.get()
+    return jsonify({'success': True, 'data': health_data, 'count': len(health_data),
+                    'feed': nphil_feed.status()})
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Request, SQL and scrape metrics of this process in the Prometheus text format"""
+    token = app.config['METRICS_TOKEN']
+    if token and not secrets.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        abort(401)
+    return request_metrics.registry.render(), 200, {'Content-Type': metrics.CONTENT_TYPE}
+
+def stored_sync_results(user_id, keys):
+    """Results already recorded for a user's idempotency keys, by key"""
+    stored = {}
+    keys = list(keys)
+    # Stay well under SQLite's bound-parameter limit
+    for start in range(0, len(keys), 500):
+        rows = db.session.query(SyncRecord.idempotency_key, SyncRecord.record_type, SyncRecord.status,
+                                SyncRecord.result_id, SyncRecord.message).filter(
+            SyncRecord.user_id == user_id,
+            SyncRecord.idempotency_key.in_(keys[start:start + 500])
+        )
+        for key, record_type, status, result_id, message in rows:
+            stored[key] = {'key': key, 'type': record_type, 'status': status, 'id': result_id, 'message': message}
+    return stored
+
+def apply_sync_batch(user, records):
+    """Apply a batch of offline records in one transaction; returns one result per record"""
+    now = datetime.utcnow()
+    keys = [record_key(record) for record in records]
+    stored = stored_sync_results(user.id, {key for key in keys if key})
+    results = [None] * len(records)
+    assessments = []  # (position, row) pairs, inserted together at the end
+    appointments = []
+    new_keys = set()
+    new_positions = []
+
+    for position, (record, key) in enumerate(zip(records, keys)):
+        if key is None:
+            results[position] = {'key': None, 'status': 'rejected', 'message': 'Missing or invalid idempotency key'}
+            continue
+        if key in stored:
+            results[position] = dict(stored[key], replayed=True)
+            continue
+        if key in new_keys:
+            results[position] = {'key': key, 'status': 'rejected', 'message': 'Key repeated within the batch'}
+            continue
+        new_keys.add(key)
+        new_positions.append(position)
+
+        record_type = record.get('type')
+        data = record.get('data') or {}
+        result = {'key': key, 'type': record_type, 'status': 'applied', 'id': None, 'message': None}
+        try:
+            if not isinstance(data, dict):
+                raise RecordRejected('data must be an object')
+            if record_type == 'assessment':
+                assessments.append((position, assessment_row(user.id, data, now)))
+            elif record_type == 'appointment':
+                appointment = schedule_appointment(user.id, data.get('professional_id'), data.get('appointment_date'),
+                                                   data.get('appointment_type'), data.get('notes', ''))
+                appointments.append(appointment)
+                result['id'] = appointment['id']
+            elif record_type == 'profile':
+                for field, value in profile_changes(data, user.user_type).items():
+                    setattr(user, field, value)
+                    if field == 'availability':
+                        schedule = parse_availability(value)
+                        user.availability_schedule = schedule.to_json() if schedule else None
+                result['id'] = user.id
+            else:
+                raise RecordRejected('Unknown record type')
+        except (RecordRejected, BookingError) as e:
+            result['status'] = 'conflict' if isinstance(e, BookingConflict) else 'rejected'
+            result['message'] = str(e)
+        results[position] = result
+
+    if assessments:
+        table = MentalHealthAssessment.__table__
+        ids = db.session.execute(insert(table).returning(table.c.id, sort_by_parameter_order=True),
+                                 [row for _, row in assessments]).scalars().all()
+        indicators, signals = [], []
+        for (position, row), assessment_id in zip(assessments, ids):
+            row['id'] = results[position]['id'] = assessment_id
+            indicators += mental_health_trends.indicator_rows(assessment_id, row['depression_indicators'])
+            if outbreak_surveillance.is_distressed(row['mood_score'], row['anxiety_level']):
+                signals += outbreak_surveillance.signal_rows(row['assessment_date'].date(), user.county,
+                                                             [outbreak_surveillance.DISTRESS_DISEASE], 'assessment')
+        if indicators:
+            db.session.execute(insert(AssessmentIndicator.__table__), indicators)
+        if signals:
+            db.session.execute(insert(OutbreakSignal.__table__), signals)
+    if new_positions:
+        db.session.execute(insert(SyncRecord.__table__), [{
+            'user_id': user.id, 'idempotency_key': results[p]['key'], 'record_type': results[p]['type'],
+            'status': results[p]['status'], 'result_id': results[p]['id'], 'message': results[p]['message'],
+            'created_at': now,
+        } for p in new_positions])
+    db.session.commit()
+
+    # Core inserts skip the ORM's flush events, so announce them here
+    if appointments:
+        model_events.notify(Appointment, [Change('insert', row, None) for row in appointments])
+    if assessments:
+        model_events.notify(MentalHealthAssessment, [Change('insert', row, None) for _, row in assessments])
+    return results
 
 @app.route('/offline_sync', methods=['POST'])
 def offline_sync():
-    # Handle offline data synchronization
-    data = request.get_json()
-    # Store offline data and sync when connection is available
-    return jsonify({'success': True, 'message': 'Data synced successfully'})
+    """Apply a (gzip-compressed) batch of records queued while offline"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'message': 'Please login first'})
+
+    try:
+        records = read_batch(request.get_data(), request.headers.get('Content-Encoding'),
+                             max_bytes=app.config['SYNC_MAX_BYTES'], max_records=app.config['SYNC_MAX_RECORDS'])
+    except SyncError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    user = db.session.get(User, session['user_id'])
+    if user is None:
+        return jsonify({'success': False, 'message': 'Please login first'})
+    try:
+        results = apply_sync_batch(user, records)
+    except IntegrityError:
+        # The same keys were committed by a concurrent upload; replay against them
+        db.session.rollback()
+        user = db.session.get(User, session['user_id'])
+        results = apply_sync_batch(user, records)
+
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return jsonify({'success': True, 'message': 'Data synced successfully', 'results': results, 'counts': counts})
+
+# Change-feed name -> (model, whether a row is visible to clients, serializer)
+CHANGE_FEEDS = {
+    'facilities': (HealthFacility, lambda row: True, HealthFacility.to_dict),
+    'professionals': (User, lambda row: row.user_type == 'professional' and row.is_approved, User.to_public_dict),
+    'education': (HealthEducation, lambda row: True, HealthEducation.to_dict),
+}
+
+CHANGES_LISTING = listing_id('changes')
+
+@app.route('/api/changes')
+def api_changes():
+    """Facilities, professionals and education rows changed since a feed cursor.
+
+    Without ``since`` the feed starts from the beginning, i.e. a full download.
+    Each reply carries the cursor to send next time; rows that were deleted or
+    left the public listings come back in ``deleted``.
+    """
+    since = 0
+    if request.args.get('since'):
+        # Cursors from before listings were named are still honoured, so clients need not re-download
+        _, (since,) = decode_cursor(request.args['since'], 1, CHANGES_LISTING, allow_unnamed=True)
+        if not isinstance(since, int) or since < 0:
+            raise InvalidCursor('Cursor does not match this listing')
+    limit = min(max(request.args.get('limit', app.config['CHANGE_FEED_LIMIT'], type=int), 1), 5000)
+
+    entries = change_feed.changes_since(db.session.connection(), since, limit)
+    ids = {feed: [] for feed in CHANGE_FEEDS}
+    for feed, row_id, seq in entries:
+        ids[feed].append(row_id)
+
+    changes = {}
+    for feed, row_ids in ids.items():
+        if not row_ids:
+            continue
+        model, visible, serialize = CHANGE_FEEDS[feed]
+        upserted = []
+        for start in range(0, len(row_ids), 500):
+            upserted.extend(row for row in model.query.filter(model.id.in_(row_ids[start:start + 500]))
+                            if visible(row))
+        present = {row.id for row in upserted}
+        changes[feed] = {
+            'upserted': [serialize(row) for row in upserted],
+            'deleted': [row_id for row_id in row_ids if row_id not in present],
+        }
+
+    cursor = entries[-1].seq if entries else since
+    return jsonify({'success': True, 'changes': changes,
+                    'cursor': encode_cursor('next', [cursor], CHANGES_LISTING), 'has_more': len(entries) == limit})
+
+def county_bundle(county):
+    """Everything a clinic in county needs offline, as one JSON document"""
+    facilities = HealthFacility.query.filter_by(county=county).order_by(HealthFacility.name, HealthFacility.id)
+    professionals = User.query.filter_by(user_type='professional', is_approved=True, county=county).order_by(
+        User.name, User.id)
+    education = HealthEducation.query.order_by(HealthEducation.language, HealthEducation.created_at,
+                                               HealthEducation.id)
+    return {
+        'county': county,
+        'facilities': [facility.to_dict() for facility in facilities],
+        'professionals': [professional.to_public_dict() for professional in professionals],
+        'education': [article.to_dict() for article in education],
+        'translations': {language: dict(get_language_map(language)) for language in get_available_languages()},
+    }
+
+def build_county_bundle(county):
+    """Write county's offline bundle files; returns the bundle version"""
+    with app.app_context():
+        return offline_bundles.write_bundle(app.config['OFFLINE_BUNDLE_DIR'], county, county_bundle(county))
+
+bundle_rebuilder = offline_bundles.BundleRebuilder(build_county_bundle, app.config['OFFLINE_BUNDLE_DELAY'])
+_bundle_catalog_version = [None]
+
+@model_events.subscribe(HealthFacility)
+def _rebuild_facility_bundles(changes):
+    bundle_rebuilder.schedule(*{county for change in changes
+                                for county in (change.row['county'], (change.old or {}).get('county'))})
+
+@model_events.subscribe(User)
+def _rebuild_professional_bundles(changes):
+    bundle_rebuilder.schedule(*{row['county'] for change in changes for row in (change.row, change.old) if row
+                                and row['user_type'] == 'professional'})
+
+@model_events.subscribe(HealthEducation)
+def _rebuild_education_bundles(changes):
+    bundle_rebuilder.schedule(*LIBERIAN_COUNTIES)
+
+@app.route('/api/offline_bundles')
+def api_offline_bundles():
+    """Latest offline bundle per county with the URLs of its compressed files"""
+    # Translation tables are in every bundle, so a catalog edit rebuilds them all
+    version = catalog_version()
+    if _bundle_catalog_version[0] is not None and _bundle_catalog_version[0] != version:
+        bundle_rebuilder.schedule(*LIBERIAN_COUNTIES)
+    _bundle_catalog_version[0] = version
+
+    bundles = offline_bundles.manifest(app.config['OFFLINE_BUNDLE_DIR'], LIBERIAN_COUNTIES)
+    missing = [county for county, bundle in bundles.items() if bundle is None]
+    if missing:
+        bundle_rebuilder.schedule(*missing)
+    for bundle in bundles.values():
+        for entry in (bundle or {}).get('files', {}).values():
+            entry['url'] = url_for('offline_bundle_file', filename=entry['file'])
+    return jsonify({'success': True, 'bundles': bundles, 'pending': missing})
+
+@app.route('/offline_bundles/<filename>')
+def offline_bundle_file(filename):
+    """Serve a bundle file; names are content-addressed, so they can be cached forever"""
+    match = offline_bundles.FILE_RE.match(filename)
+    if not match:
+        abort(404)
+    mimetype = 'application/gzip' if match.group('suffix') == '.json.gz' else 'application/octet-stream'
+    # conditional=True answers Range requests with 206, so downloads can resume
+    return send_from_directory(app.config['OFFLINE_BUNDLE_DIR'], filename, mimetype=mimetype,
+                               conditional=True, max_age=365 * 24 * 60 * 60)
 
 @app.route('/set_language/<language>')
 def set_language(language):
@@ -437,85 +1594,137 @@ def inject_translation():
     current_language = session.get('language', 'english')
     return {
         'get_translation': get_translation,
+        # Whole resolved map for the session language, e.g. {{ translations.welcome }}
+        'translations': get_language_map(current_language),
         'current_language': current_language,
         'available_languages': get_available_languages(),
         'LIBERIAN_LANGUAGES': LIBERIAN_LANGUAGES
     }
 
-@app.route('/logout')
-def logout():
-    session.clear()
-    return redirect(url_for('index'))
-
-def scrape_nphil_health_info():
-    """Scrape health information from NPHIL website"""
-    try:
-        url = "https://nphil.gov.lr/"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-
-        soup = BeautifulSoup(response.content, 'html.parser')
+@app.errorhandler(HasherBusy)
+def hasher_busy(error):
+    response = jsonify({'success': False, 'message': 'The server is busy, please try again shortly.'})
+    response.headers['Retry-After'] = '2'
+    return response, 503
 
-        health_articles = []
+@app.errorhandler(image_analysis.AnalyzerBusy)
+def analyzer_busy(error):
+    response = jsonify({'success': False, 'message': 'The scanner is busy, please try again shortly.'})
+    response.headers['Retry-After'] = '5'
+    return response, 503
 
-        # Extract news/articles from the website
-        articles = soup.find_all(['article', 'div'], class_=['post', 'news-item', 'article', 'content-item'])
+@app.errorhandler(image_analysis.UploadError)
+def upload_error(error):
+    return jsonify({'success': False, 'message': str(error)}), 400
 
-        # If no specific article containers found, try general content extraction
-        if not articles:
-            articles = soup.find_all(['div', 'section'], class_=['content', 'main-content', 'news', 'updates'])
+@app.errorhandler(BookingError)
+def booking_error(error):
+    db.session.rollback()
+    return jsonify({'success': False, 'message': str(error)}), error.status_code
 
-        # Extract text content from paragraphs and headers
-        content_sections = soup.find_all(['h1', 'h2', 'h3', 'h4', 'p'])
+@app.errorhandler(InvalidCursor)
+def invalid_cursor(error):
+    return jsonify({'success': False, 'message': str(error)}), 400
 
-        # Combine extracted content
-        for i, section in enumerate(content_sections[:20]):  # Limit to first 20 sections
-            text = section.get_text(strip=True)
-            if len(text) > 50:  # Only include substantial content
-                title = f"NPHIL Health Update {i+1}"
-                if section.name in ['h1', 'h2', 'h3', 'h4']:
-                    title = text[:100]
-                    continue
-
-                health_articles.append({
-                    'title': title,
-                    'content': text,
-                    'category': 'public-health',
-                    'source': 'NPHIL'
-                })
-
-        # Extract any health alerts or announcements
-        alerts = soup.find_all(string=lambda text: text and any(keyword in text.lower() for keyword in 
-                              ['alert', 'outbreak', 'vaccination', 'epidemic', 'health', 'disease', 'prevention']))
-
-        for alert in alerts[:10]:  # Limit alerts
-            text = alert.strip()
-            if len(text) > 30:
-                health_articles.append({
-                    'title': 'NPHIL Health Alert',
-                    'content': text,
-                    'category': 'health-alert',
-                    'source': 'NPHIL'
-                })
+@app.route('/logout')
+def logout():
+    session.clear()
+    return redirect(url_for('index'))
 
-        return health_articles
+NPHIL_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+def parse_nphil_health_info(content):
+    """Extract health articles and alerts from an NPHIL page"""
+    soup = BeautifulSoup(content, 'html.parser')
+
+    health_articles = []
+
+    # Extract news/articles from the website
+    articles = soup.find_all(['article', 'div'], class_=['post', 'news-item', 'article', 'content-item'])
+
+    # If no specific article containers found, try general content extraction
+    if not articles:
+        articles = soup.find_all(['div', 'section'], class_=['content', 'main-content', 'news', 'updates'])
+
+    # Extract text content from paragraphs and headers
+    content_sections = soup.find_all(['h1', 'h2', 'h3', 'h4', 'p'])
+
+    # Combine extracted content
+    for i, section in enumerate(content_sections[:20]):  # Limit to first 20 sections
+        text = section.get_text(strip=True)
+        if len(text) > 50:  # Only include substantial content
+            title = f"NPHIL Health Update {i+1}"
+            if section.name in ['h1', 'h2', 'h3', 'h4']:
+                title = text[:100]
+                continue
+
+            health_articles.append({
+                'title': title,
+                'content': text,
+                'category': 'public-health',
+                'source': 'NPHIL'
+            })
+
+    # Extract any health alerts or announcements
+    alerts = soup.find_all(string=lambda text: text and any(keyword in text.lower() for keyword in 
+                          ['alert', 'outbreak', 'vaccination', 'epidemic', 'health', 'disease', 'prevention']))
+
+    for alert in alerts[:10]:  # Limit alerts
+        text = alert.strip()
+        if len(text) > 30:
+            health_articles.append({
+                'title': 'NPHIL Health Alert',
+                'content': text,
+                'category': 'health-alert',
+                'source': 'NPHIL'
+            })
+
+    return health_articles
+
+nphil_feed = NphilFeed(app.config['NPHIL_URL'], parse_nphil_health_info,
+                       headers=NPHIL_HEADERS,
+                       ttl=app.config['NPHIL_FEED_TTL'],
+                       max_stale=app.config['NPHIL_FEED_MAX_STALE'],
+                       observe=nphil_scrape_time.observe)
+nphil_feed.on_update(record_nphil_alerts)
 
-    except Exception as e:
-        print(f"Error scraping NPHIL website: {e}")
-        return []
+def scrape_nphil_health_info():
+    """Scrape health information from NPHIL website now, updating the feed cache"""
+    nphil_feed.refresh()
+    return list(nphil_feed.snapshot.articles)
+
+FACILITIES_JSON = os.path.join(app.root_path, 'health_facilities.json')
+PROFESSIONALS_JSON = os.path.join(app.root_path, 'health_professionals.json')
+
+@jobs.task('import_nphil_education', timeout=120, priority=job_queue.PRIORITY_LOW)
+def import_nphil_education_job(payload):
+    """Add the first NPHIL articles to the education library; safe to run again"""
+    if not scrape_nphil_health_info() and nphil_feed.last_error:
+        raise RuntimeError(nphil_feed.last_error)  # retried with backoff
+    items = list(nphil_feed.snapshot.articles)[:5]  # first 5 items, to avoid overwhelming the database
+    titles = {item['title'][:200] for item in items}
+    existing = {title for (title,) in db.session.query(HealthEducation.title).filter(HealthEducation.title.in_(titles))}
+    added = 0
+    for item in items:
+        title = item['title'][:200]  # Limit title length
+        if title in existing:
+            continue
+        existing.add(title)
+        db.session.add(HealthEducation(title=title, content=item['content'], category=item['category'],
+                                       language='English', content_type='article'))
+        added += 1
+    db.session.commit()
+    return {'added': added}
 
 def init_sample_data():
-    # Import and initialize comprehensive health data
-    try:
-        from init_health_data import initialize_health_professionals, initialize_health_facilities
-        initialize_health_professionals()
-        initialize_health_facilities()
-    except ImportError:
-        pass
+    # Load the bundled directory on first run
+    if HealthFacility.query.count() == 0 and os.path.exists(FACILITIES_JSON):
+        print(importer.import_facilities(db.engine, FACILITIES_JSON).summary())
+    if User.query.filter_by(user_type='professional').count() == 0 and os.path.exists(PROFESSIONALS_JSON):
+        print(importer.import_professionals(db.engine, PROFESSIONALS_JSON).summary())
+        reconcile_stats()  # the importer's raw upserts are not counted as they happen
 
     # Add sample health facilities (fallback if comprehensive data fails)
     if HealthFacility.query.count() == 0:
@@ -548,28 +1757,156 @@ def init_sample_data():
                           category='mental', language='English')
         ]
 
-        # Add NPHIL health information
-        try:
-            nphil_data = scrape_nphil_health_info()
-            for item in nphil_data[:5]:  # Add first 5 items to avoid overwhelming the database
-                article = HealthEducation(
-                    title=item['title'][:200],  # Limit title length
-                    content=item['content'],
-                    category=item['category'],
-                    language='English',
-                    content_type='article'
-                )
-                articles.append(article)
-        except Exception as e:
-            print(f"Error adding NPHIL data: {e}")
-
         for article in articles:
             db.session.add(article)
 
+        # NPHIL health information is scraped in the background rather than holding up startup
+        jobs.enqueue(db.session.connection(), 'import_nphil_education', unique_key='import_nphil_education')
+
     db.session.commit()
 
+def init_db():
+    """Create missing tables and apply pending migrations"""
+    db.create_all()
+    run_migrations(db.engine)
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations"""
+    init_db()
+    print('Database is up to date.')
+
+@app.cli.command('import-directory')
+@click.option('--facilities', 'facilities_path', default=FACILITIES_JSON, show_default=True,
+              help='JSON array of facilities (name, type, county, district, contact, gps, services).')
+@click.option('--professionals', 'professionals_path', default=PROFESSIONALS_JSON, show_default=True,
+              help='JSON array of professionals (name, specialization, county, phone, email, license).')
+@click.option('--batch-size', default=importer.DEFAULT_BATCH_SIZE, show_default=True,
+              help='Rows per upsert transaction.')
+def import_directory_command(facilities_path, professionals_path, batch_size):
+    """Stream-import facilities and professionals, upserting by facility name and county and by license"""
+    init_db()
+
+    def progress(stats):
+        if stats.read % (batch_size * 100) < batch_size:
+            print(f"  {stats.label}: {stats.read} rows ({stats.rows_per_second:,.0f} rows/s)")
+
+    for path, load in ((facilities_path, importer.import_facilities),
+                       (professionals_path, importer.import_professionals)):
+        if path:
+            print(load(db.engine, path, batch_size=batch_size, progress=progress).summary())
+    # Raw upserts bypass the model events that normally trigger bundle rebuilds and count users
+    for county in LIBERIAN_COUNTIES:
+        build_county_bundle(county)
+    reconcile_stats()
+
+@app.cli.command('build-bundles')
+def build_bundles_command():
+    """Rebuild the offline bundle of every county now"""
+    init_db()
+    for county in LIBERIAN_COUNTIES:
+        print(f'{county}: {build_county_bundle(county)}')
+
+@app.cli.command('reconcile-stats')
+def reconcile_stats_command():
+    """Recount the admin statistics from the source tables and correct drift"""
+    init_db()
+    drift = reconcile_stats()
+    for metric, dim1, dim2, stored, actual in drift:
+        print(f"{metric} [{dim1}{'/' + dim2 if dim2 else ''}]: {stored} -> {actual}")
+    print(f"{len(drift)} counters corrected.")
+
+@app.cli.command('compact-changes')
+def compact_changes_command():
+    """Drop change-feed and appointment-log entries superseded by later changes to the same row"""
+    init_db()
+    with db.engine.begin() as connection:
+        removed = sum(change_feed.compact_change_log(connection, log)
+                      for log in (change_feed.CHANGE_LOG, change_feed.APPOINTMENT_LOG))
+    print(f'Removed {removed} superseded change-feed entries.')
+
+@app.cli.command('worker')
+@click.option('--threads', default=4, show_default=True, help='Job threads per process.')
+@click.option('--processes', default=1, show_default=True, help='Worker processes to fork.')
+@click.option('--poll-interval', default=1.0, show_default=True, help='Seconds between checks when idle.')
+def worker_command(threads, processes, poll_interval):
+    """Run background jobs until interrupted"""
+    init_db()
+
+    def make_worker():
+        return job_queue.Worker(jobs, threads=threads, poll_interval=poll_interval, context=app.app_context,
+                                retention=app.config['JOB_RETENTION'])
+
+    print(f'Running jobs with {processes} process(es) x {threads} thread(s); Ctrl+C to stop.')
+    job_queue.run_processes(make_worker, processes)
+
+@app.cli.command('prune-outbreak-signals')
+def prune_outbreak_signals_command():
+    """Delete logged outbreak signals older than the weekly retention"""
+    init_db()
+    before = datetime.utcnow().date() - timedelta(weeks=app.config['OUTBREAK_WEEKLY_WEEKS'])
+    with db.engine.begin() as connection:
+        removed = outbreak_surveillance.prune_signals(connection, before)
+    print(f'Removed {removed} outbreak signals from before {before.isoformat()}.')
+
+# Filtered variants of the list routes, on top of every argument-free GET route
+QUERY_PLAN_PROBES = [
+    '/professionals?county=Bong',
+    '/professionals?county=Bong&specialty=pediatrics&name=sarah',
+    '/api/professionals?profession=nurse',
+    '/facilities?county=Montserrado',
+    '/facilities?county=Montserrado&facility_type=hospital',
+    '/facilities?facility_type=clinic',
+    '/facilities?service=maternity&name=hospital',
+    '/api/facilities?county=Bong&service=surgery',
+    '/api/facilities/nearby?lat=6.3&lon=-10.8&k=3',
+    '/education?category=malaria',
+    '/api/education?language=English',
+]
+# Routes that change state or leave the app when requested
+QUERY_PLAN_SKIP = {'/logout', '/api/fetch_nphil_data', '/nphil_health_info'}
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any route query makes SQLite scan a whole table"""
+    init_db()
+    # Loading the in-memory indexes reads whole tables once by design
+    warm_indexes()
+    urls = sorted(rule.rule for rule in app.url_map.iter_rules()
+                  if 'GET' in rule.methods and not rule.arguments and rule.rule not in QUERY_PLAN_SKIP)
+    urls += QUERY_PLAN_PROBES
+    patient = User.query.filter_by(user_type='patient').first()
+    tables = set(db.metadata.tables) | {change_feed.CHANGE_LOG, change_feed.APPOINTMENT_LOG, stats.STAT_TABLE,
+                                        job_queue.JOB_TABLE}
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user_id'] = patient.id if patient else 1
+        sess['user_type'] = 'patient'
+
+    failures = []
+    for url in urls:
+        pending = [url]
+        while pending:
+            current = pending.pop()
+            with query_plans.capture_statements(*engines.values()) as statements:
+                response = client.get(current)
+            # Follow one page down the JSON listings so seek predicates are checked too
+            data = response.get_json(silent=True) if response.is_json else None
+            if current == url and isinstance(data, dict) and data.get('next_cursor'):
+                pending.append(f"{url}{'&' if '?' in url else '?'}cursor={data['next_cursor']}")
+            for statement, plan, scanned in query_plans.check_statements(read_engine(), statements, tables):
+                failures.append((current, statement, plan, scanned))
+
+    for url, statement, plan, scanned in failures:
+        print(f"FULL SCAN of {', '.join(scanned)} in {url}:\n  {statement}\n  " + '\n  '.join(plan))
+    if failures:
+        raise SystemExit(1)
+    print(f"Checked {len(urls)} routes: no full table scans.")
+
 if __name__ == '__main__':
     with app.app_context():
-        db.create_all()
+        init_db()
         init_sample_data()
+    job_worker.start()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
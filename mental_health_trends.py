@@ -0,0 +1,456 @@
+"""
+Mental-health trend analytics for CareNet Liberia
+Assessments are folded into additive statistics held in NumPy arrays: mood
+and anxiety sums per county and week, depression indicator counts per county,
+week and indicator, and each user's latest assessments. The cache is built
+once in large vectorized batches and afterwards only reads the assessments
+added since, so a new assessment never recomputes history
+"""
+
+import json
+import threading
+import warnings
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+INDICATOR_MAX_LENGTH = 50
+MISSING_TIME = np.iinfo(np.int64).min
+EPOCH = date(1970, 1, 1)
+BATCH_SIZE = 200000
+
+# Column order of NEW_ASSESSMENTS rows; times are Unix seconds, -1 when unknown.
+# Counties are looked up once per distinct user rather than joined to every row
+NEW_ASSESSMENTS = """
+    SELECT id, user_id, COALESCE(CAST(strftime('%s', assessment_date) AS INTEGER), -1), mood_score, anxiety_level
+    FROM mental_health_assessment WHERE id > ? ORDER BY id
+"""
+USER_COUNTIES = """SELECT id, COALESCE(county, '') FROM "user" WHERE id IN ({})"""
+USER_LOOKUP_CHUNK = 500
+# One row per indicator with the ids of its assessments, comma separated, far
+# cheaper to fetch than a row per (assessment, indicator) pair
+NEW_INDICATORS = """
+    SELECT indicator, group_concat(assessment_id) FROM assessment_indicator
+    WHERE assessment_id > ? AND assessment_id <= ? GROUP BY indicator
+"""
+
+
+def normalize_indicators(values):
+    """Distinct, lower-cased indicator names from a depression_indicators list"""
+    if not isinstance(values, list):
+        return []
+    names = []
+    for value in values:
+        if isinstance(value, str):
+            name = value.strip().lower()[:INDICATOR_MAX_LENGTH]
+            if name and name not in names:
+                names.append(name)
+    return names
+
+
+def indicator_rows(assessment_id, depression_indicators):
+    """assessment_indicator rows for an assessment's stored JSON depression_indicators"""
+    try:
+        values = json.loads(depression_indicators) if depression_indicators else []
+    except ValueError:
+        return []
+    return [{'assessment_id': assessment_id, 'indicator': name} for name in normalize_indicators(values)]
+
+
+def scores(values):
+    """1-10 scores as float64; NULLs and anything else stored before scores were validated are NaN"""
+    try:
+        result = np.array(values, np.float64)
+    except (TypeError, ValueError):
+        result = np.array([_number(value) for value in values], np.float64)
+    result[~((result >= 1) & (result <= 10))] = np.nan
+    return result
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def _user_counties(connection, user_ids):
+    """{user id: county name} for user_ids, in chunks that stay under SQLite's variable limit"""
+    counties = {}
+    for start in range(0, len(user_ids), USER_LOOKUP_CHUNK):
+        chunk = user_ids[start:start + USER_LOOKUP_CHUNK]
+        counties.update(connection.exec_driver_sql(
+            USER_COUNTIES.format(', '.join('?' * len(chunk))), tuple(chunk)).fetchall())
+    return counties
+
+
+def week_of(days):
+    """Monday-based week number of days since 1970-01-01 (a Thursday)"""
+    return (days + 3) // 7
+
+
+def week_start(week):
+    return EPOCH + timedelta(days=int(week) * 7 - 3)
+
+
+def rolling_mean(values, window):
+    """Mean of the last window values at every position, skipping NaN; NaN where there are none"""
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    sums = np.concatenate(([0.0], np.cumsum(np.where(valid, values, 0.0))))
+    counts = np.concatenate(([0], np.cumsum(valid)))
+    end = np.arange(1, len(values) + 1)
+    start = np.maximum(end - window, 0)
+    n = counts[end] - counts[start]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(n > 0, (sums[end] - sums[start]) / n, np.nan)
+
+
+def deterioration(mood, anxiety, window, threshold):
+    """Flag rows of right-aligned (users x 2*window) score matrices that got worse.
+
+    A user deteriorates when the mean mood of their latest window of
+    assessments fell, or the mean anxiety rose, by at least threshold points
+    against the window before it. Returns (flags, recent mood, recent anxiety).
+    """
+    with warnings.catch_warnings():
+        # Users without enough history have empty halves; their means are NaN and never flag
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        before_mood, recent_mood = np.nanmean(mood[:, :window], axis=1), np.nanmean(mood[:, window:], axis=1)
+        before_anxiety = np.nanmean(anxiety[:, :window], axis=1)
+        recent_anxiety = np.nanmean(anxiety[:, window:], axis=1)
+        flags = (before_mood - recent_mood >= threshold) | (recent_anxiety - before_anxiety >= threshold)
+    return flags, recent_mood, recent_anxiety
+
+
+def _mean(sums, counts):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def _rolling_sum(values, window, axis=-1):
+    """Sum of the last window entries along axis at every position"""
+    cumulative = np.cumsum(values, axis=axis)
+    shifted = np.zeros_like(cumulative)
+    if cumulative.shape[axis] > window:
+        source = [slice(None)] * cumulative.ndim
+        target = [slice(None)] * cumulative.ndim
+        source[axis], target[axis] = slice(None, -window), slice(window, None)
+        shifted[tuple(target)] = cumulative[tuple(source)]
+    return cumulative - shifted
+
+
+def _float(value):
+    return None if value is None or np.isnan(value) else round(float(value), 2)
+
+
+class TrendCache:
+    """Incrementally maintained assessment statistics.
+
+    Per-county figures attribute each assessment to the county its user had
+    when the assessment was first read. The cache is per process; refresh()
+    picks up assessments committed by any process since the last call.
+    """
+
+    def __init__(self, window=5, threshold=2.0):
+        self.window = window
+        self.threshold = threshold
+        self.loaded = False
+        self.last_id = 0
+        self.counties = {}  # county name -> row of the county arrays
+        self.indicators = {}  # indicator name -> column of indicator_count
+        self.week0 = None  # week number of column 0
+        # (counties x weeks) sums, and (counties x weeks x indicators) counts
+        self.week_count = np.zeros((0, 0), np.int64)
+        self.mood_sum = np.zeros((0, 0))
+        self.mood_count = np.zeros((0, 0), np.int64)
+        self.anxiety_sum = np.zeros((0, 0))
+        self.anxiety_count = np.zeros((0, 0), np.int64)
+        self.indicator_count = np.zeros((0, 0, 0), np.int64)
+        # Per user: county row, number of assessments and the latest 2 * window
+        # of them, right aligned and oldest first
+        self.user_count = 0
+        self.user_ids = np.zeros(0, np.int64)  # user id of each row
+        self._sorted_ids = np.zeros(0, np.int64)  # user ids ascending, and their rows
+        self._sorted_rows = np.zeros(0, np.int64)
+        self.user_county = np.zeros(0, np.int32)
+        self.user_total = np.zeros(0, np.int64)
+        self.recent_time = np.full((0, 2 * window), MISSING_TIME, np.int64)
+        self.recent_mood = np.full((0, 2 * window), np.nan)
+        self.recent_anxiety = np.full((0, 2 * window), np.nan)
+        self._flags = None
+        self._lock = threading.Lock()
+
+    # Loading
+
+    def refresh(self, connection, batch_size=BATCH_SIZE):
+        """Fold in every assessment with an id above the last one seen; returns how many"""
+        with self._lock:
+            added = 0
+            # Straight from the DBAPI cursor: Row objects would cost more than the arithmetic
+            cursor = connection.connection.cursor()
+            try:
+                cursor.execute(NEW_ASSESSMENTS, (self.last_id,))
+                counties = {}  # users looked up during this refresh
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    ids, user_ids, times, moods, anxieties = zip(*rows)
+                    user_ids = np.array(user_ids, np.int64)
+                    unseen = np.setdiff1d(user_ids, np.fromiter(counties, np.int64, len(counties)))
+                    counties.update(_user_counties(connection, unseen.tolist()))
+                    indicators = [(name, np.array(assessment_ids.split(','), np.int64)) for name, assessment_ids
+                                  in connection.exec_driver_sql(NEW_INDICATORS, (self.last_id, ids[-1]))]
+                    self.add(np.array(ids, np.int64), user_ids, counties, np.array(times, np.int64),
+                             scores(moods), scores(anxieties), indicators)
+                    added += len(rows)
+            finally:
+                cursor.close()
+            self.loaded = True
+            return added
+
+    def add(self, ids, user_ids, counties, times, moods, anxieties, indicators=()):
+        """Fold one batch of assessments (ids ascending) into the statistics.
+
+        counties maps user ids to their county name and indicators lists
+        (indicator, array of assessment ids) for the same assessments.
+        """
+        if len(ids) == 0:
+            return
+        self.last_id = max(self.last_id, int(ids[-1]))
+        self._flags = None
+        # Counties are resolved once per distinct user, not per row
+        unique_users, inverse = np.unique(user_ids, return_inverse=True)
+        county_rows = np.array([self._county_row(counties.get(user, '')) for user in unique_users.tolist()],
+                               np.int32)
+        slots = self._user_rows(unique_users, county_rows)[inverse]
+
+        known = times >= 0
+        if not known.any():
+            return
+        county = self.user_county[slots]
+        weeks = week_of(times // 86400)
+        self._cover_weeks(int(weeks[known].min()), int(weeks[known].max()))
+        column = weeks - self.week0
+        self._add_weeks(county[known], column[known], moods[known], anxieties[known])
+        self._add_indicators(ids, known, county, column, indicators)
+        self._merge_recent(slots[known], times[known], moods[known], anxieties[known])
+
+    def user_row(self, user_id):
+        """Row of user_id in the user arrays, or None before their first assessment"""
+        position = np.searchsorted(self._sorted_ids, user_id)
+        if position < len(self._sorted_ids) and self._sorted_ids[position] == user_id:
+            return int(self._sorted_rows[position])
+        return None
+
+    def _user_rows(self, user_ids, county_rows):
+        """Rows of the ascending distinct user_ids, adding new users; records their current county"""
+        positions = np.minimum(np.searchsorted(self._sorted_ids, user_ids), max(len(self._sorted_ids) - 1, 0))
+        known = np.zeros(len(user_ids), bool)
+        if len(self._sorted_ids):
+            known = self._sorted_ids[positions] == user_ids
+        rows = np.empty(len(user_ids), np.int64)
+        rows[known] = self._sorted_rows[positions[known]]
+        added = int((~known).sum())
+        if added:
+            start, self.user_count = self.user_count, self.user_count + added
+            if self.user_count > len(self.user_ids):
+                self._grow_users(max(1024, self.user_count, 2 * len(self.user_ids)))
+            rows[~known] = np.arange(start, self.user_count)
+            self.user_ids[start:self.user_count] = user_ids[~known]
+            order = np.argsort(self.user_ids[:self.user_count], kind='stable')
+            self._sorted_ids, self._sorted_rows = self.user_ids[order], order
+        self.user_county[rows] = county_rows
+        return rows
+
+    def _grow_users(self, capacity):
+        extra = capacity - len(self.user_ids)
+        width = 2 * self.window
+        self.user_ids = np.concatenate((self.user_ids, np.zeros(extra, np.int64)))
+        self.user_county = np.concatenate((self.user_county, np.zeros(extra, np.int32)))
+        self.user_total = np.concatenate((self.user_total, np.zeros(extra, np.int64)))
+        self.recent_time = np.concatenate((self.recent_time, np.full((extra, width), MISSING_TIME, np.int64)))
+        self.recent_mood = np.concatenate((self.recent_mood, np.full((extra, width), np.nan)))
+        self.recent_anxiety = np.concatenate((self.recent_anxiety, np.full((extra, width), np.nan)))
+
+    def _county_row(self, county):
+        row = self.counties.get(county)
+        if row is None:
+            row = self.counties[county] = len(self.counties)
+            pad = ((0, 1), (0, 0))
+            for name in ('week_count', 'mood_sum', 'mood_count', 'anxiety_sum', 'anxiety_count'):
+                setattr(self, name, np.pad(getattr(self, name), pad))
+            self.indicator_count = np.pad(self.indicator_count, ((0, 1), (0, 0), (0, 0)))
+        return row
+
+    def _indicator_column(self, name):
+        column = self.indicators.get(name)
+        if column is None:
+            column = self.indicators[name] = len(self.indicators)
+            self.indicator_count = np.pad(self.indicator_count, ((0, 0), (0, 0), (0, 1)))
+        return column
+
+    def _cover_weeks(self, first, last):
+        """Widen the week axis so it spans weeks first..last"""
+        if self.week0 is None:
+            self.week0 = first
+        width = self.week_count.shape[1]
+        before = max(self.week0 - first, 0)
+        after = max(last - (self.week0 + width - 1), 0) if width else last - first + 1 - before
+        if before or after:
+            for name in ('week_count', 'mood_sum', 'mood_count', 'anxiety_sum', 'anxiety_count'):
+                setattr(self, name, np.pad(getattr(self, name), ((0, 0), (before, after))))
+            self.indicator_count = np.pad(self.indicator_count, ((0, 0), (before, after), (0, 0)))
+            self.week0 -= before
+
+    def _add_weeks(self, county, column, moods, anxieties):
+        shape = self.week_count.shape
+        flat = county * shape[1] + column
+        size = shape[0] * shape[1]
+
+        def count(weights=None):
+            return np.bincount(flat, weights=weights, minlength=size).reshape(shape)
+
+        mood_known, anxiety_known = ~np.isnan(moods), ~np.isnan(anxieties)
+        self.week_count += count().astype(np.int64)
+        self.mood_sum += count(np.where(mood_known, moods, 0.0))
+        self.mood_count += count(mood_known.astype(np.float64)).astype(np.int64)
+        self.anxiety_sum += count(np.where(anxiety_known, anxieties, 0.0))
+        self.anxiety_count += count(anxiety_known.astype(np.float64)).astype(np.int64)
+
+    def _add_indicators(self, ids, known, county, column, indicators):
+        codes = [self._indicator_column(name) for name, _ in indicators]
+        shape = self.indicator_count.shape
+        cells = []
+        for code, (_, assessment_ids) in zip(codes, indicators):
+            rows = np.minimum(np.searchsorted(ids, assessment_ids), len(ids) - 1)
+            rows = rows[(ids[rows] == assessment_ids) & known[rows]]
+            cells.append((county[rows] * shape[1] + column[rows]) * shape[2] + code)
+        if cells:
+            flat = np.concatenate(cells)
+            self.indicator_count += np.bincount(flat, minlength=shape[0] * shape[1] * shape[2]).reshape(shape)
+
+    def _merge_recent(self, slots, times, moods, anxieties):
+        """Merge new assessments into each touched user's latest-2*window matrix row"""
+        width = 2 * self.window
+        touched, owner_new = np.unique(slots, return_inverse=True)
+        self.user_total[touched] += np.bincount(owner_new, minlength=len(touched))
+
+        old_time = self.recent_time[touched].ravel()
+        keep = old_time != MISSING_TIME
+        owner = np.concatenate((np.repeat(np.arange(len(touched)), width)[keep], owner_new))
+        time = np.concatenate((old_time[keep], times))
+        mood = np.concatenate((self.recent_mood[touched].ravel()[keep], moods))
+        anxiety = np.concatenate((self.recent_anxiety[touched].ravel()[keep], anxieties))
+        # One int64 sort key: owner, then time (Unix seconds fit 32 bits), then
+        # existing entries before new ones recorded at the same second
+        source = np.concatenate((np.zeros(keep.sum(), np.int64), np.ones(len(times), np.int64)))
+        order = np.argsort((owner.astype(np.int64) << 33) | (time << 1) | source, kind='stable')
+        owner, time, mood, anxiety = owner[order], time[order], mood[order], anxiety[order]
+        ends = np.searchsorted(owner, np.arange(len(touched)), side='right')
+        from_end = ends[owner] - np.arange(len(owner))
+        latest = from_end <= width
+        rows, columns = owner[latest], width - from_end[latest]
+
+        new_time = np.full((len(touched), width), MISSING_TIME, np.int64)
+        new_mood = np.full((len(touched), width), np.nan)
+        new_anxiety = np.full((len(touched), width), np.nan)
+        new_time[rows, columns] = time[latest]
+        new_mood[rows, columns] = mood[latest]
+        new_anxiety[rows, columns] = anxiety[latest]
+        self.recent_time[touched] = new_time
+        self.recent_mood[touched] = new_mood
+        self.recent_anxiety[touched] = new_anxiety
+
+    # Reading
+
+    def user_flags(self):
+        """(flags, recent mood, recent anxiety) for every user slot, cached until the next batch"""
+        if self._flags is None:
+            count = self.user_count
+            self._flags = deterioration(self.recent_mood[:count], self.recent_anxiety[:count],
+                                        self.window, self.threshold)
+        return self._flags
+
+    def county_trends(self, county=None, weeks=12, today=None, rolling=4):
+        """Weekly means, rolling means and indicator frequencies for one county (None for all)"""
+        today = today or datetime.utcnow().date()
+        last_week = week_of((today - EPOCH).days)
+        first_week = last_week - weeks + 1
+        if county is None:
+            rows = slice(None)
+        else:
+            rows = [self.counties[county]] if county in self.counties else []
+
+        # Read rolling - 1 extra weeks so the first rolling mean covers a full window
+        span = np.arange(first_week - rolling + 1, last_week + 1)
+        width = self.week_count.shape[1]
+        columns = span - (self.week0 if self.week0 is not None else 0)
+        inside = (columns >= 0) & (columns < width)
+
+        def weekly(array):
+            values = np.zeros(len(span), array.dtype)
+            if width and rows != [] and inside.any():
+                values[inside] = array[rows][:, columns[inside]].sum(axis=0)
+            return values
+
+        count, mood_sum, mood_count = weekly(self.week_count), weekly(self.mood_sum), weekly(self.mood_count)
+        anxiety_sum, anxiety_count = weekly(self.anxiety_sum), weekly(self.anxiety_count)
+        mood, anxiety = _mean(mood_sum, mood_count), _mean(anxiety_sum, anxiety_count)
+        mood_rolling = _mean(_rolling_sum(mood_sum, rolling), _rolling_sum(mood_count, rolling))
+        anxiety_rolling = _mean(_rolling_sum(anxiety_sum, rolling), _rolling_sum(anxiety_count, rolling))
+        shown = slice(rolling - 1, None)
+
+        indicator_totals = np.zeros(len(self.indicators), np.int64)
+        window_columns = columns[rolling - 1:][inside[rolling - 1:]]
+        if width and rows != [] and len(window_columns):
+            indicator_totals = self.indicator_count[rows][:, window_columns, :].sum(axis=(0, 1))
+        assessments = int(count[shown].sum())
+        names = list(self.indicators)
+        frequency = sorted(((names[i], int(n)) for i, n in enumerate(indicator_totals) if n),
+                           key=lambda item: (-item[1], item[0]))
+
+        flags, _, _ = self.user_flags()
+        user_county = self.user_county[:self.user_count]
+        members = np.ones(len(user_county), bool) if county is None else \
+            user_county == self.counties.get(county, -1)
+        return {
+            'county': county,
+            'weeks': [{
+                'week': week_start(week).isoformat(),
+                'assessments': int(n),
+                'mood': _float(m), 'anxiety': _float(a),
+                'mood_rolling': _float(mr), 'anxiety_rolling': _float(ar),
+            } for week, n, m, a, mr, ar in zip(span[shown], count[shown], mood[shown], anxiety[shown],
+                                               mood_rolling[shown], anxiety_rolling[shown])],
+            'indicators': [{'indicator': name, 'count': n, 'share': round(n / assessments, 4) if assessments else 0}
+                           for name, n in frequency],
+            'users': int(members.sum()),
+            'deteriorating_users': int((flags & members).sum()),
+        }
+
+
+def user_trend(rows, window, threshold):
+    """Rolling averages and the deterioration flag of one user's assessments.
+
+    rows are (assessment_date, mood_score, anxiety_level) ordered by date.
+    """
+    mood = scores([row[1] for row in rows])
+    anxiety = scores([row[2] for row in rows])
+    mood_avg, anxiety_avg = rolling_mean(mood, window), rolling_mean(anxiety, window)
+    width = 2 * window
+    recent_mood = np.full((1, width), np.nan)
+    recent_anxiety = np.full((1, width), np.nan)
+    if len(rows):
+        recent_mood[0, -min(width, len(rows)):] = mood[-width:]
+        recent_anxiety[0, -min(width, len(rows)):] = anxiety[-width:]
+    flags, _, _ = deterioration(recent_mood, recent_anxiety, window, threshold)
+    return {
+        'assessments': [{
+            'date': assessed.isoformat() if assessed else None,
+            'mood': _float(m), 'anxiety': _float(a),
+            'mood_rolling': _float(ma), 'anxiety_rolling': _float(aa),
+        } for (assessed, _, _), m, a, ma, aa in zip(rows, mood, anxiety, mood_avg, anxiety_avg)],
+        'deteriorating': bool(flags[0]),
+    }
@@ -0,0 +1,280 @@
+"""
+Request instrumentation for CareNet Liberia
+Records a latency histogram per route for every request and, on a sampled
+fraction of requests, the number and total time of their SQL statements,
+template rendering time, and statement shapes repeated often enough to look
+like N+1 queries. Everything is kept in process memory and rendered in the
+Prometheus text format; with several worker processes each one reports its
+own series, which Prometheus tells apart by scrape target
+"""
+
+import bisect
+import random
+import re
+import threading
+import time
+from collections import Counter as Tally
+
+from flask import g, has_app_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+SCRAPE_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Route label of requests that matched no URL rule, so 404 probes add no series
+UNMATCHED = '<unmatched>'
+
+# Expanded IN lists and inline numbers vary between calls of the same query
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_NUMBER_RE = re.compile(r'\b\d+\b')
+_SPACE_RE = re.compile(r'\s+')
+
+
+def statement_shape(statement):
+    """The statement with IN lists and numeric literals folded, for spotting repeats"""
+    shape = _IN_LIST_RE.sub('(?)', statement)
+    return _SPACE_RE.sub(' ', _NUMBER_RE.sub('?', shape)).strip()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _label_text(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonic count per combination of label values"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            yield self.name, _label_text(self.labels, label_values), value
+
+
+class Histogram:
+    """Bucketed observations per combination of label values"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self.labels = tuple(labels)
+        # label values -> [count per bucket..., count above the last bucket, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series else 0
+
+    def samples(self):
+        with self._lock:
+            snapshot = sorted((label_values, list(series)) for label_values, series in self._series.items())
+        for label_values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                yield (f'{self.name}_bucket', _label_text(self.labels, label_values, [('le', _format(bound))]),
+                       cumulative)
+            yield f'{self.name}_sum', _label_text(self.labels, label_values), series[-1]
+            yield f'{self.name}_count', _label_text(self.labels, label_values), cumulative
+
+
+class Registry:
+    """The metrics one /metrics endpoint exposes"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, labels=()):
+        return self.add(Histogram(name, help, buckets, labels))
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(f'{name}{labels} {_format(value)}' for name, labels, value in metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+class Trace:
+    """What one request has done so far; only sampled requests collect statements"""
+
+    __slots__ = ('started', 'sampled', 'statements', 'sql_time', 'template_started', 'status')
+
+    def __init__(self, sampled):
+        self.started = time.perf_counter()
+        self.sampled = sampled
+        self.statements = Tally()
+        self.sql_time = 0.0
+        self.template_started = None
+        self.status = None
+
+
+def current_trace():
+    """The sampled request trace of this thread's app context, if any"""
+    if not has_app_context():
+        return None
+    trace = g.get('metrics_trace')
+    return trace if trace is not None and trace.sampled else None
+
+
+class RequestMetrics:
+    """Per-request timings and SQL statistics for a Flask app.
+
+    Latency and status are recorded for every request, which costs two clock
+    reads and a lock. SQL counts and time, template time and N+1 detection
+    hook every statement, so they run on sample_rate of requests only. A
+    request that runs one SELECT shape n_plus_one times or more is counted as
+    an N+1 suspect and logged once per route and shape.
+    """
+
+    def __init__(self, sample_rate=0.1, n_plus_one=5, registry=None):
+        self.sample_rate = sample_rate
+        self.n_plus_one = n_plus_one
+        self.registry = registry or Registry()
+        self.app = None
+        self._reported = set()
+        self._reported_lock = threading.Lock()
+        registry = self.registry
+        self.requests = registry.counter('carenet_requests_total', 'Requests by route, method and status',
+                                         ('route', 'method', 'status'))
+        self.latency = registry.histogram('carenet_request_duration_seconds', 'Request latency by route',
+                                          LATENCY_BUCKETS, ('route', 'method'))
+        self.sql_statements = registry.histogram('carenet_request_sql_statements',
+                                                 'SQL statements per sampled request', STATEMENT_BUCKETS, ('route',))
+        self.sql_time = registry.histogram('carenet_request_sql_seconds', 'Database time per sampled request',
+                                           LATENCY_BUCKETS, ('route',))
+        self.template_time = registry.histogram('carenet_template_render_seconds',
+                                                'Template rendering time of sampled requests', LATENCY_BUCKETS,
+                                                ('template',))
+        self.n_plus_one_suspects = registry.counter('carenet_n_plus_one_suspects_total',
+                                                    'Sampled requests that repeated one SELECT shape '
+                                                    'n_plus_one times or more', ('route',))
+
+    def init_app(self, app, engines):
+        """Hook the app's request cycle, its templates and the given SQLAlchemy engines"""
+        self.app = app
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        before_render_template.connect(self._before_render, app, weak=False)
+        template_rendered.connect(self._rendered, app, weak=False)
+        for engine in engines:
+            event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    def _before_request(self):
+        g.metrics_trace = Trace(self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    def _after_request(self, response):
+        trace = g.get('metrics_trace')
+        if trace is not None:
+            trace.status = response.status_code
+        return response
+
+    def _teardown_request(self, exc):
+        trace = g.pop('metrics_trace', None)
+        if trace is None:
+            return
+        elapsed = time.perf_counter() - trace.started
+        route = request.url_rule.rule if request.url_rule is not None else UNMATCHED
+        status = trace.status if trace.status is not None else 500
+        self.requests.inc(route, request.method, str(status))
+        self.latency.observe(elapsed, route, request.method)
+        if trace.sampled:
+            self.sql_statements.observe(sum(trace.statements.values()), route)
+            self.sql_time.observe(trace.sql_time, route)
+            self._check_n_plus_one(route, trace.statements)
+
+    def _check_n_plus_one(self, route, statements):
+        shapes = Tally()
+        for statement, count in statements.items():
+            if statement.lstrip()[:6].upper() == 'SELECT':
+                shapes[statement_shape(statement)] += count
+        repeated = [(shape, count) for shape, count in shapes.items() if count >= self.n_plus_one]
+        if not repeated:
+            return
+        self.n_plus_one_suspects.inc(route)
+        for shape, count in repeated:
+            with self._reported_lock:
+                if (route, shape) in self._reported:
+                    continue
+                self._reported.add((route, shape))
+            self.app.logger.warning('Possible N+1 query on %s: %d x %s', route, count, shape[:300])
+
+    def _before_render(self, sender, template, context, **extra):
+        trace = current_trace()
+        if trace is not None:
+            trace.template_started = time.perf_counter()
+
+    def _rendered(self, sender, template, context, **extra):
+        trace = current_trace()
+        if trace is not None and trace.template_started is not None:
+            self.template_time.observe(time.perf_counter() - trace.template_started, template.name or '<string>')
+            trace.template_started = None
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if current_trace() is not None:
+            conn.info['metrics_started'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        trace = current_trace()
+        if trace is not None:
+            trace.statements[statement] += 1
+            trace.sql_time += elapsed
@@ -0,0 +1,234 @@
+"""
+Schema migrations for CareNet Liberia
+Each step runs once against an existing SQLite database, in order, and the
+applied version is recorded in PRAGMA user_version
+"""
+
+from availability import parse_availability
+from change_feed import create_appointment_log, create_change_log
+from job_queue import create_job_table
+from mental_health_trends import indicator_rows
+from outbreak_surveillance import DISTRESS_ANXIETY, DISTRESS_DISEASE, DISTRESS_MOOD, NATIONAL
+from search_index import create_search_tables
+from stats import create_stat_table, reconcile
+
+MIGRATIONS = []
+
+
+def migration(version):
+    """Register a migration step that receives an open connection"""
+    def register(fn):
+        MIGRATIONS.append((version, fn))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return fn
+    return register
+
+
+def current_version(connection):
+    return connection.exec_driver_sql('PRAGMA user_version').scalar()
+
+
+def add_column(connection, table, column, definition):
+    """ALTER TABLE ... ADD COLUMN unless create_all already made the column"""
+    existing = {row[1] for row in connection.exec_driver_sql(f'PRAGMA table_info("{table}")')}
+    if column not in existing:
+        connection.exec_driver_sql(f'ALTER TABLE "{table}" ADD COLUMN {column} {definition}')
+
+
+def run_migrations(engine):
+    """Apply pending migrations; returns the list of versions applied"""
+    if engine.dialect.name != 'sqlite':
+        return []
+    applied = []
+    with engine.connect() as connection:
+        version = current_version(connection)
+    for step_version, step in MIGRATIONS:
+        if step_version <= version:
+            continue
+        with engine.begin() as connection:
+            step(connection)
+            # PRAGMA does not accept bound parameters
+            connection.exec_driver_sql(f'PRAGMA user_version = {int(step_version)}')
+        applied.append(step_version)
+    return applied
+
+
+@migration(1)
+def create_search_index(connection):
+    """Full-text index over facilities and professionals, backfilled from existing rows"""
+    create_search_tables(connection)
+
+
+def add_facility_key(connection):
+    """Unique (name, county) key of facilities, keeping the newest row of any listed twice in a county"""
+    removed = connection.exec_driver_sql(
+        """DELETE FROM health_facility WHERE id NOT IN (
+            SELECT MAX(id) FROM health_facility GROUP BY name, county
+        )"""
+    ).rowcount
+    if removed:
+        print(f'Removed {removed} duplicate facilities sharing a name and county.')
+    connection.exec_driver_sql(
+        'CREATE UNIQUE INDEX IF NOT EXISTS uq_health_facility_name_county ON health_facility (name, county)'
+    )
+
+
+@migration(2)
+def add_directory_upsert_keys(connection):
+    """Unique keys used by the directory importer's upserts"""
+    # Names alone repeat across counties; see migration 11
+    add_facility_key(connection)
+    connection.exec_driver_sql(
+        """CREATE UNIQUE INDEX IF NOT EXISTS uq_user_license_info ON "user" (license_info)
+        WHERE license_info IS NOT NULL AND license_info != ''"""
+    )
+
+
+HOT_PATH_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS ix_user_directory ON "user" (user_type, is_approved, county, name)',
+    'CREATE INDEX IF NOT EXISTS ix_user_listing ON "user" (user_type, is_approved, name)',
+    'CREATE INDEX IF NOT EXISTS ix_appointment_patient ON appointment (patient_id, appointment_date)',
+    'CREATE INDEX IF NOT EXISTS ix_appointment_professional ON appointment (professional_id, appointment_date)',
+    'CREATE INDEX IF NOT EXISTS ix_assessment_user ON mental_health_assessment (user_id, assessment_date)',
+    'CREATE INDEX IF NOT EXISTS ix_health_facility_county_type ON health_facility (county, facility_type, name)',
+    'CREATE INDEX IF NOT EXISTS ix_health_facility_type ON health_facility (facility_type, name)',
+    'CREATE INDEX IF NOT EXISTS ix_health_education_listing ON health_education (language, category, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_health_education_language ON health_education (language, created_at)',
+    'CREATE INDEX IF NOT EXISTS ix_prescription_patient ON prescription (patient_id, prescribed_date)',
+]
+
+
+@migration(3)
+def add_hot_path_indexes(connection):
+    """Composite indexes behind the list routes' filters and orderings"""
+    for statement in HOT_PATH_INDEXES:
+        connection.exec_driver_sql(statement)
+
+
+@migration(4)
+def add_availability_schedule(connection):
+    """Structured availability parsed from professionals' free-text availability"""
+    add_column(connection, 'user', 'availability_schedule', 'TEXT')
+    rows = connection.exec_driver_sql(
+        """SELECT id, availability FROM "user" WHERE user_type = 'professional'
+        AND availability IS NOT NULL AND availability != '' AND availability_schedule IS NULL"""
+    ).fetchall()
+    for user_id, text in rows:
+        availability = parse_availability(text)
+        if availability:
+            connection.exec_driver_sql('UPDATE "user" SET availability_schedule = ? WHERE id = ?',
+                                       (availability.to_json(), user_id))
+
+
+@migration(5)
+def add_change_feed(connection):
+    """updated_at on the synced tables and the change_log feed with its triggers"""
+    for table in ('health_facility', 'user', 'health_education'):
+        add_column(connection, table, 'updated_at', 'DATETIME')
+    # Facilities never recorded a creation time; start them at the migration
+    connection.exec_driver_sql("UPDATE health_facility SET updated_at = datetime('now') WHERE updated_at IS NULL")
+    for table in ('user', 'health_education'):
+        connection.exec_driver_sql(
+            f"""UPDATE "{table}" SET updated_at = COALESCE(created_at, datetime('now')) WHERE updated_at IS NULL"""
+        )
+    # Created after the backfill so it is not logged as a change
+    create_change_log(connection)
+
+
+@migration(6)
+def add_stat_counters(connection):
+    """Incrementally maintained admin statistics, counted from the existing rows"""
+    create_stat_table(connection)
+    reconcile(connection)
+
+
+@migration(7)
+def add_assessment_indicators(connection):
+    """Depression indicators normalized out of the assessments' JSON lists"""
+    connection.exec_driver_sql(
+        """CREATE TABLE IF NOT EXISTS assessment_indicator (
+            assessment_id INTEGER NOT NULL REFERENCES mental_health_assessment (id),
+            indicator VARCHAR(50) NOT NULL,
+            PRIMARY KEY (assessment_id, indicator)
+        )"""
+    )
+    connection.exec_driver_sql(
+        'CREATE INDEX IF NOT EXISTS ix_assessment_indicator_indicator ON assessment_indicator (indicator, assessment_id)'
+    )
+    last_id = 0
+    while True:
+        batch = connection.exec_driver_sql(
+            """SELECT id, depression_indicators FROM mental_health_assessment
+            WHERE id > ? ORDER BY id LIMIT 10000""", (last_id,)
+        ).fetchall()
+        if not batch:
+            break
+        rows = [(row['assessment_id'], row['indicator']) for assessment_id, indicators in batch
+                for row in indicator_rows(assessment_id, indicators)]
+        if rows:
+            connection.exec_driver_sql(
+                'INSERT OR IGNORE INTO assessment_indicator (assessment_id, indicator) VALUES (?, ?)', rows)
+        last_id = batch[-1][0]
+
+
+@migration(8)
+def add_outbreak_signals(connection):
+    """Outbreak signal log, backfilled with the distressed assessments already taken"""
+    connection.exec_driver_sql(
+        """CREATE TABLE IF NOT EXISTS outbreak_signal (
+            id INTEGER NOT NULL PRIMARY KEY,
+            day DATE NOT NULL,
+            county VARCHAR(50) NOT NULL,
+            disease VARCHAR(50) NOT NULL,
+            source VARCHAR(20) NOT NULL,
+            count INTEGER NOT NULL,
+            fingerprint VARCHAR(32)
+        )"""
+    )
+    connection.exec_driver_sql(
+        """CREATE UNIQUE INDEX IF NOT EXISTS uq_outbreak_signal_fingerprint ON outbreak_signal (fingerprint)
+        WHERE fingerprint IS NOT NULL"""
+    )
+    connection.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_outbreak_signal_day ON outbreak_signal (day)')
+    connection.exec_driver_sql(
+        f"""INSERT INTO outbreak_signal (day, county, disease, source, count)
+        SELECT date(a.assessment_date), COALESCE(u.county, '{NATIONAL}'), '{DISTRESS_DISEASE}', 'assessment', COUNT(*)
+        FROM mental_health_assessment a LEFT JOIN "user" u ON u.id = a.user_id
+        WHERE a.assessment_date IS NOT NULL AND (a.mood_score <= {DISTRESS_MOOD} OR a.anxiety_level >= {DISTRESS_ANXIETY})
+          AND NOT EXISTS (SELECT 1 FROM outbreak_signal WHERE source = 'assessment')
+        GROUP BY 1, 2 ORDER BY 1"""
+    )
+
+
+@migration(9)
+def add_job_queue(connection):
+    """Durable background job table"""
+    create_job_table(connection)
+
+
+@migration(10)
+def add_appointment_log(connection):
+    """Appointment change log the booking indexes of every worker follow"""
+    create_appointment_log(connection)
+
+
+@migration(11)
+def key_facilities_by_county(connection):
+    """Replace the facility name key, which rejected same-named facilities in different counties"""
+    connection.exec_driver_sql('DROP INDEX IF EXISTS uq_health_facility_name')
+    add_facility_key(connection)
+
+
+@migration(12)
+def reparse_availability(connection):
+    """Re-parse stored schedules: overnight ranges and "24/7" were dropped and unstated hours guessed"""
+    rows = connection.exec_driver_sql(
+        """SELECT id, availability, availability_schedule FROM "user" WHERE user_type = 'professional'
+        AND availability IS NOT NULL AND availability != ''"""
+    ).fetchall()
+    for user_id, text, stored in rows:
+        availability = parse_availability(text)
+        schedule = availability.to_json() if availability else None
+        if schedule != stored:
+            connection.exec_driver_sql('UPDATE "user" SET availability_schedule = ? WHERE id = ?',
+                                       (schedule, user_id))
@@ -0,0 +1,148 @@
+"""
+Commit-time change notifications for CareNet Liberia models
+Captures plain row snapshots while the session flushes and hands them to
+subscribers only after the transaction commits, so in-memory indexes never
+see rows that were rolled back
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# op is 'insert', 'update' or 'delete'; row holds the new column values
+# (the last known values for deletes) and old the values before an update
+Change = namedtuple('Change', ['op', 'row', 'old'])
+
+_PENDING_KEY = 'carenet_pending_changes'
+_PREVIOUS_KEY = 'carenet_previous_values'
+
+
+def row_snapshot(mapper, connection, target):
+    """Column values of target as a plain dict, safe to call from flush events.
+
+    Loaded values are read straight from the instance state; anything expired
+    is fetched on the flush connection rather than through a lazy load, which
+    is not allowed mid-flush.
+    """
+    columns = [attr.key for attr in mapper.column_attrs]
+    primary_key = mapper.primary_key[0]
+    values = inspect(target).dict
+    row = {key: values[key] for key in columns if key in values}
+    missing = [key for key in columns if key not in row]
+    if missing:
+        result = connection.execute(
+            mapper.local_table.select().where(
+                primary_key == row.get(primary_key.key, getattr(target, primary_key.key)))
+        ).mappings().first()
+        for key in missing:
+            row[key] = result[mapper.get_property(key).columns[0].name] if result else None
+    return row
+
+
+def previous_values(mapper, connection, target, keys=None):
+    """Values that keys (default: every column) of target had before its pending update.
+
+    Only changed attributes are returned; unchanged ones equal the new row.
+    Attributes assigned while expired (e.g. after a commit) carry no history,
+    so their old values are read from the row, which the UPDATE has not
+    reached yet when this runs from before_update.
+    """
+    state = inspect(target)
+    previous, unknown = {}, []
+    for key in keys or [attr.key for attr in mapper.column_attrs]:
+        history = state.attrs[key].history
+        if history.deleted:
+            previous[key] = history.deleted[0]
+        elif history.added:
+            unknown.append(key)
+    if unknown and state.identity:
+        primary_key = mapper.primary_key[0]
+        result = connection.execute(
+            mapper.local_table.select().where(primary_key == state.identity[0])
+        ).mappings().first()
+        for key in unknown:
+            previous[key] = result[mapper.get_property(key).columns[0].name] if result else None
+    return previous
+
+
+class ModelEvents:
+    """Registry of per-model subscribers fed after each successful commit"""
+
+    def __init__(self):
+        self.subscribers = {}
+        self._session_hooks_installed = False
+
+    def subscribe(self, model, callback=None):
+        """Call callback(changes) with a list of Change tuples after each commit touching model.
+
+        Usable as a decorator: ``@model_events.subscribe(HealthFacility)``.
+        """
+        if callback is None:
+            return lambda fn: self.subscribe(model, fn)
+        if model not in self.subscribers:
+            self.subscribers[model] = []
+            self._install_mapper_hooks(model)
+        self._install_session_hooks()
+        self.subscribers[model].append(callback)
+        return callback
+
+    def notify(self, model, changes):
+        """Dispatch changes made outside the ORM (e.g. Core inserts) once they are committed"""
+        for callback in self.subscribers.get(model, ()):
+            try:
+                callback(list(changes))
+            except Exception as e:
+                print(f"Error in {model.__name__} change subscriber: {e}")
+
+    def _install_mapper_hooks(self, model):
+        mapper = inspect(model)
+
+        def snapshot(connection, target):
+            return row_snapshot(mapper, connection, target)
+
+        def record(target, change):
+            session = inspect(target).session
+            if session is not None:
+                session.info.setdefault(_PENDING_KEY, []).append((model, change))
+
+        @event.listens_for(model, 'after_insert')
+        def after_insert(mapper, connection, target):
+            record(target, Change('insert', snapshot(connection, target), None))
+
+        @event.listens_for(model, 'before_update')
+        def before_update(mapper, connection, target):
+            inspect(target).info[_PREVIOUS_KEY] = previous_values(mapper, connection, target)
+
+        @event.listens_for(model, 'after_update')
+        def after_update(mapper, connection, target):
+            row = snapshot(connection, target)
+            old = dict(row, **inspect(target).info.pop(_PREVIOUS_KEY, {}))
+            record(target, Change('update', row, old))
+
+        @event.listens_for(model, 'after_delete')
+        def after_delete(mapper, connection, target):
+            record(target, Change('delete', snapshot(connection, target), None))
+
+    def _install_session_hooks(self):
+        if self._session_hooks_installed:
+            return
+        self._session_hooks_installed = True
+
+        @event.listens_for(Session, 'after_commit')
+        def after_commit(session):
+            pending = session.info.pop(_PENDING_KEY, None)
+            if not pending:
+                return
+            grouped = {}
+            for model, change in pending:
+                grouped.setdefault(model, []).append(change)
+            for model, changes in grouped.items():
+                self.notify(model, changes)
+
+        @event.listens_for(Session, 'after_rollback')
+        def after_rollback(session):
+            session.info.pop(_PENDING_KEY, None)
+
+
+model_events = ModelEvents()
@@ -0,0 +1,175 @@
+"""
+Cached NPHIL health feed for CareNet Liberia
+Serves the last good scrape of nphil.gov.lr from memory and refreshes it in
+the background with conditional GETs, so page views never wait on the network
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+import requests
+
+# Immutable snapshot, swapped atomically so readers never need a lock
+Snapshot = namedtuple('Snapshot', ['articles', 'fetched_at', 'checked_at', 'etag', 'last_modified', 'version'])
+
+EMPTY_SNAPSHOT = Snapshot(articles=(), fetched_at=None, checked_at=None, etag=None, last_modified=None, version=0)
+
+
+class NphilFeed:
+    """Stale-while-revalidate cache around a scraped HTML page"""
+
+    def __init__(self, url, parse, headers=None, ttl=900, max_stale=86400,
+                 timeout=10, retry_backoff=60, http=None, observe=None):
+        self.url = url
+        self.parse = parse
+        self.headers = dict(headers or {})
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.timeout = timeout
+        self.retry_backoff = retry_backoff
+        self.http = http or requests.Session()
+        self.observe = observe  # called with the seconds each refresh took
+        self.snapshot = EMPTY_SNAPSHOT
+        self.last_error = None
+        self.last_error_at = None
+        self.listeners = []
+        self._refresh_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def get(self):
+        """Return the articles of the last good snapshot, waking the refresher when stale.
+
+        Once the source has not confirmed the snapshot for max_stale seconds
+        nothing is returned, rather than presenting old alerts as current.
+        """
+        snapshot = self.snapshot
+        self._ensure_started()
+        now = time.time()
+        if self._is_stale(snapshot, now):
+            self._wake.set()
+        if self._is_expired(snapshot, now):
+            return []
+        return list(snapshot.articles)
+
+    def status(self):
+        """Describe the cached snapshot for API consumers"""
+        snapshot = self.snapshot
+        now = time.time()
+        return {
+            'fetched_at': snapshot.fetched_at,
+            'checked_at': snapshot.checked_at,
+            'age': None if snapshot.checked_at is None else round(now - snapshot.checked_at, 3),
+            'stale': self._is_stale(snapshot, now),
+            'expired': self._is_expired(snapshot, now),
+            'version': snapshot.version,
+            'last_error': self.last_error,
+        }
+
+    def on_update(self, callback):
+        """Register callback(articles) to run whenever new content is fetched"""
+        self.listeners.append(callback)
+        return callback
+
+    def refresh(self):
+        """Fetch the page once, sending validators from the current snapshot.
+
+        Returns True when new content was stored. Failures keep the previous
+        snapshot and are recorded in ``last_error``.
+        """
+        started = time.perf_counter()
+        try:
+            return self._fetch()
+        finally:
+            if self.observe is not None:
+                self.observe(time.perf_counter() - started)
+
+    def _fetch(self):
+        with self._refresh_lock:
+            current = self.snapshot
+            headers = dict(self.headers)
+            if current.etag:
+                headers['If-None-Match'] = current.etag
+            if current.last_modified:
+                headers['If-Modified-Since'] = current.last_modified
+
+            try:
+                response = self.http.get(self.url, headers=headers, timeout=self.timeout)
+                now = time.time()
+                if response.status_code == 304 and current.fetched_at is not None:
+                    self.snapshot = current._replace(checked_at=now)
+                    self.last_error = self.last_error_at = None
+                    return False
+                response.raise_for_status()
+                articles = tuple(self.parse(response.content))
+            except Exception as e:
+                self.last_error = str(e)
+                self.last_error_at = time.time()
+                print(f"Error refreshing NPHIL feed: {e}")
+                return False
+
+            self.snapshot = Snapshot(
+                articles=articles,
+                fetched_at=now,
+                checked_at=now,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified'),
+                version=current.version + 1,
+            )
+            self.last_error = self.last_error_at = None
+
+        for callback in self.listeners:
+            try:
+                callback(list(articles))
+            except Exception as e:
+                print(f"Error in NPHIL feed listener: {e}")
+        return True
+
+    def start(self):
+        """Start the background refresher thread (idempotent)"""
+        self._ensure_started()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _is_stale(self, snapshot, now):
+        return snapshot.checked_at is None or now - snapshot.checked_at > self.ttl
+
+    def _is_expired(self, snapshot, now):
+        return snapshot.checked_at is None or now - snapshot.checked_at > self.max_stale
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='nphil-feed-refresher', daemon=True)
+            self._thread.start()
+
+    def _backing_off(self, now):
+        return self.last_error_at is not None and now - self.last_error_at < self.retry_backoff
+
+    def _next_delay(self, now):
+        if self._backing_off(now):
+            return self.last_error_at + self.retry_backoff - now
+        checked_at = self.snapshot.checked_at
+        if checked_at is None:
+            return 0
+        return max(checked_at + self.ttl - now, 0)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            now = time.time()
+            if self._is_stale(self.snapshot, now) and not self._backing_off(now):
+                self.refresh()
+            self._wake.wait(self._next_delay(time.time()))
+            self._wake.clear()
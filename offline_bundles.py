@@ -0,0 +1,181 @@
+"""
+Precompressed per-county offline bundles for CareNet Liberia
+Each county's facilities, approved professionals, education articles and
+translation tables are written as one JSON document, compressed once with
+gzip (and brotli when the module is installed) under a content-hash file
+name. The files never change once written, so they are served as plain
+static files with Range support and clients can resume interrupted downloads
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import brotli
+except ImportError:  # optional: pip install brotli
+    brotli = None
+
+# encoding -> file suffix; brotli bundles are only written when available
+ENCODINGS = {'br': '.json.br', 'gzip': '.json.gz'}
+FILE_RE = re.compile(r'^(?P<slug>[a-z0-9-]+)-(?P<version>[0-9a-f]{16})(?P<suffix>\.json\.(?:gz|br))$')
+
+
+def county_slug(county):
+    return re.sub(r'[^a-z0-9]+', '-', county.lower()).strip('-')
+
+
+def available_encodings():
+    return [encoding for encoding in ENCODINGS if encoding != 'br' or brotli is not None]
+
+
+def compress(data, encoding):
+    if encoding == 'gzip':
+        # mtime=0 keeps the output identical for identical input
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    return brotli.compress(data, quality=11)
+
+
+def _write_atomic(path, data):
+    handle, temporary = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+
+
+def write_bundle(directory, county, payload, keep=2):
+    """Serialize and compress one county's bundle; returns its version.
+
+    The version is a hash of the content, so rebuilding unchanged data
+    writes nothing. The newest ``keep`` versions stay on disk so a download
+    that started before a rebuild can still be resumed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    data = json.dumps(payload, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+    version = hashlib.sha256(data).hexdigest()[:16]
+    slug = county_slug(county)
+    for encoding in available_encodings():
+        path = os.path.join(directory, f'{slug}-{version}{ENCODINGS[encoding]}')
+        if os.path.exists(path):
+            os.utime(path)  # mark as the newest version again
+        else:
+            _write_atomic(path, compress(data, encoding))
+    _prune(directory, slug, keep)
+    return version
+
+
+def _versions(directory, slug=None):
+    """{slug: [(mtime, version, {encoding: (filename, size)})]} newest first"""
+    found = {}
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return {}
+    suffixes = {suffix: encoding for encoding, suffix in ENCODINGS.items()}
+    for entry in entries:
+        match = FILE_RE.match(entry.name)
+        if not match or (slug and match.group('slug') != slug):
+            continue
+        stat = entry.stat()
+        versions = found.setdefault(match.group('slug'), {})
+        mtime, files = versions.get(match.group('version'), (0, {}))
+        files[suffixes[match.group('suffix')]] = (entry.name, stat.st_size)
+        versions[match.group('version')] = (max(mtime, stat.st_mtime), files)
+    return {key: sorted(((mtime, version, files) for version, (mtime, files) in versions.items()), reverse=True)
+            for key, versions in found.items()}
+
+
+def _prune(directory, slug, keep):
+    for _, _, files in _versions(directory, slug).get(slug, [])[keep:]:
+        for filename, _ in files.values():
+            try:
+                os.remove(os.path.join(directory, filename))
+            except FileNotFoundError:
+                pass
+
+
+def manifest(directory, counties):
+    """Current bundle of every county: {county: {version, files: {encoding: {file, size}}}} or None"""
+    versions = _versions(directory)
+    result = {}
+    for county in counties:
+        latest = versions.get(county_slug(county))
+        if not latest:
+            result[county] = None
+            continue
+        mtime, version, files = latest[0]
+        result[county] = {
+            'version': version,
+            'built_at': mtime,
+            'files': {encoding: {'file': filename, 'size': size} for encoding, (filename, size) in files.items()},
+        }
+    return result
+
+
+class BundleRebuilder:
+    """Background thread rebuilding the bundles of counties whose data changed.
+
+    Changes are collected for ``delay`` seconds before building, so a burst of
+    edits (or an import) costs one rebuild per county.
+    """
+
+    def __init__(self, build, delay=2.0):
+        self.build = build  # build(county) writes that county's bundle
+        self.delay = delay
+        self.pending = set()
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def schedule(self, *counties):
+        with self._lock:
+            self.pending.update(county for county in counties if county)
+        self._ensure_started()
+        self._wake.set()
+
+    def run_pending(self):
+        """Build every scheduled county now, in the calling thread"""
+        with self._lock:
+            counties, self.pending = self.pending, set()
+        for county in sorted(counties):
+            try:
+                self.build(county)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"Error building offline bundle for {county}: {e}")
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped.clear()
+                    self._thread = threading.Thread(target=self._run, name='offline-bundles', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait()
+            self._wake.clear()
+            if self._stopped.is_set():
+                return
+            time.sleep(self.delay)
+            self.run_pending()
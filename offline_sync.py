@@ -0,0 +1,124 @@
+"""
+Batched offline sync for CareNet Liberia
+Field workers queue records while offline and upload them in one (usually
+gzip-compressed) batch. Every record carries a client-chosen idempotency key,
+so replaying a batch after a dropped connection returns the stored results
+instead of applying anything twice
+"""
+
+import json
+import zlib
+from datetime import datetime, timedelta, timezone
+
+RECORD_TYPES = ('assessment', 'appointment', 'profile')
+MAX_KEY_LENGTH = 64
+# Profile fields a user may change from the field app, with their coercions
+PROFILE_FIELDS = {
+    'name': str, 'age': int, 'county': str, 'contact': str, 'gender': str,
+    'medical_history': str, 'specialty': str, 'availability': str,
+}
+PROFESSIONAL_ONLY_FIELDS = ('specialty', 'availability')
+
+
+class SyncError(Exception):
+    """Raised when a batch as a whole cannot be read"""
+
+
+class RecordRejected(Exception):
+    """Raised when a single record is invalid; the rest of the batch still applies"""
+
+
+def read_batch(body, content_encoding=None, max_bytes=32 * 1024 * 1024, max_records=20000):
+    """Decode a sync request body into its list of records.
+
+    The body is JSON ``{"records": [{"key", "type", "data"}, ...]}``, gzip
+    compressed when Content-Encoding says so or the gzip magic is present.
+    Decompression stops at max_bytes so a small upload cannot expand without
+    limit.
+    """
+    if (content_encoding or '').lower() == 'gzip' or body[:2] == b'\x1f\x8b':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, max_bytes)
+        except zlib.error as e:
+            raise SyncError(f'Invalid gzip data: {e}')
+        if decompressor.unconsumed_tail:
+            raise SyncError('Batch is too large')
+    elif len(body) > max_bytes:
+        raise SyncError('Batch is too large')
+    try:
+        payload = json.loads(body)
+    except (UnicodeDecodeError, ValueError):
+        raise SyncError('Batch is not valid JSON')
+    records = payload.get('records') if isinstance(payload, dict) else None
+    if not isinstance(records, list):
+        raise SyncError('Batch must contain a list of records')
+    if len(records) > max_records:
+        raise SyncError(f'At most {max_records} records per batch')
+    return records
+
+
+def record_key(record):
+    """The record's idempotency key, or None when it is missing or malformed"""
+    key = record.get('key') if isinstance(record, dict) else None
+    if isinstance(key, str) and 0 < len(key) <= MAX_KEY_LENGTH:
+        return key
+    return None
+
+
+def _score(data, name):
+    value = data.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 1 <= value <= 10:
+        raise RecordRejected(f'{name} must be between 1 and 10')
+    return int(value)
+
+
+def _recorded_at(value, now):
+    """Client-side timestamp of an offline record, bounded to the past"""
+    if not value:
+        return now
+    try:
+        recorded = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise RecordRejected('Invalid assessment_date')
+    if recorded.tzinfo is not None:
+        recorded = recorded.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(recorded, now + timedelta(minutes=5))
+
+
+def assessment_values(data):
+    """Validated scores and indicators of a submitted assessment; raises RecordRejected"""
+    indicators = data.get('depression_indicators', [])
+    if not isinstance(indicators, list):
+        raise RecordRejected('depression_indicators must be a list')
+    return {
+        'mood_score': _score(data, 'mood_score'),
+        'anxiety_level': _score(data, 'anxiety_level'),
+        'depression_indicators': json.dumps(indicators),
+    }
+
+
+def assessment_row(user_id, data, now):
+    """Column values for a MentalHealthAssessment taken offline"""
+    return dict(assessment_values(data), user_id=user_id,
+                assessment_date=_recorded_at(data.get('assessment_date'), now))
+
+
+def profile_changes(data, user_type):
+    """Validated {field: value} profile edits for a user of user_type"""
+    changes = {}
+    for field, value in data.items():
+        coerce = PROFILE_FIELDS.get(field)
+        if coerce is None or (field in PROFESSIONAL_ONLY_FIELDS and user_type != 'professional'):
+            raise RecordRejected(f'{field} cannot be changed')
+        try:
+            changes[field] = None if value is None else coerce(value)
+        except (TypeError, ValueError):
+            raise RecordRejected(f'Invalid {field}')
+    if 'name' in changes and not (changes['name'] or '').strip():
+        raise RecordRejected('name cannot be empty')
+    if not changes:
+        raise RecordRejected('No profile fields to change')
+    return changes
@@ -0,0 +1,304 @@
+"""
+Outbreak surveillance for CareNet Liberia
+Signals - NPHIL alerts naming a disease, disease and symptom questions put to
+the chat assistant, and distressed mental-health assessments - are logged to
+outbreak_signal and folded into county x disease x day buckets. Each series
+carries an EWMA baseline and an upper CUSUM advanced one closed day at a time,
+so a new signal costs constant work. Days past the daily retention are
+downsampled into weekly buckets and weeks past the weekly retention dropped,
+which bounds memory however long the history
+"""
+
+import hashlib
+import math
+import threading
+from collections import deque
+from datetime import date, datetime
+
+from intent_matcher import IntentMatcher, normalize
+
+SIGNAL_SOURCES = ('nphil', 'chat', 'assessment')
+# Series of signals whose county is unknown (anonymous chat, alerts naming no county)
+NATIONAL = ''
+# Assessments at or past either score count as a mental-distress signal
+DISTRESS_DISEASE = 'mental-distress'
+DISTRESS_MOOD = 3
+DISTRESS_ANXIETY = 8
+# Intent categories of the chat catalog that describe an illness
+CHAT_CATEGORIES = ('disease', 'symptom')
+ALARMS_KEPT = 20  # recent alarms remembered per series
+
+# Diseases looked for in NPHIL alerts, with their synonyms
+OUTBREAK_DISEASES = {
+    'ebola': ['ebola', 'evd', 'ebola virus disease'],
+    'lassa fever': ['lassa', 'lassa fever'],
+    'cholera': ['cholera', 'acute watery diarrhoea', 'acute watery diarrhea'],
+    'measles': ['measles'],
+    'malaria': ['malaria'],
+    'yellow fever': ['yellow fever'],
+    'meningitis': ['meningitis', 'meningococcal'],
+    'mpox': ['mpox', 'monkeypox'],
+    'covid-19': ['covid', 'covid-19', 'coronavirus', 'sars-cov-2'],
+    'polio': ['polio', 'poliomyelitis'],
+    'dengue': ['dengue'],
+    'typhoid': ['typhoid'],
+}
+
+# Grouped so a read costs one row per (day, county, disease) whatever the number of signals
+NEW_SIGNALS = """
+    SELECT day, county, disease, SUM(count) FROM outbreak_signal
+    WHERE id > ? AND id <= ? GROUP BY day, county, disease ORDER BY day
+"""
+
+
+def _matcher(names):
+    """IntentMatcher finding whole-word occurrences of {name: [keywords]}"""
+    return IntentMatcher({'intents': [{'name': name, 'keywords': {'english': keywords}}
+                                      for name, keywords in names.items()]})
+
+
+class SignalExtractor:
+    """Finds the (county, disease) signals in scraped NPHIL alerts"""
+
+    def __init__(self, counties, diseases=None):
+        self.diseases = _matcher(diseases or OUTBREAK_DISEASES)
+        self.counties = _matcher({county: [county] for county in counties})
+
+    def alert_signals(self, articles):
+        """[(county, disease, fingerprint)] for the health alerts among scraped articles.
+
+        The fingerprint identifies the alert text, so an alert still on the
+        page after the next scrape is not counted again.
+        """
+        signals = []
+        for article in articles:
+            if article.get('category') != 'health-alert':
+                continue
+            text = normalize(f"{article.get('title', '')} {article.get('content', '')}")
+            diseases = [intent['name'] for intent, _, _ in self.diseases.match(text)]
+            counties = [intent['name'] for intent, _, _ in self.counties.match(text)] or [NATIONAL]
+            for disease in diseases:
+                for county in counties:
+                    fingerprint = hashlib.sha1(f'{county}\x1f{disease}\x1f{text}'.encode('utf-8')).hexdigest()[:32]
+                    signals.append((county, disease, fingerprint))
+        return signals
+
+
+def chat_diseases(matches):
+    """Names of the disease and symptom intents among IntentMatcher.match results"""
+    return [intent['name'] for intent, _, _ in matches if intent.get('category') in CHAT_CATEGORIES]
+
+
+def _score(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_distressed(mood_score, anxiety_level):
+    mood, anxiety = _score(mood_score), _score(anxiety_level)
+    return (mood is not None and mood <= DISTRESS_MOOD) or (anxiety is not None and anxiety >= DISTRESS_ANXIETY)
+
+
+def signal_rows(day, county, diseases, source, fingerprint=None):
+    """outbreak_signal rows counting one signal of each disease"""
+    return [{'day': day, 'county': county or NATIONAL, 'disease': disease, 'source': source, 'count': 1,
+             'fingerprint': fingerprint} for disease in diseases]
+
+
+def _week_start(day):
+    """Ordinal of the Monday starting the week of ordinal day (day 1 was a Monday)"""
+    return day - (day - 1) % 7
+
+
+class Series:
+    """Buckets and detector state of one county x disease series"""
+
+    __slots__ = ('daily', 'weekly', 'day', 'count', 'mean', 'variance', 'cusum', 'days', 'alarms')
+
+    def __init__(self):
+        self.daily = {}  # day ordinal -> count, within the daily retention
+        self.weekly = {}  # Monday ordinal -> count, downsampled from older days
+        self.day = None  # open day: its count is still growing and not yet in the baseline
+        self.count = 0
+        self.mean = 0.0  # EWMA of closed daily counts and their variance
+        self.variance = 0.0
+        self.cusum = 0.0
+        self.days = 0  # closed days folded into the baseline
+        self.alarms = deque(maxlen=ALARMS_KEPT)
+
+
+class OutbreakMonitor:
+    """Incrementally maintained outbreak buckets and anomaly detectors.
+
+    Daily counts are compared with an EWMA baseline (smoothing alpha): a day
+    alarms when it lies z standard deviations above it, or when the upper
+    CUSUM of standardized excesses (slack k) reaches h. No day alarms before
+    min_days of history. Like TrendCache the monitor is per process, and
+    refresh() folds in signals logged by any process since the last call.
+    """
+
+    def __init__(self, alpha=0.2, z=3.0, k=0.5, h=5.0, min_days=14, daily_days=90, weekly_weeks=104):
+        self.alpha = alpha
+        self.z = z
+        self.k = k
+        self.h = h
+        self.min_days = min_days
+        self.daily_days = daily_days
+        self.weekly_weeks = weekly_weeks
+        self.last_id = 0
+        self.series = {}  # (county, disease) -> Series
+        self._downsampled = None  # day ordinal of the last downsampling pass
+        self._lock = threading.RLock()
+
+    # Loading
+
+    def refresh(self, connection, today=None):
+        """Fold in the signals logged since the last call; returns the number of buckets read"""
+        with self._lock:
+            last_id = connection.exec_driver_sql('SELECT MAX(id) FROM outbreak_signal').scalar() or 0
+            rows = []
+            if last_id > self.last_id:
+                rows = connection.exec_driver_sql(NEW_SIGNALS, (self.last_id, last_id)).fetchall()
+                self.last_id = last_id
+            today = (today or datetime.utcnow().date()).toordinal()
+            for day, county, disease, count in rows:
+                self.add(county, disease, date.fromisoformat(str(day)[:10]).toordinal(), count, today)
+            self.advance(today)
+            return len(rows)
+
+    def add(self, county, disease, day, count, today):
+        """Count signals of ordinal day; days before a series' open day only fill its buckets"""
+        with self._lock:
+            day = min(day, today)  # clock skew must not open a future day
+            if day < today - self.weekly_weeks * 7:
+                return
+            series = self.series.get((county, disease))
+            if series is None:
+                series = self.series[(county, disease)] = Series()
+            if day >= today - self.daily_days:
+                series.daily[day] = series.daily.get(day, 0) + count
+            else:
+                week = _week_start(day)
+                series.weekly[week] = series.weekly.get(week, 0) + count
+
+            if series.day is None:
+                series.day = day
+            elif day > series.day:
+                self._close_days(series, day)
+            if day == series.day:
+                series.count += count
+
+    def advance(self, today):
+        """Close every series' days before today (quiet days count as zero) and downsample"""
+        with self._lock:
+            for series in self.series.values():
+                if series.day is not None and series.day < today:
+                    self._close_days(series, today)
+            if self._downsampled != today:
+                self._downsample(today)
+                self._downsampled = today
+
+    def _close_days(self, series, day):
+        """Fold the open day and the quiet days after it into the baseline; day becomes the open day"""
+        count = series.count
+        # After daily_days quiet days the baseline has decayed to noise; skip the rest
+        for closed in range(series.day, min(day, series.day + self.daily_days)):
+            self._close(series, closed, count)
+            count = 0
+        series.day, series.count = day, 0
+
+    def _close(self, series, day, count):
+        score, cusum = self._score(series, count)
+        series.cusum = cusum
+        if series.days >= self.min_days and (score >= self.z or cusum >= self.h):
+            series.alarms.append((day, count, score, cusum))
+            series.cusum = 0.0  # restart accumulating after an alarm
+        difference = count - series.mean
+        series.mean += self.alpha * difference
+        series.variance = (1 - self.alpha) * (series.variance + self.alpha * difference * difference)
+        series.days += 1
+
+    def _score(self, series, count):
+        """(standardized excess over the baseline, CUSUM including it) of a daily count"""
+        # Counts are near-Poisson: never trust a spread below sqrt(mean), or below one signal
+        spread = max(math.sqrt(series.variance), math.sqrt(series.mean), 1.0)
+        score = (count - series.mean) / spread
+        return score, max(0.0, series.cusum + score - self.k)
+
+    def _downsample(self, today):
+        daily_cutoff = today - self.daily_days
+        weekly_cutoff = today - self.weekly_weeks * 7
+        for key, series in list(self.series.items()):
+            for day in [day for day in series.daily if day < daily_cutoff]:
+                week = _week_start(day)
+                series.weekly[week] = series.weekly.get(week, 0) + series.daily.pop(day)
+            for week in [week for week in series.weekly if week < weekly_cutoff]:
+                del series.weekly[week]
+            if not series.daily and not series.weekly:
+                del self.series[key]
+
+    # Reading
+
+    def status(self, series):
+        """Detector state of a series' open day"""
+        score, cusum = self._score(series, series.count)
+        return {
+            'baseline': round(series.mean, 3),
+            'spread': round(max(math.sqrt(series.variance), math.sqrt(series.mean), 1.0), 3),
+            'today': series.count,
+            'score': round(score, 3),
+            'cusum': round(cusum, 3),
+            'alarm': series.days >= self.min_days and (score >= self.z or cusum >= self.h),
+            'history_days': series.days,
+        }
+
+    def time_series(self, county=None, disease=None, days=30, today=None):
+        """Daily counts of the last days days, the weekly counts before them and detector state"""
+        today = (today or datetime.utcnow().date()).toordinal()
+        first = today - days + 1
+        result = []
+        with self._lock:
+            for (series_county, series_disease), series in sorted(self.series.items()):
+                if (county is not None and series_county != county) or \
+                        (disease is not None and series_disease != disease):
+                    continue
+                result.append(dict(
+                    self.status(series),
+                    county=series_county or None,
+                    disease=series_disease,
+                    daily=[{'day': date.fromordinal(day).isoformat(), 'count': series.daily.get(day, 0)}
+                           for day in range(first, today + 1)],
+                    weekly=[{'week': date.fromordinal(week).isoformat(), 'count': n}
+                            for week, n in sorted(series.weekly.items()) if week < first],
+                    alarms=[{'day': date.fromordinal(day).isoformat(), 'count': n,
+                             'score': round(score, 3), 'cusum': round(cusum, 3)}
+                            for day, n, score, cusum in reversed(series.alarms)],
+                ))
+        return result
+
+    def alerts(self, since_days=7, today=None):
+        """Series alarming today or within the last since_days days, most anomalous first"""
+        today = (today or datetime.utcnow().date()).toordinal()
+        found = []
+        with self._lock:
+            for (county, disease), series in self.series.items():
+                status = self.status(series)
+                recent = [alarm for alarm in series.alarms if alarm[0] > today - since_days]
+                if status['alarm'] or recent:
+                    last = recent[-1] if recent else None
+                    found.append(dict(
+                        status, county=county or None, disease=disease,
+                        last_alarm=date.fromordinal(last[0]).isoformat() if last else None,
+                    ))
+        return sorted(found, key=lambda alert: (not alert['alarm'], -alert['score'], alert['disease']))
+
+    def bucket_count(self):
+        """Buckets held in memory, the quantity the retention settings bound"""
+        return sum(len(series.daily) + len(series.weekly) for series in self.series.values())
+
+
+def prune_signals(connection, before):
+    """Delete logged signals of days before the date before; returns the number removed"""
+    return connection.exec_driver_sql('DELETE FROM outbreak_signal WHERE day < ?', (before.isoformat(),)).rowcount
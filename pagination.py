@@ -0,0 +1,152 @@
+"""
+Keyset (cursor) pagination for CareNet Liberia list routes
+Pages are selected with a WHERE on the sort key of the last row seen rather
+than an OFFSET, so every page costs the same as the first one. Cursors name
+the listing and sort order that issued them, so one listing's cursor is never
+applied to another's sort key
+"""
+
+import base64
+import hashlib
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, or_, tuple_
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """Raised when a client sends a cursor that was not issued for this listing"""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict) and 'dt' in value:
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def listing_id(name, order_by=()):
+    """Short stable identity of a listing and its sort order, stored in its cursors"""
+    sort = ','.join(f"{column}{' desc' if desc else ''}" for column, desc in order_by)
+    return hashlib.sha1(f'{name}|{sort}'.encode('utf-8')).hexdigest()[:10]
+
+
+def encode_cursor(direction, values, listing):
+    payload = json.dumps({'d': direction, 'k': [_encode_value(v) for v in values], 'l': listing},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, key_length, listing, allow_unnamed=False):
+    """Return (direction, values) from a cursor encode_cursor produced for listing.
+
+    allow_unnamed accepts cursors issued before cursors named their listing.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        direction = payload['d']
+        values = [_decode_value(v) for v in payload['k']]
+        issued_for = payload.get('l')
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursor(f'Malformed cursor: {e}')
+    if issued_for is None and allow_unnamed:
+        issued_for = listing
+    if direction not in ('next', 'prev') or len(values) != key_length or issued_for != listing:
+        raise InvalidCursor('Cursor does not match this listing')
+    return direction, values
+
+
+def page_size_from(args, default=DEFAULT_PAGE_SIZE):
+    """Read and clamp the page_size query parameter"""
+    try:
+        size = int(args.get('page_size', default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+class Page:
+    """One page of results plus the cursors to reach its neighbours"""
+
+    def __init__(self, items, page_size, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    def to_dict(self, serialize):
+        return {
+            'success': True,
+            'data': [serialize(item) for item in self.items],
+            'count': len(self.items),
+            'page_size': self.page_size,
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor
+        }
+
+
+def _seek(order_by, values, backwards):
+    """WHERE clause selecting rows strictly after (or before) the given sort key"""
+    descending = [desc != backwards for _, desc in order_by]
+    columns = [column for column, _ in order_by]
+    if all(descending) or not any(descending):
+        # A row-value comparison lets SQLite seek a composite index directly
+        left, right = tuple_(*columns), tuple_(*values)
+        return left < right if descending[0] else left > right
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        step = column < value if descending[i] else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], step))
+    return or_(*clauses)
+
+
+def paginate(query, order_by, cursor=None, page_size=DEFAULT_PAGE_SIZE, name=''):
+    """Return a Page of ``query`` ordered by ``order_by``.
+
+    ``order_by`` is a list of (column, descending) pairs whose values are
+    never NULL and whose last column is unique (normally the primary key), so
+    the ordering is total and stable between requests. ``name`` identifies
+    the listing, e.g. its route, along with the sort order in the cursors.
+    """
+    listing = listing_id(name, order_by)
+    direction, values = ('next', None) if not cursor else decode_cursor(cursor, len(order_by), listing)
+    backwards = direction == 'prev'
+
+    if values is not None:
+        query = query.filter(_seek(order_by, values, backwards))
+    ordering = [column.desc() if desc != backwards else column.asc() for column, desc in order_by]
+    columns = [column for column, _ in order_by]
+    rows = query.add_columns(*columns).order_by(None).order_by(*ordering).limit(page_size + 1).all()
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+    items = [row[0] for row in rows]
+    first_key = list(rows[0][1:]) if rows else None
+    last_key = list(rows[-1][1:]) if rows else None
+
+    if backwards:
+        next_cursor = encode_cursor('next', last_key, listing) if rows else None
+        prev_cursor = encode_cursor('prev', first_key, listing) if has_more else None
+    else:
+        next_cursor = encode_cursor('next', last_key, listing) if has_more else None
+        prev_cursor = encode_cursor('prev', first_key, listing) if rows and values is not None else None
+    return Page(items, page_size, next_cursor=next_cursor, prev_cursor=prev_cursor)
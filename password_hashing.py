@@ -0,0 +1,106 @@
+"""
+Off-thread password hashing for CareNet Liberia
+scrypt hashing burns tens of milliseconds of CPU while holding the GIL, so it
+runs in a small process pool. A bounded number of pending jobs keeps a login
+burst from queueing without limit: extra requests fail fast with HasherBusy,
+and one that waits longer than the timeout gives up with HasherTimeout
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class HasherBusy(Exception):
+    """Raised when too many hashing jobs are already queued"""
+
+
+class HasherTimeout(HasherBusy):
+    """Raised when a hashing job did not finish within the hasher's timeout"""
+
+
+def _hash(password, method):
+    return generate_password_hash(password, method=method)
+
+
+def _verify(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+class PasswordHasher:
+    """Hash and verify passwords in worker processes.
+
+    ``workers=0`` hashes inline on the calling thread, which is what the app
+    did before and is handy for comparisons and single-process tools.
+    """
+
+    def __init__(self, method='scrypt', workers=2, max_pending=16, timeout=30):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._canonical_method = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    # Forked workers only ever run werkzeug's hash functions, so
+                    # they never touch locks inherited from the server's threads;
+                    # spawn would re-import the app module in every worker
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('fork'))
+        return self._pool
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy('Too many password operations in progress')
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeout:
+            # A job still queued is dropped and frees its slot now; one already
+            # running keeps its slot until the worker finishes it
+            future.cancel()
+            raise HasherTimeout('Password operation timed out') from None
+        except BrokenProcessPool:
+            # A worker died; start a fresh pool on the next call
+            with self._pool_lock:
+                self._pool = None
+            raise
+
+    def hash(self, password):
+        return self._run(_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._run(_verify, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True when pwhash was made with different hashing parameters than configured"""
+        if not pwhash or '$' not in pwhash:
+            return False
+        if self._canonical_method is None:
+            # Expand shorthand such as 'scrypt' to the full 'scrypt:32768:8:1'
+            # by hashing once with a cheap salt; done only on first use
+            self._canonical_method = generate_password_hash('', method=self.method, salt_length=1).split('$', 1)[0]
+        return pwhash.split('$', 1)[0] != self._canonical_method
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,66 @@
+"""
+Query plan regression checks for CareNet Liberia
+Records the SQL a route issues and runs EXPLAIN QUERY PLAN on each statement,
+flagging any that make SQLite scan a whole table instead of using an index
+"""
+
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+# "SCAN user", "SCAN user AS u" but not "SCAN user USING INDEX ..."
+SCAN_RE = re.compile(r'^SCAN (?P<table>\w+)(?: AS \w+)?$')
+
+
+@contextmanager
+def capture_statements(*engines):
+    """Collect (statement, parameters) for every SELECT run on the engines inside the block"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT') and not executemany:
+            statements.append((statement, parameters))
+
+    for engine in engines:
+        event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        for engine in engines:
+            event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(connection, statement, parameters):
+    """Return the detail column of EXPLAIN QUERY PLAN for a raw DB-API statement"""
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in rows]
+
+
+def full_table_scans(plan, tables):
+    """Names of real tables the plan reads with an unindexed full scan"""
+    scanned = []
+    for detail in plan:
+        match = SCAN_RE.match(detail.strip())
+        if match and match.group('table') in tables:
+            scanned.append(match.group('table'))
+    return scanned
+
+
+def check_statements(engine, statements, tables):
+    """Explain each distinct statement; return [(statement, plan, scanned_tables)] for regressions"""
+    failures = []
+    seen = set()
+    with engine.connect() as connection:
+        # EXPLAIN never checks the schema cookie; a real read makes a pooled
+        # connection notice indexes created or dropped since it last queried
+        connection.exec_driver_sql('SELECT COUNT(*) FROM sqlite_master').scalar()
+        for statement, parameters in statements:
+            if statement in seen:
+                continue
+            seen.add(statement)
+            plan = explain(connection, statement, parameters)
+            scanned = full_table_scans(plan, tables)
+            if scanned:
+                failures.append((statement, plan, scanned))
+    return failures
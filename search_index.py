@@ -0,0 +1,102 @@
+"""
+SQLite FTS5 search for CareNet Liberia
+Facilities and professionals are mirrored into FTS5 tables by triggers, so the
+name/service/specialty filters use a ranked, prefix-aware index instead of
+leading-wildcard LIKE scans
+"""
+
+import re
+
+from sqlalchemy import Float, Integer, text
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+FACILITY_FTS = 'facility_fts'
+PROFESSIONAL_FTS = 'professional_fts'
+
+SEARCH_SCHEMA = [
+    # Facilities: every row is searchable, so the table can be rebuilt
+    # straight from its external content table
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FACILITY_FTS} USING fts5(
+        name, services,
+        content='health_facility', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FACILITY_FTS}_ai AFTER INSERT ON health_facility BEGIN
+        INSERT INTO {FACILITY_FTS}(rowid, name, services) VALUES (new.id, new.name, new.services);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FACILITY_FTS}_ad AFTER DELETE ON health_facility BEGIN
+        INSERT INTO {FACILITY_FTS}({FACILITY_FTS}, rowid, name, services)
+        VALUES ('delete', old.id, old.name, old.services);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FACILITY_FTS}_au AFTER UPDATE OF name, services ON health_facility BEGIN
+        INSERT INTO {FACILITY_FTS}({FACILITY_FTS}, rowid, name, services)
+        VALUES ('delete', old.id, old.name, old.services);
+        INSERT INTO {FACILITY_FTS}(rowid, name, services) VALUES (new.id, new.name, new.services);
+    END""",
+    # Professionals: only user rows with user_type = 'professional' are
+    # indexed, so every trigger checks the type on both sides of a change
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {PROFESSIONAL_FTS} USING fts5(
+        name, specialty,
+        content='user', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {PROFESSIONAL_FTS}_ai AFTER INSERT ON "user"
+    WHEN new.user_type = 'professional' BEGIN
+        INSERT INTO {PROFESSIONAL_FTS}(rowid, name, specialty) VALUES (new.id, new.name, new.specialty);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {PROFESSIONAL_FTS}_ad AFTER DELETE ON "user"
+    WHEN old.user_type = 'professional' BEGIN
+        INSERT INTO {PROFESSIONAL_FTS}({PROFESSIONAL_FTS}, rowid, name, specialty)
+        VALUES ('delete', old.id, old.name, old.specialty);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {PROFESSIONAL_FTS}_au AFTER UPDATE OF name, specialty, user_type ON "user" BEGIN
+        INSERT INTO {PROFESSIONAL_FTS}({PROFESSIONAL_FTS}, rowid, name, specialty)
+        SELECT 'delete', old.id, old.name, old.specialty WHERE old.user_type = 'professional';
+        INSERT INTO {PROFESSIONAL_FTS}(rowid, name, specialty)
+        SELECT new.id, new.name, new.specialty WHERE new.user_type = 'professional';
+    END""",
+]
+
+
+def create_search_tables(connection):
+    """Create the FTS tables and sync triggers, then index the existing rows"""
+    for statement in SEARCH_SCHEMA:
+        connection.exec_driver_sql(statement)
+    connection.exec_driver_sql(f"INSERT INTO {FACILITY_FTS}({FACILITY_FTS}) VALUES ('rebuild')")
+    # 'rebuild' would index patients too, so professionals are backfilled by hand
+    connection.exec_driver_sql(f"INSERT INTO {PROFESSIONAL_FTS}({PROFESSIONAL_FTS}) VALUES ('delete-all')")
+    connection.exec_driver_sql(
+        f"""INSERT INTO {PROFESSIONAL_FTS}(rowid, name, specialty)
+        SELECT id, name, specialty FROM "user" WHERE user_type = 'professional'"""
+    )
+
+
+def match_expression(**column_terms):
+    """Build an FTS5 MATCH string where every word of every term must prefix-match its column.
+
+    Returns None when no searchable words remain, e.g. for input like '%%'.
+    """
+    clauses = []
+    for column, term in column_terms.items():
+        for word in TOKEN_RE.findall(term or ''):
+            clauses.append(f'{column} : "{word}"*')
+    if not clauses:
+        return None
+    return ' AND '.join(clauses)
+
+
+def _matches(table, expression):
+    return text(
+        f'SELECT rowid AS id, rank FROM {table} WHERE {table} MATCH :match'
+    ).bindparams(match=expression).columns(id=Integer, rank=Float).subquery(f'{table}_match')
+
+
+def facility_matches(expression):
+    """Subquery of (id, rank) for facilities matching an FTS expression; lower rank is better"""
+    return _matches(FACILITY_FTS, expression)
+
+
+def professional_matches(expression):
+    """Subquery of (id, rank) for professionals matching an FTS expression; lower rank is better"""
+    return _matches(PROFESSIONAL_FTS, expression)
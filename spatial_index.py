@@ -0,0 +1,238 @@
+"""
+In-memory spatial index for CareNet Liberia health facilities
+A uniform lat/lon grid answers k-nearest queries by searching rings of cells
+outward from the query point and stopping as soon as no closer point can exist
+"""
+
+import heapq
+import math
+import threading
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def parse_services(services):
+    """Split a facility's comma separated services into normalized names"""
+    if not services:
+        return frozenset()
+    return frozenset(s.strip().lower() for s in services.split(',') if s.strip())
+
+
+def _chord_measure(d_km):
+    """Haversine 'a' term for a distance, which orders points like the distance does"""
+    return math.sin(min(d_km / EARTH_RADIUS_KM, math.pi) / 2) ** 2
+
+
+def _distance_from_measure(a):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """Points bucketed into square cells of ``cell_size`` degrees"""
+
+    def __init__(self, cell_size=0.025):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.points = {}
+        self.bounds = None  # [min_x, max_x, min_y, max_y] over cells ever used
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, lat, lon):
+        return (math.floor(lon / self.cell_size), math.floor(lat / self.cell_size))
+
+    def insert(self, key, lat, lon):
+        if key in self.points:
+            self.remove(key)
+        cell = self._cell(lat, lon)
+        phi = math.radians(lat)
+        bucket = self.cells.get(cell)
+        if bucket is None:
+            bucket = self.cells[cell] = {}
+        # Store radians and cos(lat) so queries skip the trigonometry setup
+        bucket[key] = (phi, math.radians(lon), math.cos(phi))
+        self.points[key] = cell
+        x, y = cell
+        bounds = self.bounds
+        if bounds is None:
+            self.bounds = [x, x, y, y]
+        else:
+            if x < bounds[0]:
+                bounds[0] = x
+            elif x > bounds[1]:
+                bounds[1] = x
+            if y < bounds[2]:
+                bounds[2] = y
+            elif y > bounds[3]:
+                bounds[3] = y
+
+    def remove(self, key):
+        cell = self.points.pop(key, None)
+        if cell is None:
+            return
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def _ring(self, cx, cy, r):
+        if r == 0:
+            yield (cx, cy)
+            return
+        for x in range(cx - r, cx + r + 1):
+            yield (x, cy - r)
+            yield (x, cy + r)
+        for y in range(cy - r + 1, cy + r):
+            yield (cx - r, y)
+            yield (cx + r, y)
+
+    def _lower_bound_km(self, lat, lon, cx, cy, r):
+        """Smallest distance from the query to any cell outside the (2r+1)^2 block"""
+        size = self.cell_size
+        south = (cy - r) * size
+        north = (cy + r + 1) * size
+        west = (cx - r) * size
+        east = (cx + r + 1) * size
+        dlat = min(lat - south, north - lat)
+        # Meridians converge towards the poles, so use the widest latitude
+        # reached by the block to keep the bound conservative
+        widest = min(89.0, max(abs(south), abs(north)))
+        dlon = min(lon - west, east - lon) * math.cos(math.radians(widest))
+        return max(0.0, min(dlat, dlon)) * KM_PER_DEGREE
+
+    def nearest(self, lat, lon, k, accept=None):
+        """Return up to k (distance_km, key) pairs ordered by distance.
+
+        Rings are searched only while they hold fewer cells than the index
+        has occupied ones; past that, far from every point, the occupied
+        cells outside the searched block are scanned directly, so a query
+        costs at most about one pass over the index.
+        """
+        if not self.points or k <= 0:
+            return []
+        cx, cy = self._cell(lat, lon)
+        min_x, max_x, min_y, max_y = self.bounds
+        max_r = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy, 0)
+        phi1 = math.radians(lat)
+        lmb1 = math.radians(lon)
+        cos1 = math.cos(phi1)
+        sin = math.sin
+        cells = self.cells
+        best = []  # max-heap of (-measure, key)
+
+        def scan(bucket):
+            for key, (phi2, lmb2, cos2) in bucket.items():
+                if accept is not None and not accept(key):
+                    continue
+                a = sin((phi2 - phi1) / 2) ** 2 + cos1 * cos2 * sin((lmb2 - lmb1) / 2) ** 2
+                if len(best) < k:
+                    heapq.heappush(best, (-a, key))
+                elif a < -best[0][0]:
+                    heapq.heapreplace(best, (-a, key))
+
+        visited = 0
+        for r in range(max_r + 1):
+            ring_size = 8 * r or 1
+            if visited + ring_size > len(cells):
+                for (x, y), bucket in cells.items():
+                    if max(abs(x - cx), abs(y - cy)) >= r:
+                        scan(bucket)
+                break
+            visited += ring_size
+            for cell in self._ring(cx, cy, r):
+                bucket = cells.get(cell)
+                if bucket:
+                    scan(bucket)
+            if len(best) == k and \
+                    -best[0][0] <= _chord_measure(self._lower_bound_km(lat, lon, cx, cy, r)):
+                break
+        return sorted((_distance_from_measure(-a), key) for a, key in best)
+
+
+class FacilityIndex:
+    """Thread-safe k-NN index over facilities, with one grid per service"""
+
+    def __init__(self, cell_size=0.025):
+        self.cell_size = cell_size
+        self.all = GridIndex(cell_size)
+        self.by_service = {}
+        self.services = {}
+        self.loaded = False
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.all)
+
+    def load(self, rows):
+        """Replace the index contents with (id, latitude, longitude, services) rows"""
+        with self._lock:
+            self.all = GridIndex(self.cell_size)
+            self.by_service = {}
+            self.services = {}
+            for row in rows:
+                self._upsert(*row)
+            self.loaded = True
+
+    def upsert(self, facility_id, latitude, longitude, services):
+        with self._lock:
+            self._upsert(facility_id, latitude, longitude, services)
+
+    def remove(self, facility_id):
+        with self._lock:
+            self._remove(facility_id)
+
+    def _upsert(self, facility_id, latitude, longitude, services):
+        self._remove(facility_id)
+        if latitude is None or longitude is None:
+            return
+        names = parse_services(services)
+        self.all.insert(facility_id, latitude, longitude)
+        for name in names:
+            grid = self.by_service.get(name)
+            if grid is None:
+                grid = self.by_service[name] = GridIndex(self.cell_size)
+            grid.insert(facility_id, latitude, longitude)
+        self.services[facility_id] = names
+
+    def _remove(self, facility_id):
+        self.all.remove(facility_id)
+        for name in self.services.pop(facility_id, ()):
+            grid = self.by_service[name]
+            grid.remove(facility_id)
+            if not len(grid):
+                del self.by_service[name]
+
+    def nearest(self, lat, lon, k=5, service=None):
+        """Return up to k (distance_km, facility_id) pairs, optionally offering a service.
+
+        ``service`` matches any indexed service name containing it, mirroring
+        the substring filter on /facilities.
+        """
+        with self._lock:
+            if not service:
+                return self.all.nearest(lat, lon, k)
+            term = service.strip().lower()
+            grids = [grid for name, grid in self.by_service.items() if term in name]
+            if len(grids) == 1:
+                return grids[0].nearest(lat, lon, k)
+            seen = set()
+            merged = []
+            for grid in grids:
+                for d, key in grid.nearest(lat, lon, k):
+                    if key not in seen:
+                        seen.add(key)
+                        merged.append((d, key))
+            merged.sort()
+            return merged[:k]
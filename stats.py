@@ -0,0 +1,276 @@
+"""
+Incrementally maintained statistics for the CareNet Liberia admin pages
+Counters live in the stat_counter table and are adjusted in the same
+transaction that creates, edits or deletes a counted row, so reading them
+costs a handful of rows however large the platform grows. A reconciliation
+pass recounts from the source tables and corrects any drift left by writes
+that bypass the ORM (raw SQL imports, manual edits)
+"""
+
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from model_events import previous_values, row_snapshot
+
+STAT_TABLE = 'stat_counter'
+
+STAT_SCHEMA = f"""CREATE TABLE IF NOT EXISTS {STAT_TABLE} (
+    metric VARCHAR(40) NOT NULL,
+    dim1 VARCHAR(100) NOT NULL DEFAULT '',
+    dim2 VARCHAR(100) NOT NULL DEFAULT '',
+    value INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, dim1, dim2)
+) WITHOUT ROWID"""
+
+UPSERT = f"""INSERT INTO {STAT_TABLE} (metric, dim1, dim2, value) VALUES (?, ?, ?, ?)
+ON CONFLICT (metric, dim1, dim2) DO UPDATE SET value = value + excluded.value"""
+
+_PENDING_KEY = 'carenet_pending_stats'
+_PREVIOUS_KEY = 'carenet_previous_stats'
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        return value.date().isoformat()
+    return str(value)[:10] if value else ''
+
+
+def user_keys(row):
+    """(metric, dim1, dim2) counters a user row contributes one to"""
+    county = row.get('county') or ''
+    keys = [('users', row.get('user_type') or '', county)]
+    if row.get('user_type') == 'professional' and not row.get('is_approved'):
+        keys.append(('pending_approvals', county, ''))
+    return keys
+
+
+def appointment_keys(row):
+    """(metric, dim1, dim2) counters an appointment row contributes one to"""
+    status = row.get('status') or ''
+    keys = [('appointments', status, '')]
+    if row.get('appointment_date'):
+        keys.append(('appointments_by_day', _day(row['appointment_date']), status))
+    return keys
+
+
+# The same counters computed from scratch; must agree with the *_keys functions above
+RECOUNT = [
+    """SELECT 'users', COALESCE(user_type, ''), COALESCE(county, ''), COUNT(*) FROM "user" GROUP BY 2, 3""",
+    """SELECT 'pending_approvals', COALESCE(county, ''), '', COUNT(*) FROM "user"
+    WHERE user_type = 'professional' AND NOT COALESCE(is_approved, 0) GROUP BY 2""",
+    "SELECT 'appointments', COALESCE(status, ''), '', COUNT(*) FROM appointment GROUP BY 2",
+    """SELECT 'appointments_by_day', date(appointment_date), COALESCE(status, ''), COUNT(*) FROM appointment
+    WHERE appointment_date IS NOT NULL GROUP BY 2, 3""",
+]
+
+
+def create_stat_table(connection):
+    connection.exec_driver_sql(STAT_SCHEMA)
+
+
+class StatsTracker:
+    """Keeps stat_counter in step with ORM writes to the tracked models.
+
+    Deltas are collected while the session flushes and written with one
+    upsert per flush, inside the flushing transaction: a rollback undoes the
+    counters together with the rows.
+    """
+
+    def __init__(self):
+        self.models = {}
+        self._session_hooks_installed = False
+
+    def track(self, model, keys, columns):
+        """Count rows of model under the counters keys(row) returns.
+
+        columns lists every attribute keys() reads; updates touching none of
+        them cannot move a row between counters and are skipped.
+        """
+        self.models[model] = keys
+        self._install_session_hooks()
+
+        def changed(target):
+            state = inspect(target)
+            return any(state.attrs[key].history.has_changes() for key in columns)
+
+        @event.listens_for(model, 'after_insert')
+        def after_insert(mapper, connection, target):
+            self._add(inspect(target).session, keys(row_snapshot(mapper, connection, target)), 1)
+
+        @event.listens_for(model, 'before_update')
+        def before_update(mapper, connection, target):
+            if changed(target):
+                inspect(target).info[_PREVIOUS_KEY] = previous_values(mapper, connection, target, columns)
+
+        @event.listens_for(model, 'after_update')
+        def after_update(mapper, connection, target):
+            state = inspect(target)
+            previous = state.info.pop(_PREVIOUS_KEY, None)
+            if previous is None:
+                return
+            row = row_snapshot(mapper, connection, target)
+            self._add(state.session, keys(dict(row, **previous)), -1)
+            self._add(state.session, keys(row), 1)
+
+        @event.listens_for(model, 'after_delete')
+        def after_delete(mapper, connection, target):
+            self._add(inspect(target).session, keys(row_snapshot(mapper, connection, target)), -1)
+
+    def record(self, session, model, row, delta=1):
+        """Count a row written outside the ORM (e.g. a Core insert) when session commits"""
+        self._add(session, self.models[model](row), delta)
+
+    def _add(self, session, keys, delta):
+        if session is None:
+            return
+        pending = session.info.setdefault(_PENDING_KEY, Counter())
+        for key in keys:
+            pending[key] += delta
+
+    def _apply(self, session):
+        pending = session.info.pop(_PENDING_KEY, None)
+        rows = [(metric, dim1, dim2, delta) for (metric, dim1, dim2), delta in (pending or {}).items() if delta]
+        if rows:
+            session.connection().exec_driver_sql(UPSERT, rows)
+
+    def _install_session_hooks(self):
+        if self._session_hooks_installed:
+            return
+        self._session_hooks_installed = True
+
+        @event.listens_for(Session, 'after_flush')
+        def after_flush(session, flush_context):
+            self._apply(session)
+
+        @event.listens_for(Session, 'before_commit')
+        def before_commit(session):
+            # Deltas recorded for Core writes when nothing else is left to flush
+            self._apply(session)
+
+        @event.listens_for(Session, 'after_rollback')
+        def after_rollback(session):
+            session.info.pop(_PENDING_KEY, None)
+
+
+def reconcile(connection):
+    """Recount every counter from the source tables and correct the stored ones.
+
+    Returns the corrections as [(metric, dim1, dim2, stored, actual)]. The
+    first statement is a write, so the recount runs under SQLite's write lock
+    and cannot interleave with another commit.
+    """
+    connection.exec_driver_sql(f'DELETE FROM {STAT_TABLE} WHERE value = 0')
+    stored = {(metric, dim1, dim2): value for metric, dim1, dim2, value
+              in connection.exec_driver_sql(f'SELECT metric, dim1, dim2, value FROM {STAT_TABLE}')}
+    actual = {}
+    for query in RECOUNT:
+        for metric, dim1, dim2, value in connection.exec_driver_sql(query):
+            actual[(metric, dim1, dim2)] = value
+
+    drift = [key + (stored.get(key, 0), actual.get(key, 0)) for key in sorted(stored.keys() | actual.keys())
+             if stored.get(key, 0) != actual.get(key, 0)]
+    for metric, dim1, dim2, _, value in drift:
+        if value:
+            connection.exec_driver_sql(
+                f"""INSERT INTO {STAT_TABLE} (metric, dim1, dim2, value) VALUES (?, ?, ?, ?)
+                ON CONFLICT (metric, dim1, dim2) DO UPDATE SET value = excluded.value""",
+                (metric, dim1, dim2, value))
+        else:
+            connection.exec_driver_sql(f'DELETE FROM {STAT_TABLE} WHERE metric = ? AND dim1 = ? AND dim2 = ?',
+                                       (metric, dim1, dim2))
+    return drift
+
+
+def read_stats(connection, since=None, until=None):
+    """Counters shaped for the admin page and API.
+
+    Appointments per day are included only for days between since and until
+    (ISO dates, inclusive); everything else is a fixed number of rows.
+    """
+    rows = connection.exec_driver_sql(
+        f"""SELECT metric, dim1, dim2, value FROM {STAT_TABLE}
+        WHERE metric IN ('users', 'pending_approvals', 'appointments') AND value != 0"""
+    ).fetchall()
+    if since and until:
+        rows += connection.exec_driver_sql(
+            f"""SELECT metric, dim1, dim2, value FROM {STAT_TABLE}
+            WHERE metric = 'appointments_by_day' AND dim1 BETWEEN ? AND ? AND value != 0""", (since, until)
+        ).fetchall()
+
+    users = {'total': 0, 'by_type': {}, 'by_county': {}, 'by_type_county': {}}
+    pending = {'total': 0, 'by_county': {}}
+    appointments = {'total': 0, 'by_status': {}}
+    if since and until:
+        appointments['by_day'] = {}
+    for metric, dim1, dim2, value in rows:
+        if metric == 'users':
+            users['total'] += value
+            users['by_type'][dim1] = users['by_type'].get(dim1, 0) + value
+            users['by_county'][dim2] = users['by_county'].get(dim2, 0) + value
+            users['by_type_county'].setdefault(dim1, {})[dim2] = value
+        elif metric == 'pending_approvals':
+            pending['total'] += value
+            pending['by_county'][dim1] = value
+        elif metric == 'appointments':
+            appointments['total'] += value
+            appointments['by_status'][dim1] = value
+        else:
+            appointments['by_day'].setdefault(dim1, {})[dim2] = value
+    return {'users': users, 'pending_approvals': pending, 'appointments': appointments}
+
+
+class Reconciler:
+    """Daemon thread running reconcile every interval seconds (0 disables it)"""
+
+    def __init__(self, run, interval=3600):
+        self.run = run  # run() reconciles and returns the corrections made
+        self.interval = interval
+        self.last_run = None
+        self.last_drift = None
+        self.last_error = None
+        self._start_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        try:
+            drift = self.run()
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error reconciling statistics: {e}")
+            return None
+        self.last_run = time.time()
+        self.last_drift = len(drift)
+        self.last_error = None
+        if drift:
+            print(f"Corrected {len(drift)} drifted statistics counters")
+        return drift
+
+    def status(self):
+        return {'reconciled_at': self.last_run, 'corrections': self.last_drift, 'last_error': self.last_error}
+
+    def start(self):
+        """Start the background thread (idempotent)"""
+        if self.interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='stats-reconciler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,166 @@
+"""
+Storage configuration for CareNet Liberia
+Every SQLite connection is opened in WAL mode with a busy timeout and the
+configured synchronous level, so readers never block the writer and writers
+queue for the lock instead of failing with "database is locked". Writer
+connections run reads outside any transaction, as the sqlite3 module always
+did, and open the transaction with BEGIN IMMEDIATE right before the first
+write: a deferred transaction that reads and then writes cannot wait for the
+lock when another process committed in between, and fails at once. Requests
+marked read-only query a second pool of query_only connections, which take
+no lock at all
+"""
+
+import os
+import re
+import sqlite3
+import threading
+from functools import wraps
+
+import flask_sqlalchemy.session
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.sql.dml import UpdateBase
+
+READ_BIND = 'read'
+SYNCHRONOUS_LEVELS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+# Statements a writer connection runs without opening a transaction
+_READ_RE = re.compile(r'\s*(SELECT|EXPLAIN|PRAGMA\s+[\w.]+\s*(\(|;|$))', re.IGNORECASE)
+
+
+class NestedWrite(RuntimeError):
+    """Raised when a thread starts a write on one connection while another of its connections holds the lock.
+
+    SQLite allows one writer, so the second write would wait on its own
+    thread until the busy timeout; commit the first transaction (e.g. the
+    session) before writing through another connection.
+    """
+
+
+def is_read(statement):
+    return _READ_RE.match(statement) is not None
+
+
+def pool_options(url, pool_size, max_overflow, pool_timeout):
+    """Engine options sizing the connection pool for url; an in-memory database keeps its single connection"""
+    if url.startswith('sqlite') and ':memory:' in url:
+        return {}
+    return {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_timeout': pool_timeout}
+
+
+def configure_sqlite(engine, journal_mode='WAL', busy_timeout=5000, synchronous='NORMAL', read_only=False):
+    """Apply the pragmas to each new connection of a SQLite engine and take over BEGIN"""
+    if engine.dialect.name != 'sqlite':
+        return
+    synchronous = synchronous.upper()
+    if synchronous not in SYNCHRONOUS_LEVELS:
+        raise ValueError(f'synchronous must be one of {", ".join(SYNCHRONOUS_LEVELS)}')
+
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        # Autocommit at the driver level, so the begin hook below decides how transactions start
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        # PRAGMA does not accept bound parameters
+        cursor.execute(f'PRAGMA busy_timeout = {int(busy_timeout)}')
+        if journal_mode:
+            cursor.execute(f'PRAGMA journal_mode = {journal_mode}')
+        cursor.execute(f'PRAGMA synchronous = {synchronous}')
+        if read_only:
+            cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+
+    if read_only:
+        @event.listens_for(engine, 'begin')
+        def on_begin(connection):
+            connection.exec_driver_sql('BEGIN')
+        return
+
+    # SQLite's busy handler polls with growing sleeps, so among many waiting
+    # writers some starve past the timeout. Threads of one process queue here
+    # instead, leaving a single waiter per process on the database lock
+    write_lock = threading.Lock()
+    holder = [None]  # ident of the thread holding write_lock
+
+    @event.listens_for(engine, 'begin')
+    def on_begin(connection):
+        # The transaction is opened by the first write, see before_cursor_execute
+        connection.info['begin_pending'] = True
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(connection, cursor, statement, parameters, context, executemany):
+        if not connection.info.get('begin_pending') or is_read(statement):
+            return
+        if holder[0] == threading.get_ident():
+            raise NestedWrite('this thread already holds the write lock on another connection')
+        if not write_lock.acquire(timeout=busy_timeout / 1000):
+            raise OperationalError('BEGIN IMMEDIATE', None, sqlite3.OperationalError('database is locked'))
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            write_lock.release()
+            raise
+        holder[0] = threading.get_ident()
+        connection.info['begin_pending'] = False
+        connection.info['write_lock'] = True
+
+    @event.listens_for(engine, 'commit')
+    @event.listens_for(engine, 'rollback')
+    def on_end(connection):
+        connection.info.pop('begin_pending', None)
+        if connection.info.pop('write_lock', False):
+            holder[0] = None
+            write_lock.release()
+
+
+def dispose_after_fork(get_engines):
+    """Drop connections inherited from the parent in forked children (gunicorn --preload, flask worker)"""
+    def after_fork():
+        for engine in get_engines():
+            engine.dispose(close=False)
+    os.register_at_fork(after_in_child=after_fork)
+
+
+def reading():
+    """Whether the current request only reads, see read_only"""
+    return has_app_context() and g.get('read_only', False)
+
+
+def read_only(view):
+    """Send the view's queries to the read pool.
+
+    Flushes and INSERT/UPDATE/DELETE statements still go to the write pool,
+    so a view that occasionally writes (a login upgrading its hash) can be
+    marked too; its reads before the first write see the read snapshot, so
+    leave unmarked views that write what they computed from those reads.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+class Session(flask_sqlalchemy.session.Session):
+    """Session that reads through the read bind while the request is read-only.
+
+    Once a transaction has written, its reads stay on the write connection
+    so they see their own changes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get('wrote') and reading():
+            engines = self._db.engines
+            if self._flushing or isinstance(clause, UpdateBase):
+                self.info['wrote'] = True
+            elif READ_BIND in engines:
+                return engines[READ_BIND]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_writes(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
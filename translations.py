@@ -4,6 +4,13 @@ Translation system for CareNet Liberia
 Supports major languages and dialects spoken in Liberia
 """
 
+import hashlib
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+
 # Major languages and dialects in Liberia
 LIBERIAN_LANGUAGES = {
     'english': 'English',
@@ -28,226 +35,158 @@ LIBERIAN_LANGUAGES = {
     'koloqua': 'Koloqua'
 }
 
-# Common health-related translations
-TRANSLATIONS = {
-    'english': {
-        'welcome': 'Welcome to CareNet Liberia',
-        'health_for_all': 'Digital Health Platform for All 15 Counties',
-        'book_appointment': 'Book Appointment',
-        'find_doctor': 'Find Doctor',
-        'emergency': 'Emergency',
-        'mental_health': 'Mental Health',
-        'facilities': 'Health Facilities',
-        'education': 'Health Education',
-        'login': 'Login',
-        'register': 'Register',
-        'dashboard': 'Dashboard',
-        'prescriptions': 'Prescriptions',
-        'telemedicine': 'Telemedicine',
-        'ai_assistant': 'AI Health Assistant',
-        'name': 'Name',
-        'email': 'Email',
-        'password': 'Password',
-        'county': 'County',
-        'phone': 'Phone Number',
-        'submit': 'Submit',
-        'cancel': 'Cancel',
-        'fever': 'Fever',
-        'headache': 'Headache',
-        'malaria': 'Malaria',
-        'doctor': 'Doctor',
-        'nurse': 'Nurse',
-        'hospital': 'Hospital',
-        'clinic': 'Clinic',
-        'symptoms': 'Symptoms',
-        'treatment': 'Treatment',
-        'medication': 'Medication',
-        'appointment': 'Appointment',
-        'health_tip': 'Health Tip',
-        'prevention': 'Prevention'
-    },
-    'kpelle': {
-        'welcome': 'Kɛ CareNet Liberia kɛ',
-        'health_for_all': 'Yee koli gbogbo maa county 15 kɛ',
-        'book_appointment': 'Yee koli bɛrɛ sii',
-        'find_doctor': 'Dokita kɛrɛ',
-        'emergency': 'Maa yii',
-        'mental_health': 'Sueii yee',
-        'facilities': 'Yee koli ma',
-        'education': 'Yee kɛlɛng',
-        'login': 'Kɔ kɛ',
-        'register': 'Yuu tari',
-        'dashboard': 'Gbɛlɛng kɛ',
-        'prescriptions': 'Kɛɛn sɛbɛ',
-        'telemedicine': 'Mɛni yii kɛɛn',
-        'ai_assistant': 'Kɛɛn yuu maa',
-        'name': 'Yuu',
-        'email': 'Sɛbɛ kɛɛ',
-        'password': 'Koli gbɛlɛ',
-        'county': 'Kɔ',
-        'phone': 'Telefon',
-        'submit': 'Kɛ',
-        'cancel': 'Gbɛlɛ',
-        'fever': 'Mɛni yii',
-        'headache': 'Wuumɛni',
-        'malaria': 'Malaria',
-        'doctor': 'Dokita',
-        'nurse': 'Nɛsɛ',
-        'hospital': 'Yee koli ma baa',
-        'clinic': 'Yee koli ma',
-        'symptoms': 'Mɛni kɛrɛng',
-        'treatment': 'Kɛɛn',
-        'medication': 'Kɛɛn',
-        'appointment': 'Yee koli bɛrɛ',
-        'health_tip': 'Yee kɛlɛng',
-        'prevention': 'Kɔɔng'
-    },
-    'bassa': {
-        'welcome': 'Nyɔnmɔ CareNet Liberia ke',
-        'health_for_all': 'Wɛn gbɛdii county 15 kɛ',
-        'book_appointment': 'Wɛn gbɛdii kɛ',
-        'find_doctor': 'Dokita nyɔn',
-        'emergency': 'Maa kɛ',
-        'mental_health': 'Sueii wɛn',
-        'facilities': 'Wɛn gbɛdii ma',
-        'education': 'Kɛlɛng',
-        'login': 'Kɔ',
-        'register': 'Yuu ke',
-        'dashboard': 'Gbɛlɛng',
-        'prescriptions': 'Kɛɛn sɛbɛ',
-        'telemedicine': 'Kɛɛn telefon kɛ',
-        'ai_assistant': 'Kɛɛn yuu',
-        'name': 'Yuu',
-        'email': 'Sɛbɛ',
-        'password': 'Koli gbɛlɛ',
-        'county': 'Kɔ',
-        'phone': 'Telefon',
-        'submit': 'Kɛ',
-        'cancel': 'Kpɛlɛ',
-        'fever': 'Mɛni yii',
-        'headache': 'Wuu mɛni',
-        'malaria': 'Malaria',
-        'doctor': 'Dokita',
-        'nurse': 'Nɛsɛ',
-        'hospital': 'Wɛn gbɛdii ma baa',
-        'clinic': 'Wɛn gbɛdii ma',
-        'symptoms': 'Mɛni kɛrɛng',
-        'treatment': 'Kɛɛn',
-        'medication': 'Kɛɛn',
-        'appointment': 'Wɛn gbɛdii',
-        'health_tip': 'Wɛn kɛlɛng',
-        'prevention': 'Kɔɔng'
-    },
-    'gio': {
-        'welcome': 'Yɛ CareNet Liberia po',
-        'health_for_all': 'Yɛɛ geɛng county 15 kɛ',
-        'book_appointment': 'Yɛɛ geɛng woo',
-        'find_doctor': 'Dokita nyɔn',
-        'emergency': 'Maa klɛɛ',
-        'mental_health': 'Sueii yɛɛ',
-        'facilities': 'Yɛɛ geɛng ma',
-        'education': 'Kɛlɛɛng',
-        'login': 'Kɔ blɔng',
-        'register': 'Yuu taa',
-        'dashboard': 'Gbɛlɛɛng',
-        'prescriptions': 'Kɛɛn sɛbɛ',
-        'telemedicine': 'Kɛɛn telefon',
-        'ai_assistant': 'Kɛɛn yuu',
-        'name': 'Yuu',
-        'email': 'Sɛbɛ',
-        'password': 'Koli gbɛlɛ',
-        'county': 'Kɔ',
-        'phone': 'Telefon',
-        'submit': 'Kɛ',
-        'cancel': 'Kpɛɛlɛ',
-        'fever': 'Mɛni yii',
-        'headache': 'Wuu mɛni',
-        'malaria': 'Malaria',
-        'doctor': 'Dokita',
-        'nurse': 'Nɛɛsɛ',
-        'hospital': 'Yɛɛ geɛng ma baa',
-        'clinic': 'Yɛɛ geɛng ma',
-        'symptoms': 'Mɛni kɛrɛɛng',
-        'treatment': 'Kɛɛn',
-        'medication': 'Kɛɛn',
-        'appointment': 'Yɛɛ geɛng',
-        'health_tip': 'Yɛɛ kɛlɛɛng',
-        'prevention': 'Kɔɔɔng'
-    },
-    'liberian_english': {
-        'welcome': 'Welcome to CareNet Liberia o',
-        'health_for_all': 'Health for all de 15 counties dem',
-        'book_appointment': 'Book your appointment',
-        'find_doctor': 'Find doctor',
-        'emergency': 'Emergency o',
-        'mental_health': 'Mental health',
-        'facilities': 'Health facilities dem',
-        'education': 'Health education',
-        'login': 'Login',
-        'register': 'Register',
-        'dashboard': 'Dashboard',
-        'prescriptions': 'Your medicine dem',
-        'telemedicine': 'Doctor call',
-        'ai_assistant': 'AI helper',
-        'name': 'Your name',
-        'email': 'Email',
-        'password': 'Password',
-        'county': 'County',
-        'phone': 'Phone number',
-        'submit': 'Submit',
-        'cancel': 'Cancel',
-        'fever': 'Fever',
-        'headache': 'Headache',
-        'malaria': 'Malaria',
-        'doctor': 'Doctor',
-        'nurse': 'Nurse',
-        'hospital': 'Hospital',
-        'clinic': 'Clinic',
-        'symptoms': 'Symptoms dem',
-        'treatment': 'Treatment',
-        'medication': 'Medicine',
-        'appointment': 'Appointment',
-        'health_tip': 'Health tip',
-        'prevention': 'Prevention'
-    }
+# Languages without a full catalog borrow from a closer relative before
+# falling back to English; a catalog file may override this with "fallback"
+FALLBACKS = {
+    'koloqua': 'liberian_english',
 }
 
+DEFAULT_LANGUAGE = 'english'
+
+# Catalogs live in locales/<language>.json as {"strings": {...}, "phrases": {...}}
+LOCALES_DIR = os.environ.get('CARENET_LOCALES_DIR',
+                             os.path.join(os.path.dirname(os.path.abspath(__file__)), 'locales'))
+
+# Seconds between checks of the catalog files for changes
+RELOAD_INTERVAL = float(os.environ.get('CARENET_LOCALES_RELOAD_INTERVAL', 2.0))
+
+# Raw catalogs as loaded from disk, keyed by language
+TRANSLATIONS = {}
+
+_compiled = {}
+_compiled_phrases = {}
+_catalog_stamps = {}
+_catalog_version = ''
+_next_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def _catalog_files(locales_dir):
+    try:
+        names = os.listdir(locales_dir)
+    except FileNotFoundError:
+        return {}
+    return {name[:-5]: os.path.join(locales_dir, name) for name in names if name.endswith('.json')}
+
+
+def _catalog_stamp(path):
+    """(mtime, size) of a catalog file; a file swapped for an older copy still differs"""
+    st = os.stat(path)
+    return st.st_mtime_ns, st.st_size
+
+
+def _fallback_chain(language, catalogs):
+    """Languages to consult for ``language``, most specific first, always ending in English"""
+    chain = []
+    current = language
+    while current and current not in chain:
+        chain.append(current)
+        current = catalogs.get(current, {}).get('fallback') or FALLBACKS.get(current)
+    if DEFAULT_LANGUAGE not in chain:
+        chain.append(DEFAULT_LANGUAGE)
+    return chain
+
+
+def compile_translations(catalogs):
+    """Flatten catalogs into one fully resolved map per language.
+
+    Returns (strings, phrases): dicts of language -> {key: text} with the
+    fallback chain already merged in, so a lookup is a single dict probe.
+    """
+    strings = {}
+    phrases = {}
+    for language in set(LIBERIAN_LANGUAGES) | set(catalogs):
+        merged_strings = {}
+        merged_phrases = {}
+        for source in reversed(_fallback_chain(language, catalogs)):
+            catalog = catalogs.get(source, {})
+            merged_strings.update(catalog.get('strings', {}))
+            if source != DEFAULT_LANGUAGE:
+                merged_phrases.update(catalog.get('phrases', {}))
+        strings[language] = MappingProxyType(merged_strings)
+        phrases[language] = MappingProxyType(merged_phrases)
+    return strings, phrases
+
+
+def load_translations(locales_dir=None):
+    """(Re)load every catalog file and swap in freshly compiled tables"""
+    global TRANSLATIONS, _compiled, _compiled_phrases, _catalog_stamps, _catalog_version
+    locales_dir = locales_dir or LOCALES_DIR
+    files = _catalog_files(locales_dir)
+    catalogs = {}
+    stamps = {}
+    for language, path in files.items():
+        stamps[path] = _catalog_stamp(path)
+        with open(path, encoding='utf-8') as f:
+            catalogs[language] = json.load(f)
+    strings, phrases = compile_translations(catalogs)
+    TRANSLATIONS = {language: catalog.get('strings', {}) for language, catalog in catalogs.items()}
+    # Covers which files exist as well as their stamps, so removing a locale changes it too
+    listing = sorted((os.path.basename(path), mtime, size) for path, (mtime, size) in stamps.items())
+    version = hashlib.sha1(json.dumps(listing).encode('utf-8')).hexdigest()[:16]
+    _compiled, _compiled_phrases, _catalog_stamps, _catalog_version = strings, phrases, stamps, version
+
+
+def reload_if_changed(locales_dir=None, force=False):
+    """Recompile when a catalog file was added, removed or modified.
+
+    Checks the file system at most once per RELOAD_INTERVAL seconds. A broken
+    catalog keeps the previously compiled tables in service.
+    """
+    global _next_check
+    now = time.monotonic()
+    if not force and now < _next_check:
+        return False
+    if not _reload_lock.acquire(blocking=False):
+        return False
+    try:
+        _next_check = now + RELOAD_INTERVAL
+        files = _catalog_files(locales_dir or LOCALES_DIR)
+        try:
+            stamps = {path: _catalog_stamp(path) for path in files.values()}
+        except FileNotFoundError:
+            return False
+        if stamps == _catalog_stamps:
+            return False
+        try:
+            load_translations(locales_dir)
+        except (OSError, ValueError) as e:
+            print(f"Error reloading translations: {e}")
+            return False
+        return True
+    finally:
+        _reload_lock.release()
+
+
+def get_language_map(language='english'):
+    """Get the complete, fallback-resolved translation map for one language"""
+    reload_if_changed()
+    return _compiled.get(language) or _compiled[DEFAULT_LANGUAGE]
+
+
+def catalog_version():
+    """Token that changes whenever the catalogs are recompiled, for HTTP validators"""
+    reload_if_changed()
+    return _catalog_version
+
+
 def get_translation(key, language='english'):
     """Get translation for a specific key and language"""
-    if language in TRANSLATIONS and key in TRANSLATIONS[language]:
-        return TRANSLATIONS[language][key]
-    # Fallback to English if translation not found
-    return TRANSLATIONS['english'].get(key, key)
+    table = _compiled.get(language) or _compiled[DEFAULT_LANGUAGE]
+    return table.get(key, key)
+
 
 def get_available_languages():
     """Get list of available languages"""
     return LIBERIAN_LANGUAGES
 
+
 def translate_text(text, target_language='english'):
     """Simple text translation - in production, this would use a translation API"""
-    # For now, return basic translations
-    basic_translations = {
-        'Hello': {
-            'kpelle': 'Kɛ',
-            'bassa': 'Nyɔnmɔ',
-            'gio': 'Yɛ',
-            'liberian_english': 'Hello o'
-        },
-        'How can I help you?': {
-            'kpelle': 'Na kɛ yuu kɛrɛ maa?',
-            'bassa': 'Na ke yuu nyɔn maa?',
-            'gio': 'Na kɛ yuu nyɔɔn maa?',
-            'liberian_english': 'How I can help you?'
-        },
-        'Thank you': {
-            'kpelle': 'Gbɛlɛ kɛ',
-            'bassa': 'Gbɛlɛ ke',
-            'gio': 'Gbɛlɛɛ kɛ',
-            'liberian_english': 'Thank you o'
-        }
-    }
-    
-    if text in basic_translations and target_language in basic_translations[text]:
-        return basic_translations[text][target_language]
-    
-    return text  # Return original if no translation available
+    phrases = _compiled_phrases.get(target_language)
+    if phrases is None:
+        return text
+    return phrases.get(text, text)  # Return original if no translation available
+
+
+load_translations()